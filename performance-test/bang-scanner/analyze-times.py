@@ -11,10 +11,18 @@ def get_execution_info(scandir):
     scanresult = pickle.load(open(pathlib.Path(scandir) / 'bang.pickle', 'rb'))
     duration = scanresult['session']['duration']
     checkfile = scanresult['session'].get('checkfile', 'unknown')
-    return (scandir, checkfile, duration)
+    # total time per phase of scanning, if recorded
+    phases = {}
+    if 'timings' in scanresult['session']:
+        for phase, phasetimings in scanresult['session']['timings']['phases'].items():
+            phases[phase] = phasetimings['total']
+    return (scandir, checkfile, duration, phases)
 
 if __name__ == "__main__":
-    headers = [('scandir', 'checkfile', 'duration')]
     r = [get_execution_info(arg) for arg in sys.argv[1:]]
+    phases = sorted(set(phase for scandir, checkfile, duration, p in r for phase in p))
+    headers = [['scandir', 'checkfile', 'duration'] + phases]
+    rows = [[scandir, checkfile, duration] + [p.get(phase, '') for phase in phases]
+            for scandir, checkfile, duration, p in r]
     csv_writer = csv.writer(sys.stdout)
-    csv_writer.writerows(headers + r)
+    csv_writer.writerows(headers + rows)
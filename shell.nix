@@ -10,11 +10,15 @@ let
     dockerfile-parse
     icalendar
     lz4
+    numpy
     pillow
     psycopg2
+    pyahocorasick
+    python-lzo
     python-snappy
     tinycss2
     tlsh
+    zstandard
   ]);
     
 in
@@ -22,9 +26,7 @@ pkgs.mkShell {
   buildInputs = with pkgs; [
     binutils
     cabextract
-    e2tools
     libxml2
-    lz4
     lzop
     mailcap
     ncompress
@@ -24,8 +24,55 @@ import os
 import hashlib
 import string
 import collections
+import math
+import concurrent.futures
 import tlsh
 
+# NumPy is optional: without it byte statistics are computed with a
+# Counter, which gives the same results but is a lot slower.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# whether or not byte statistics are cheap enough to compute for every file
+fast_byte_statistics = numpy is not None
+
+
+def byte_histogram(data):
+    '''Return how often each byte value occurs in data, as a sequence of
+    256 counts (a NumPy array if NumPy is available).'''
+    if numpy is not None:
+        return numpy.bincount(numpy.frombuffer(data, dtype=numpy.uint8),
+                              minlength=256)
+    counter = collections.Counter(data)
+    return [counter[i] for i in range(256)]
+
+
+def add_histograms(first, second):
+    '''Return the sum of two byte histograms.'''
+    if numpy is not None:
+        return numpy.add(first, second)
+    return [a + b for a, b in zip(first, second)]
+
+
+def shannon_entropy(histogram):
+    '''Return the Shannon entropy, in bits per byte (0 to 8), of data
+    with the byte histogram histogram.'''
+    if numpy is not None:
+        histogram = numpy.asarray(histogram)
+        total = histogram.sum()
+        if total == 0:
+            return 0.0
+        probabilities = histogram[histogram > 0] / total
+        return float(-(probabilities * numpy.log2(probabilities)).sum())
+    total = sum(histogram)
+    if total == 0:
+        return 0.0
+    return -sum(count / total * math.log2(count / total)
+                for count in histogram if count > 0)
+
+
 class FileContentsComputer:
     '''Class to process the contents of a file'''
     def __init__(self, read_size, overlap=0):
@@ -37,14 +84,65 @@ class FileContentsComputer:
         self.computers.append(input_computer)
 
     def read(self, filename):
+        scanfile = open(filename, 'rb')
+        self.read_file(scanfile, filename.stat().st_size)
+        scanfile.close()
+
+    def read_file(self, scanfile, filesize):
+        '''Process the contents of a file that was already opened, such as
+        a virtual file.'''
         if all(c.supports_memoryview for c in self.computers):
-            return self._read_with_memory_view(filename)
-        return self._read_with_file_read(filename)
+            return self._read_with_memory_view(scanfile, filesize)
+        return self._read_with_file_read(scanfile, filesize)
+
+    def start(self, scanfile, filesize):
+        '''Start to process the contents of a file that was already opened
+        with data that is read elsewhere and passed to feed(), such as the
+        data that is searched for signatures, so the file does not have to
+        be read again. Data that is not passed to feed() is read from
+        scanfile, in order, when needed.'''
+        self.scanfile = scanfile
+        self.filesize = filesize
+        self.position = 0
+        self.use_memoryview = all(c.supports_memoryview for c in self.computers)
+        for computer in self.computers:
+            computer.initialize()
 
-    def _read_with_file_read(self, filename):
-        filesize = filename.stat().st_size
+    def feed(self, data, offset):
+        '''Process data that was read from offset in the file. Data before
+        the position up to which the file was processed is skipped. If
+        offset is past that position, the data in between is read from
+        the file first.'''
+        if offset > self.position:
+            self._read_until(offset)
+        view = memoryview(data)[self.position - offset:]
+        for i in range(0, len(view), self.read_size):
+            self._compute(view[i:i+self.read_size])
+        self.position = max(self.position, offset + len(data))
+
+    def finish(self):
+        '''Process the rest of the file that was not passed to feed().'''
+        self._read_until(self.filesize)
+        for computer in self.computers:
+            computer.finalize()
+
+    def _compute(self, data):
+        if not self.use_memoryview:
+            data = data.tobytes()
+        for computer in self.computers:
+            computer.compute(data)
+
+    def _read_until(self, offset):
+        self.scanfile.seek(self.position)
+        while self.position < offset:
+            data = self.scanfile.read(min(self.read_size, offset - self.position))
+            if data == b'':
+                break
+            self._compute(memoryview(data))
+            self.position += len(data)
+
+    def _read_with_file_read(self, scanfile, filesize):
         bytes_processed = 0
-        scanfile = open(filename, 'rb')
         scanfile.seek(0)
         for computer in self.computers:
             computer.initialize()
@@ -59,12 +157,9 @@ class FileContentsComputer:
             data = scanfile.read(self.read_size)
         for computer in self.computers:
             computer.finalize()
-        scanfile.close()
 
-    def _read_with_memory_view(self, filename):
-        filesize = filename.stat().st_size
+    def _read_with_memory_view(self, scanfile, filesize):
         bytes_processed = 0
-        scanfile = open(filename, 'rb')
         scanfile.seek(0)
         for computer in self.computers:
             computer.initialize()
@@ -72,7 +167,9 @@ class FileContentsComputer:
         bytes_read = scanfile.readinto(scanbytes)
         while bytes_read != 0:
             bytes_processed += bytes_read
-            data = memoryview(scanbytes[:bytes_read])
+            # the buffer is reused for the next block, computers that
+            # need the data later have to copy it.
+            data = memoryview(scanbytes)[:bytes_read]
             for computer in self.computers:
                 computer.compute(data)
             if self.overlap > 0 and filesize - bytes_processed > self.overlap:
@@ -81,21 +178,41 @@ class FileContentsComputer:
             bytes_read = scanfile.readinto(scanbytes)
         for computer in self.computers:
             computer.finalize()
-        scanfile.close()
+
+
+# the bytes of the characters that can be in text files
+printablebytes = string.printable.encode()
 
 
 class IsTextComputer:
+    '''Determines whether or not data is text, meaning that all bytes are
+    printable characters (string.printable). Unless count_all is set, no
+    more data is looked at after a block with a byte that is not printable
+    has been found.'''
     supports_memoryview = True
 
-    def __init__(self):
+    def __init__(self, count_all=False):
+        self.count_all = count_all
         self.is_text = True
+        self.bytes_seen = 0
+        self.printable = 0
 
     def initialize(self):
-        pass
+        self.is_text = True
+        self.bytes_seen = 0
+        self.printable = 0
 
     def compute(self, data):
-        self.is_text = self.is_text and \
-            all(chr(x) in string.printable for x in data)
+        if not self.is_text and not self.count_all:
+            return
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        # remove all printable bytes, what is left is not printable
+        nonprintable = len(data.translate(None, printablebytes))
+        self.bytes_seen += len(data)
+        self.printable += len(data) - nonprintable
+        if nonprintable != 0:
+            self.is_text = False
 
     def finalize(self):
         pass
@@ -103,6 +220,14 @@ class IsTextComputer:
     def get(self):
         return self.is_text
 
+    def get_printable_ratio(self):
+        '''Return the ratio of printable bytes in the data that was looked
+        at: all data if count_all is set, otherwise the data up to and
+        including the first block with a byte that is not printable.'''
+        if self.bytes_seen == 0:
+            return 1.0
+        return self.printable / self.bytes_seen
+
 
 class TLSHComputer:
     supports_memoryview = False
@@ -133,7 +258,16 @@ class TLSHComputerMemoryView:
         self.tlsh_hash = tlsh.Tlsh()
 
     def compute(self, data):
-        self.tlsh_hash.update(data.tobytes())
+        # the tlsh module only accepts bytes, not other buffers, not even
+        # read-only memoryviews. Views of a whole bytes object, such as
+        # the data read from the file, are passed without a copy; views
+        # of reused buffers or of a mmap have to be copied.
+        if isinstance(data, memoryview):
+            if type(data.obj) is bytes and data.nbytes == len(data.obj):
+                data = data.obj
+            else:
+                data = data.tobytes()
+        self.tlsh_hash.update(data)
 
     def finalize(self):
         self.tlsh_hash.final()
@@ -143,51 +277,149 @@ class TLSHComputerMemoryView:
 
 
 class ByteCounter:
+    '''Counts how often each byte value occurs in the data.'''
     supports_memoryview = True
 
     def __init__(self):
         pass
 
     def initialize(self):
-        self.bytecounter = collections.Counter(
-            dict([(i, 0) for i in range(0, 256)]))
+        self.histogram = [0] * 256
 
     def compute(self, data):
-        self.bytecounter.update(data)
+        self.histogram = add_histograms(self.histogram, byte_histogram(data))
 
     def finalize(self):
-        pass
+        self.bytecounter = collections.Counter(
+            dict([(i, int(self.histogram[i])) for i in range(0, 256)]))
 
     def get(self):
         return self.bytecounter
 
+
+class EntropyComputer:
+    '''Computes the byte histogram and the Shannon entropy of the data, as
+    well as an entropy profile: the entropy of every window of windowsize
+    bytes (the last window can be smaller). To keep the profile small for
+    large files, adjacent windows are merged, doubling the window size,
+    whenever there would be more than maxwindows windows.'''
+    supports_memoryview = True
+
+    def __init__(self, windowsize=65536, maxwindows=1024):
+        self.initialwindowsize = windowsize
+        self.maxwindows = maxwindows
+
+    def initialize(self):
+        self.windowsize = self.initialwindowsize
+        self.window = [0] * 256
+        self.windowfill = 0
+        self.windows = []
+
+    def _end_window(self):
+        self.windows.append(self.window)
+        self.window = [0] * 256
+        self.windowfill = 0
+        if len(self.windows) > self.maxwindows:
+            self._merge_windows()
+
+    def _merge_windows(self):
+        merged = [add_histograms(self.windows[i], self.windows[i+1])
+                  for i in range(0, len(self.windows) - 1, 2)]
+        # the current window is part of the last window when the
+        # number of full windows is odd
+        if len(self.windows) % 2 == 1:
+            self.window = add_histograms(self.windows[-1], self.window)
+            self.windowfill += self.windowsize
+        self.windows = merged
+        self.windowsize *= 2
+
+    def compute(self, data):
+        position = 0
+        while position < len(data):
+            size = min(len(data) - position, self.windowsize - self.windowfill)
+            self.window = add_histograms(self.window,
+                    byte_histogram(data[position:position+size]))
+            self.windowfill += size
+            position += size
+            if self.windowfill == self.windowsize:
+                self._end_window()
+
+    def finalize(self):
+        if self.windowfill != 0:
+            self.windows.append(self.window)
+        self.histogram = [0] * 256
+        for window in self.windows:
+            self.histogram = add_histograms(self.histogram, window)
+        self.histogram = [int(count) for count in self.histogram]
+        self.profile = [shannon_entropy(window) for window in self.windows]
+        self.entropy = shannon_entropy(self.histogram)
+        self.windows = []
+
+    def get(self):
+        return {
+            'entropy': self.entropy,
+            'windowsize': self.windowsize,
+            'profile': self.profile,
+        }
+
+    def get_histogram(self):
+        '''Return how often each byte value occurs in the data, as a list
+        of 256 counts.'''
+        return self.histogram
+
+
+# the hashes that are computed for each file, unless configured otherwise
 hash_algorithms = ['sha256', 'md5', 'sha1']
 
-def _compute_empty_hash_results():
+def compute_empty_hash_results(algorithms=hash_algorithms):
     # global hash_algorithms
     emptyhashes = {}
     results = {}
 
     # pre-store empty hashes
-    for hashtocompute in hash_algorithms:
+    for hashtocompute in algorithms:
         emptyhashes[hashtocompute] = hashlib.new(hashtocompute)
         results[hashtocompute] = emptyhashes[hashtocompute].hexdigest()
     return results
 
-emptyhashresults = _compute_empty_hash_results()
+emptyhashresults = compute_empty_hash_results()
+
+# pool of threads to compute hashes with, see get_hash_executor()
+hash_executor = None
+
+def get_hash_executor(threads):
+    '''Return a pool of threads that is shared by all Hashers in the
+    process, or None if threads is 0. The pool is created when it is first
+    needed, so it is not inherited by processes that are forked.'''
+    global hash_executor
+    if threads == 0:
+        return None
+    if hash_executor is None:
+        hash_executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+    return hash_executor
 
 
 class Hasher:
+    '''Computes the hashes of data. If an executor (such as the pool of
+    get_hash_executor()) is given, the hashes are updated in parallel,
+    as hashlib does not hold the GIL while it hashes large buffers.'''
     supports_memoryview = True
 
-    def __init__(self, hash_algorithms):
+    def __init__(self, hash_algorithms, executor=None):
         self.hash_algorithms = hash_algorithms
+        self.executor = executor
 
     def initialize(self):
         self.hashes = dict([(a, hashlib.new(a))
             for a in self.hash_algorithms])
 
     def compute(self, data):
+        if self.executor is not None and len(self.hashes) > 1:
+            # wait for all hashes, as data can be changed after this
+            for update in [self.executor.submit(h.update, data)
+                           for h in self.hashes.values()]:
+                update.result()
+            return
         for a in self.hashes:
             self.hashes[a].update(data)
 
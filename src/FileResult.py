@@ -36,6 +36,12 @@ class FileResult:
         self.filesize = None
         self.mimetype = None
         self.mimetype_encoding = None
+        self.duplicateof = None
+        self.virtual = None
+        self.timings = {}
+        self.parserstats = {}
+        self.bytecount = None
+        self.entropy = None
 
     def set_filesize(self, size):
         self.filesize = size
@@ -62,6 +68,54 @@ class FileResult:
     def set_metadata(self, metadata):
         self.metadata = metadata
 
+    def set_duplicateof(self, rel_filename):
+        """marks the file as a duplicate of the file rel_filename, which
+        was scanned (and possibly unpacked) instead of this file."""
+        self.labels.add('duplicate')
+        self.duplicateof = rel_filename
+
+    def set_virtual(self, rel_datafilename, offset, size):
+        """marks the file as virtual: the data of the file is the range of
+        size bytes at offset in the file rel_datafilename, and it has not
+        been written to the file itself."""
+        self.virtual = (rel_datafilename, offset, size)
+
+    def clear_virtual(self):
+        """marks the data of the file as written to the file itself."""
+        self.virtual = None
+
+    def is_virtual(self):
+        return self.virtual is not None
+
+    def set_byte_statistics(self, bytecount, entropy):
+        """sets how often each byte value occurs in the file (a list of
+        256 counts) and the entropy of the file, with the entropy
+        profile, as computed by EntropyComputer."""
+        self.bytecount = bytecount
+        self.entropy = entropy
+
+    def add_timing(self, phase, seconds):
+        """adds seconds to the time spent in phase of scanning the file."""
+        self.timings[phase] = self.timings.get(phase, 0) + seconds
+
+    def add_parser_attempt(self, parsername, seconds, length=None):
+        """adds an attempt to unpack data from the file with the
+        UnpackParser parsername, that took seconds, to the statistics of
+        the UnpackParser. length is the amount of bytes that was unpacked,
+        or None if the UnpackParser failed."""
+        stats = self.parserstats.setdefault(parsername, {
+            'attempts': 0, 'successes': 0, 'failures': 0,
+            'time': 0, 'maxtime': 0, 'bytes': 0,
+        })
+        stats['attempts'] += 1
+        if length is None:
+            stats['failures'] += 1
+        else:
+            stats['successes'] += 1
+            stats['bytes'] += length
+        stats['time'] += seconds
+        stats['maxtime'] = max(stats['maxtime'], seconds)
+
     def get(self):
         """gets the fileresult as a dictionary."""
         d = {
@@ -79,6 +133,22 @@ class FileResult:
             d['mimetype'] = self.mimetype
             if self.mimetype_encoding is not None:
                 d['mimetype encoding'] = self.mimetype_encoding
+        if self.duplicateof is not None:
+            d['duplicate of'] = str(self.duplicateof)
+        if self.virtual is not None:
+            d['virtual'] = {
+                'file': str(self.virtual[0]),
+                'offset': self.virtual[1],
+                'size': self.virtual[2],
+            }
+        if self.timings != {}:
+            d['timings'] = self.timings
+        if self.parserstats != {}:
+            d['parserstats'] = self.parserstats
+        if self.bytecount is not None:
+            d['bytecount'] = self.bytecount
+        if self.entropy is not None:
+            d['entropy'] = self.entropy
         return d
 
     def get_hash(self, algorithm='sha256'):
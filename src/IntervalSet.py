@@ -0,0 +1,102 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import bisect
+
+
+class IntervalSet:
+    """A set of half open intervals [low, high) of integers, for example
+    the byte ranges of a file that have been unpacked. Intervals that
+    overlap or touch are merged, so the intervals are always disjoint and
+    sorted, and looking up an offset takes O(log n) time."""
+    def __init__(self, intervals=()):
+        # the start and end of each interval, in the same order
+        self.lows = []
+        self.highs = []
+        for low, high in intervals:
+            self.add(low, high)
+
+    def add(self, low, high):
+        '''Add the interval [low, high), merging it with the intervals
+        that it overlaps or touches. Empty intervals are ignored.'''
+        if low >= high:
+            return
+        # the intervals that end at or after low, and start at or
+        # before high, are merged with the new interval
+        first = bisect.bisect_left(self.highs, low)
+        last = bisect.bisect_right(self.lows, high)
+        if first < last:
+            low = min(low, self.lows[first])
+            high = max(high, self.highs[last - 1])
+        self.lows[first:last] = [low]
+        self.highs[first:last] = [high]
+
+    def _find(self, offset):
+        # index of the interval that contains offset, or -1
+        index = bisect.bisect_right(self.lows, offset) - 1
+        if index >= 0 and offset < self.highs[index]:
+            return index
+        return -1
+
+    def __contains__(self, offset):
+        return self._find(offset) != -1
+
+    def overlaps(self, low, high):
+        '''Return whether or not any of [low, high) is in the set.'''
+        index = bisect.bisect_right(self.highs, low)
+        return index < len(self.lows) and self.lows[index] < high
+
+    def next_free(self, offset):
+        '''Return the first offset from offset onwards that is not in
+        the set.'''
+        index = self._find(offset)
+        if index == -1:
+            return offset
+        return self.highs[index]
+
+    def gaps(self, low, high):
+        '''Return the intervals of [low, high) that are not in the set,
+        in order.'''
+        gaps = []
+        index = bisect.bisect_right(self.highs, low)
+        while low < high:
+            if index == len(self.lows) or self.lows[index] >= high:
+                gaps.append((low, high))
+                break
+            if self.lows[index] > low:
+                gaps.append((low, self.lows[index]))
+            low = self.highs[index]
+            index += 1
+        return gaps
+
+    def __iter__(self):
+        return zip(self.lows, self.highs)
+
+    def __len__(self):
+        return len(self.lows)
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self.lows == other.lows and self.highs == other.highs
+
+    def __repr__(self):
+        return 'IntervalSet(%r)' % list(self)
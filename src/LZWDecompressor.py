@@ -0,0 +1,174 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# A decompressor for the LZW data of UNIX compress (.Z files), which
+# behaves like ncompress:
+#
+# https://github.com/vapier/ncompress/
+#
+# The data starts with a header of 3 bytes: the magic (0x1f 0x9d) and a
+# byte with the maximum amount of bits per code (bits 0-4) and whether
+# or not the dictionary can be cleared (block mode, bit 7). The codes
+# start at 9 bits and are packed least significant bit first.
+#
+# ncompress reads the codes in groups of 8, which take exactly as many
+# bytes as there are bits per code. When the code size changes, or when
+# the dictionary is cleared, the rest of the current group is skipped.
+# This decompressor extracts the codes a group at a time as well, which
+# is also a lot faster in Python than extracting them one by one.
+
+# the code that clears the dictionary in block mode
+CLEAR = 256
+
+# the maximum amount of groups of codes that are extracted at once
+MAXGROUPS = 512
+
+
+class LZWError(Exception):
+    pass
+
+
+class LZWDecompressor:
+    """Decompresses compress'd data incrementally, like the
+    decompressor objects of zlib, bz2 and lzma. The data has to
+    include the header."""
+    def __init__(self):
+        self.header = None
+        self.maxbits = 0
+        self.blockmode = False
+        # input that is not a complete group yet
+        self.pending = b''
+        self.bits = 9
+        self.table = [bytes([i]) for i in range(256)]
+        self.previous = None
+
+    def _reset(self):
+        self.bits = 9
+        del self.table[256:]
+        if self.blockmode:
+            # a placeholder for the CLEAR code
+            self.table.append(b'')
+        self.previous = None
+
+    def _decode(self, data, final):
+        output = bytearray()
+        table = self.table
+        position = 0
+        while True:
+            bits = self.bits
+            # the codes of a number of whole groups, or at the end of
+            # the data the codes that are complete. The codes after a
+            # change of the code size are extracted again, so not too
+            # many groups are done at once.
+            end = position + min((len(data) - position) // bits, MAXGROUPS) * bits
+            if final and end == position:
+                end = len(data)
+                count = (end - position) * 8 // bits
+            else:
+                count = (end - position) // bits * 8
+            if count == 0:
+                break
+            mask = (1 << bits) - 1
+            shifts = range(0, 8 * bits, bits)
+            codes = [(group >> shift) & mask
+                     for group in (int.from_bytes(data[p:p+bits], byteorder='little')
+                                   for p in range(position, end, bits))
+                     for shift in shifts][:count]
+
+            previous = self.previous
+            size = len(table)
+            if size < 1 << self.maxbits:
+                # the table is full at the largest code size
+                limit = min(mask, (1 << self.maxbits) - 1)
+            else:
+                limit = None
+            switch = False
+            for index, code in enumerate(codes):
+                if previous is None:
+                    # the first code after the start or a CLEAR
+                    if code >= 256:
+                        raise LZWError('invalid first code')
+                    previous = table[code]
+                    output += previous
+                    continue
+                if code == CLEAR and self.blockmode:
+                    self._reset()
+                    previous = None
+                    switch = True
+                    break
+                if code < size:
+                    entry = table[code]
+                elif code == size:
+                    # the code that is about to be added to the table
+                    entry = previous + previous[:1]
+                else:
+                    raise LZWError('invalid code')
+                output += entry
+                if limit is not None:
+                    table.append(previous + entry[:1])
+                    size += 1
+                    if size > limit:
+                        # switch to the next code size when the table
+                        # has grown past the largest code of the
+                        # current size, or stop adding entries when
+                        # the table is full.
+                        previous = entry
+                        if bits < self.maxbits:
+                            self.bits += 1
+                            switch = True
+                            break
+                        limit = None
+                        continue
+                previous = entry
+            self.previous = previous
+            if switch:
+                # skip the rest of the group
+                position = min(position + (index // 8 + 1) * bits, end)
+            else:
+                position = end
+        self.pending = data[position:]
+        return bytes(output)
+
+    def decompress(self, data):
+        '''Decompress data, returning as much decompressed data as
+        possible. Raises LZWError for data that is not valid.'''
+        data = self.pending + data
+        if self.header is None:
+            if len(data) < 3:
+                self.pending = data
+                return b''
+            if data[:2] != b'\x1f\x9d':
+                raise LZWError('invalid magic')
+            self.maxbits = data[2] & 0x1f
+            if self.maxbits < 9 or self.maxbits > 16:
+                raise LZWError('invalid bits per code')
+            self.blockmode = data[2] & 0x80 != 0
+            self.header = data[:3]
+            self._reset()
+            data = data[3:]
+        return self._decode(data, False)
+
+    def flush(self):
+        '''Decompress the codes at the end of the data, which are not a
+        whole group, and return the decompressed data.'''
+        if self.header is None:
+            raise LZWError('not enough data for header')
+        return self._decode(self.pending, True)
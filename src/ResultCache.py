@@ -0,0 +1,206 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import os
+import pathlib
+import pickle
+import hashlib
+import inspect
+
+import bangsignatures
+from UnpackParserManifest import LazyUnpackParser
+from bangfilescans import bangfilefunctions
+
+# labels that describe where a file was found, instead of what is
+# inside the file, so they should not be cached.
+contextlabels = set(['root', 'duplicate', 'synthesized', 'unpacked'])
+
+
+def _unpacker_name_and_source(unpacker):
+    '''Return the module and class name of an UnpackParser, and the file
+    it is defined in. UnpackParsers from the manifest are not imported.'''
+    if isinstance(unpacker, LazyUnpackParser):
+        return (unpacker.module_name, unpacker.__name__, unpacker.source_file())
+    return (unpacker.__module__, unpacker.__name__, inspect.getsourcefile(unpacker))
+
+
+def compute_version_stamp():
+    '''Compute a version stamp for the set of parsers and file scans that
+    is used, so cache entries that were created by a different version
+    of BANG are not used.'''
+    h = hashlib.sha256()
+    h.update(b'%d' % ResultCache.cacheformat)
+    unpackers = set()
+    for unpackers_for_key in list(bangsignatures.signature_to_unpackparser.values()) + \
+            list(bangsignatures.extension_to_unpackparser.values()) + \
+            [bangsignatures.unpackers_for_featureless_files]:
+        unpackers.update(unpackers_for_key)
+    sourcefiles = set()
+    for module_name, name, sourcefile in sorted(map(_unpacker_name_and_source, unpackers)):
+        h.update(("%s.%s\n" % (module_name, name)).encode())
+        sourcefiles.add(sourcefile)
+    for f in bangfilefunctions:
+        h.update(("%s.%s\n" % (f.__module__, f.__name__)).encode())
+        sourcefiles.add(inspect.getsourcefile(f))
+    for sourcefile in sorted(sourcefiles):
+        h.update(pathlib.Path(sourcefile).read_bytes())
+    return h.hexdigest()
+
+
+def _strip_prefix(path, prefix):
+    '''Return path relative to the prefix (a file name), or None if the
+    path is not inside the unpacking directories of the file.'''
+    if not path.startswith(prefix):
+        return None
+    return path[len(prefix):]
+
+
+class ResultCache:
+    """A persistent, content addressed cache of scan results, that can be
+    shared between scans. Entries are keyed by the SHA256 of a file and
+    contain the labels, metadata, byte statistics and unpack reports of
+    the file, as well as references to the entries of the files unpacked
+    from it, so a complete subtree can be reported without unpacking it
+    again."""
+
+    # increase when the layout of the cache entries changes
+    cacheformat = 2
+
+    def __init__(self, cachedirectory, versionstamp):
+        self.cachedirectory = pathlib.Path(cachedirectory)
+        self.versionstamp = versionstamp
+
+    def _entry_path(self, sha256):
+        return self.cachedirectory / sha256[:2] / ("%s.pickle" % sha256)
+
+    def get(self, sha256):
+        '''Return the cache entry for a hash, or None if there is no
+        (valid) entry.'''
+        try:
+            entryfile = open(self._entry_path(sha256), 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            entry = pickle.load(entryfile)
+        except (EOFError, pickle.UnpicklingError):
+            return None
+        finally:
+            entryfile.close()
+        if entry.get('version') != self.versionstamp:
+            return None
+        return entry
+
+    def put(self, sha256, entry):
+        '''Store a cache entry for a hash'''
+        entry['version'] = self.versionstamp
+        entrypath = self._entry_path(sha256)
+        os.makedirs(entrypath.parent, exist_ok=True)
+
+        # first write to a temporary file and then rename it, so
+        # concurrent scans never see a partially written entry.
+        tmppath = entrypath.with_name("%s.%d.tmp" % (entrypath.name, os.getpid()))
+        entryfile = open(tmppath, 'wb')
+        pickle.dump(entry, entryfile)
+        entryfile.close()
+        os.replace(tmppath, entrypath)
+
+    def get_subtree(self, sha256, seen=frozenset()):
+        '''Return the cache entry for a hash with the entries of all the
+        files unpacked from it filled in recursively, or None if any of
+        these entries is missing.'''
+        if sha256 in seen:
+            return None
+        entry = self.get(sha256)
+        if entry is None:
+            return None
+        for child in entry['children']:
+            if 'sha256' not in child:
+                continue
+            child['entry'] = self.get_subtree(child['sha256'], seen | {sha256})
+            if child['entry'] is None:
+                return None
+        return entry
+
+    def _make_entry(self, filename, node, scantree, resultsdirectory):
+        resultfilename = resultsdirectory / ("%s.pickle" % node['hash']['sha256'])
+        try:
+            resultfile = open(resultfilename, 'rb')
+        except FileNotFoundError:
+            return None
+        resultout = pickle.load(resultfile)
+        resultfile.close()
+
+        unpackedfiles = None
+        children = []
+        if 'unpackedfiles' in node:
+            unpackedfiles = []
+            for report in node['unpackedfiles']:
+                report = dict(report)
+                if 'unpackdirectory' in report:
+                    report['unpackdirectory'] = _strip_prefix(report['unpackdirectory'], filename)
+                    if report['unpackdirectory'] is None:
+                        return None
+                files = []
+                for childname in report['files']:
+                    suffix = _strip_prefix(childname, filename)
+                    if suffix is None or childname not in scantree:
+                        return None
+                    files.append(suffix)
+
+                    childnode = scantree[childname]
+                    child = {
+                        'name': suffix,
+                        'labels': list(contextlabels.intersection(childnode['labels']) - set(['duplicate'])),
+                    }
+                    if 'sha256' in childnode['hash']:
+                        child['sha256'] = childnode['hash']['sha256']
+                    else:
+                        # files that are not scanned, such as directories
+                        # or symbolic links, are stored with the parent.
+                        child['labels'] = childnode['labels']
+                    children.append(child)
+                report['files'] = files
+                unpackedfiles.append(report)
+
+        return {
+            'labels': list(set(node['labels']) - contextlabels),
+            'filesize': node['filesize'],
+            'hash': node['hash'],
+            'mimetype': 'mimetype' in node,
+            'metadata': resultout.get('metadata'),
+            'bytecount': node.get('bytecount'),
+            'entropy': node.get('entropy'),
+            'unpackedfiles': unpackedfiles,
+            'resultout': resultout,
+            'children': children,
+        }
+
+    def store_scantree(self, scantree, resultsdirectory):
+        '''Store the results of all (non-duplicate) files of a finished
+        scan in the cache.'''
+        for filename, node in scantree.items():
+            if 'sha256' not in node['hash'] or 'duplicate' in node['labels']:
+                continue
+            if self.get(node['hash']['sha256']) is not None:
+                continue
+            entry = self._make_entry(filename, node, scantree, resultsdirectory)
+            if entry is not None:
+                self.put(node['hash']['sha256'], entry)
@@ -21,6 +21,10 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import os
+import copy
+
+from ScanScheduler import SharedChecksumDict
+import banglogging
 
 class ScanEnvironment:
     tlshlabelsignore = set([
@@ -32,7 +36,10 @@ class ScanEnvironment:
                  runfilescans, tlshmaximum, synthesizedminimum, logging,
                  paddingname, unpackdirectory, temporarydirectory,
                  resultsdirectory, scanfilequeue, resultqueue,
-                 processlock, checksumdict,
+                 processlock, checksumdict, dedupfirst, resultcache,
+                 usemmap, virtualfiles, skippadding,
+                 hashalgorithms, hashthreads, skiprandomdata,
+                 toolthreads,
                 ):
         """unpackdirectory: a Path object, absolute
            temporarydirectory: a Path object, absolute
@@ -41,6 +48,28 @@ class ScanEnvironment:
            processlock: a Lock object that guards access to shared objects
            checksumdict: a shared dictionary to store hashes of files to
                          prevent scans of duplicate files.
+           dedupfirst: compute the hash of a file before unpacking it, so
+                       duplicate files are never unpacked.
+           resultcache: a ResultCache object with results of earlier
+                        scans, or None if no cache should be used.
+           usemmap: search files for signatures through a memory mapping
+                    of the file instead of reading it in chunks.
+           virtualfiles: do not write data that is carved from a file to
+                         disk, but refer to the range of the data in the
+                         file instead, until a real file is needed.
+           skippadding: do not write data that is carved from a file and
+                        that only consists of NUL or 0xFF bytes to disk,
+                        but record it as a padding range of the file.
+           hashalgorithms: the names of the hashlib algorithms that are
+                           computed for every file, including sha256.
+           hashthreads: the amount of threads that compute the hashes of
+                        a file in parallel, 0 to compute them one by one.
+           skiprandomdata: do not try weak signatures in data that looks
+                           random, such as encrypted or compressed data.
+           toolthreads: a dictionary with the amount of threads that an
+                        external tool may use, per name of the tool, and
+                        for the name 'default' for tools that are not in
+                        the dictionary.
         """
         # TODO: init from options object
         self.maxbytes = maxbytes
@@ -59,10 +88,77 @@ class ScanEnvironment:
         self.processlock = processlock
         self.checksumdict = checksumdict
         self.runfilescans = runfilescans
+        self.dedupfirst = dedupfirst
+        self.resultcache = resultcache
+        self.usemmap = usemmap
+        self.virtualfiles = virtualfiles
+        self.skippadding = skippadding
+        self.hashalgorithms = hashalgorithms
+        self.hashthreads = hashthreads
+        self.skiprandomdata = skiprandomdata
+        self.toolthreads = toolthreads
+        # the log file of the scan, if the scan is part of a batch
+        self.logfile = None
+        # scan environments for the scans of a batch, see
+        # get_environment_for_scan()
+        self.batchenvironments = {}
+
+    def get_environment_for_scan(self, scan):
+        """returns the scan environment for a job of one of the scans of a
+        batch, which is described by scan: a tuple (group, unpackdirectory,
+        resultsdirectory, checksumdirectory, logfile), where logfile is
+        None if there is no log. scan is None for jobs that are not part
+        of a batch, for which the scan environment itself is returned."""
+        if scan is None:
+            return self
+        environment = self.batchenvironments.get(scan)
+        if environment is None:
+            (group, unpackdirectory, resultsdirectory, checksumdirectory, logfile) = scan
+            # a group is reused for the next scan when a scan is done
+            for oldscan in [s for s in self.batchenvironments if s[0] == group]:
+                del self.batchenvironments[oldscan]
+                banglogging.close_scan_log(oldscan[4])
+            environment = copy.copy(self)
+            environment.batchenvironments = {}
+            environment.unpackdirectory = unpackdirectory
+            environment.resultsdirectory = resultsdirectory
+            environment.checksumdict = SharedChecksumDict(checksumdirectory)
+            environment.logfile = logfile
+            (environment.scanfilequeue, environment.resultqueue) = \
+                    self.scanfilequeue.get_group_queues(group, scan)
+            self.batchenvironments[scan] = environment
+        return environment
 
     def get_runfilescans(self):
         return self.runfilescans
 
+    def get_dedupfirst(self):
+        return self.dedupfirst
+
+    def get_resultcache(self):
+        return self.resultcache
+
+    def get_usemmap(self):
+        return self.usemmap
+
+    def get_virtualfiles(self):
+        return self.virtualfiles
+
+    def get_skippadding(self):
+        return self.skippadding
+
+    def get_hash_algorithms(self):
+        return self.hashalgorithms
+
+    def get_hashthreads(self):
+        return self.hashthreads
+
+    def get_skiprandomdata(self):
+        return self.skiprandomdata
+
+    def get_toolthreads(self, tool):
+        return self.toolthreads.get(tool, self.toolthreads.get('default', 1))
+
     def get_readsize(self):
         return self.readsize
 
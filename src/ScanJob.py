@@ -40,7 +40,14 @@ from FileResult import FileResult
 from FileContentsComputer import *
 from UnpackManager import *
 from UnpackParserException import UnpackParserException
+import bangio
+import VirtualFile
+from bangtimings import phase_timer
 
+# padding is data that only consists of NUL bytes or only of 0xFF bytes,
+# which is compared in blocks of paddingblocksize bytes.
+validpadding = [b'\x00', b'\xff']
+paddingblocksize = 1048576
 
 class ScanJobError(Exception):
     def __new__(cls, *args, **kwargs):
@@ -70,6 +77,12 @@ class ScanJob:
     def __init__(self, fileresult):
         self.fileresult = fileresult
         self.type = None
+        # the scan of a batch that the job is part of, if any
+        self.scan = None
+        # the computations of the hashes and other properties of the
+        # contents, see start_content_computations()
+        self.contents = None
+        self.contentsfile = None
 
     def set_scanenvironment(self, scanenvironment):
         self.scanenvironment = scanenvironment
@@ -132,11 +145,16 @@ class ScanJob:
                 self._is_empty()
 
     def check_unscannable_file(self):
+        # virtual files are always ranges of regular files
+        if self.fileresult.is_virtual():
+            self.fileresult.set_filesize(self.fileresult.virtual[2])
+            return False
         if self.not_scannable():
             self.fileresult.labels.add(self.type)
             if self.type == 'empty':
                 self.fileresult.set_filesize(0)
-                for hash_algorithm, hash_value in emptyhashresults.items():
+                for hash_algorithm, hash_value in compute_empty_hash_results(
+                        self.scanenvironment.get_hash_algorithms()).items():
                     self.fileresult.set_hashresult(hash_algorithm, hash_value)
             return True
         self.fileresult.set_filesize(self.stat.st_size)
@@ -165,7 +183,6 @@ class ScanJob:
         if 'unpacked' in self.fileresult.labels:
             self.fileresult.labels.remove('unpacked')
             unpacker.set_needs_unpacking(False)
-            unpacker.set_last_unpacked_offset(self.fileresult.filesize)
             unpacker.append_unpacked_range(0, self.fileresult.filesize)
 
             # store lot of information about the unpacked files
@@ -186,81 +203,105 @@ class ScanJob:
     def check_for_valid_extension(self, unpacker):
         # TODO: this method will try to unpack multiple extensions
         # if they match. Is this the intention?
-        for extension, unpackparsers in bangsignatures.extension_to_unpackparser.items():
-            for unpackparser in unpackparsers:
-                if bangsignatures.matches_file_pattern(self.fileresult.filename, extension):
-                    log(logging.INFO, "TRYING extension match %s %s" % (self.fileresult.filename, extension))
-                    try:
-                        unpackresult = unpacker.try_unpack_file_for_extension(
-                            self.fileresult, self.scanenvironment,
-                            self.fileresult.filename, extension, unpackparser)
-                    except UnpackParserException as e:
-                        # No data could be unpacked for some reason
-                        log(logging.DEBUG, "FAIL %s known extension %s: %s" %
-                            (self.fileresult.filename, extension,
-                             e.args))
-                        # Fatal errors should lead to the program stopping
-                        # execution. Ignored for now.
-                        # if unpackresult['error']['fatal']:
-                        #    pass
-                        unpacker.remove_data_unpack_directory_tree()
-                        continue
+        for extension, unpackparser in \
+                bangsignatures.get_unpackers_for_file_name(self.fileresult.filename):
+            log(logging.INFO, "TRYING extension match %s %s" % (self.fileresult.filename, extension))
+            try:
+                unpackresult = unpacker.try_unpack_file_for_extension(
+                    self.fileresult, self.scanenvironment,
+                    self.fileresult.filename, extension, unpackparser)
+            except UnpackParserException as e:
+                # No data could be unpacked for some reason
+                log(logging.DEBUG, "FAIL %s known extension %s: %s" %
+                    (self.fileresult.filename, extension,
+                     e.args))
+                # Fatal errors should lead to the program stopping
+                # execution. Ignored for now.
+                # if unpackresult['error']['fatal']:
+                #    pass
+                unpacker.remove_data_unpack_directory_tree()
+                continue
 
-                    # the file could be unpacked successfully,
-                    # so log it as such.
-                    log(logging.INFO, "SUCCESS %s %s at offset: 0, length: %d" %
-                        (self.fileresult.filename, extension,
-                         unpackresult['length']))
+            # the file could be unpacked successfully,
+            # so log it as such.
+            log(logging.INFO, "SUCCESS %s %s at offset: 0, length: %d" %
+                (self.fileresult.filename, extension,
+                 unpackresult['length']))
 
-                    unpacker.file_unpacked(unpackresult, self.fileresult.filesize)
+            unpacker.file_unpacked(unpackresult, self.fileresult.filesize)
 
-                    # store any labels that were passed as a result and
-                    # add them to the current list of labels
-                    self.fileresult.labels.update(unpackresult['labels'])
+            # store any labels that were passed as a result and
+            # add them to the current list of labels
+            self.fileresult.labels.update(unpackresult['labels'])
+
+            # store lot of information about the unpacked files
+            report = {
+                'offset': 0,
+                'extension': extension,
+                'type': unpackparser.pretty_name,
+                'size': unpackresult['length'],
+                'files': [],
+            }
 
-                    # store lot of information about the unpacked files
-                    report = {
-                        'offset': 0,
-                        'extension': extension,
-                        'type': unpackparser.pretty_name,
-                        'size': unpackresult['length'],
-                        'files': [],
-                    }
-
-                    if 'metadata' in unpackresult:
-                        self.fileresult.set_metadata(unpackresult['metadata'])
-
-                    for unpackedfile, unpackedlabel in unpackresult['filesandlabels']:
-                        fr = FileResult(
-                            pathlib.Path(unpackedfile),
-                            self.fileresult.filename,
-                            self.fileresult.labels,
-                            set(unpackedlabel))
-                        j = ScanJob(fr)
-                        self.scanenvironment.scanfilequeue.put(j)
-                        report['files'].append(str(unpackedfile))
-                    self.fileresult.add_unpackedfile(report)
+            if 'metadata' in unpackresult:
+                self.fileresult.set_metadata(unpackresult['metadata'])
+
+            virtualfiles = unpackresult.get('virtualfiles', {})
+            for unpackedfile, unpackedlabel in unpackresult['filesandlabels']:
+                self.queue_unpacked_file(unpackedfile, unpackedlabel,
+                        virtualfiles.get(unpackedfile))
+                report['files'].append(str(unpackedfile))
+            self.fileresult.add_unpackedfile(report)
+
+    def get_scan_window(self):
+        '''Return the path of the file on disk with the data of the file,
+        and the range (offset, size) of the data in it for virtual files
+        or None for other files.'''
+        (filename_full, dataoffset) = VirtualFile.data_location(
+                self.scanenvironment, self.fileresult)
+        if self.fileresult.is_virtual():
+            return (filename_full, (dataoffset, self.fileresult.filesize))
+        return (filename_full, None)
+
+    def queue_unpacked_file(self, unpackedfile, unpackedlabel, virtualrange=None):
+        '''Add a file that was unpacked from the file to the scan queue.
+        virtualrange is the range of the data for virtual files.'''
+        fr = FileResult(
+            pathlib.Path(unpackedfile),
+            self.fileresult.filename,
+            self.fileresult.labels,
+            set(unpackedlabel))
+        if virtualrange is not None:
+            fr.set_virtual(*virtualrange)
+        j = ScanJob(fr)
+        self.scanenvironment.scanfilequeue.put(j)
 
     def check_for_signatures(self, unpacker):
+            if self.scanenvironment.get_usemmap():
+                self.check_for_signatures_in_mmap(unpacker)
+                return
+
             signaturesfound = []
             counterspersignature = {}
 
-            filename_full = self.scanenvironment.unpack_path(self.fileresult.filename)
-            unpacker.open_scanfile_with_memoryview(filename_full, self.scanenvironment.get_maxbytes())
-            unpacker.seek_to_last_unpacked_offset()
+            # the data that is read is used for the hashes and other
+            # computations as well
+            self.start_content_computations()
+
+            (filename_full, window) = self.get_scan_window()
+            unpacker.open_scanfile_with_memoryview(filename_full,
+                    self.scanenvironment.get_maxbytes(), window)
+            unpacker.seek_to_first_free_offset()
             unpacker.read_chunk_from_scanfile()
+            self.contents.feed(unpacker.scanbytes[:unpacker.bytesread], unpacker.offsetinfile)
 
             # search the data for known signatures in the data that was read
             # TODO: check why this is a while true loop
             # instead of:
             # while unpacker.get_current_offset_in_file() != self.fileresult.filesize:
             while True:
-                candidateoffsetsfound = set()
-                for s, unpackparsers in \
-                    bangsignatures.signature_to_unpackparser.items():
-                    offsets = unpacker.find_offsets_for_signature(s,
-                            unpackparsers, self.fileresult.filesize)
-                    candidateoffsetsfound.update(offsets)
+                candidateoffsetsfound = unpacker.find_offsets_for_signatures(
+                        self.fileresult.filesize)
 
                 # For each of the found candidates see if any
                 # data can be unpacked. Process these in the order
@@ -275,119 +316,8 @@ class ScanJob:
                         continue
 
                     signaturesfound.append(offset_with_unpackparser)
-
-                    # always change to the declared unpacking directory
-                    os.chdir(self.scanenvironment.unpackdirectory)
-                    # then create an unpacking directory specifically
-                    # for the signature including the pretty printed signature
-                    # name and a counter for the signature.
-                    # pretty_signature = bangsignatures.signatureprettyprint.get(signature, signature)
-                    namecounter = counterspersignature.get(unpackparser.pretty_name, 0) + 1
-                    namecounter = unpacker.make_data_unpack_directory(self.fileresult.filename,
-                            unpackparser.pretty_name, offset, namecounter)
-
-                    # run the scan for the offset that was found
-                    # First log which identifier was found and
-                    # at which offset for possible later analysis.
-                    log(logging.DEBUG, "TRYING %s %s at offset: %d" %
-                        (self.fileresult.filename, unpackparser.pretty_name, offset))
-
-                    try:
-                        unpackresult = unpacker.try_unpack_file_for_signatures(
-                            self.fileresult, self.scanenvironment,
-                            unpackparser, offset)
-                    except UnpackParserException as e:
-                        # No data could be unpacked for some reason,
-                        # so log the status and error message
-                        log(logging.DEBUG, "FAIL %s %s at offset: %d: %s" %
-                            (self.fileresult.filename, unpackparser.pretty_name, offset,
-                             e.args))
-
-                        # Fatal errors should lead to the program
-                        # stopping execution. Ignored for now.
-                        # if unpackresult['error']['fatal']:
-                        #    pass
-
-                        unpacker.remove_data_unpack_directory_tree()
-
-                        # unfortunately it is not correct to store
-                        # the last inspected offset, as it could be
-                        # that later some signatures are found that
-                        # for that format only occur later in the file
-                        # such as ISO9660 or ext2. It would be possible
-                        # that these signatures are then missed. This
-                        # could lead to some overlap and redundant
-                        # scanning. TODO: find an elegant solution for this.
-                        continue
-
-                    # first rewrite the offset, if needed
-                    # (example: coreboot file system)
-                    offset = unpackresult.get('offset', offset)
-
-                    # the file could be unpacked successfully,
-                    # so log it as such.
-                    log(logging.INFO, "SUCCESS %s %s at offset: %d, length: %d" %
-                        (self.fileresult.filename, unpackparser.pretty_name, offset, unpackresult['length']))
-
-                    # store the name counter
-                    counterspersignature[unpackparser.pretty_name] = namecounter
-
-                    # store the labels for files that could be
-                    # unpacked/verified completely.
-                    if offset == 0 and unpackresult['length'] == self.fileresult.filesize:
-                        self.fileresult.labels.update(unpackresult['labels'])
-                        # self.labels = list(set(self.labels))
-                        # if unpackedfilesandlabels is empty, then no
-                        # files were unpacked, likely because the whole
-                        # file was the result and didn't contain any
-                        # files (i.e. it was not a container file or
-                        # compressed file).
-                        if unpackresult['filesandlabels'] == []:
-                            unpacker.remove_data_unpack_directory()
-
-                    # store the range of the unpacked data
-                    unpacker.append_unpacked_range(offset, offset + unpackresult['length'])
-
-                    # store lot of information about the unpacked files
-                    report = {
-                        'offset': offset,
-                        # TODO: signature text or index?
-                        'signature': unpackparser.pretty_name,
-                        'type': unpackparser.pretty_name,
-                        'size': unpackresult['length'],
-                        'files': [],
-                    }
-
-                    if 'metadata' in unpackresult:
-                        self.fileresult.set_metadata(unpackresult['metadata'])
-
-                    # set unpackdirectory, but only if needed: if the entire
-                    # file is a file that was verified (example: GIF or PNG)
-                    # then there will not be an unpacking directory.
-                    if unpackresult['filesandlabels'] != []:
-                        report['unpackdirectory'] = \
-                            str(unpacker.get_data_unpack_directory())
-
-                    for unpackedfile, unpackedlabel in unpackresult['filesandlabels']:
-                        # TODO: make relative wrt unpackdir?
-                        report['files'].append(str(unpackedfile))
-                        # add the data, plus possibly any label
-                        fr = FileResult(
-                            pathlib.Path(unpackedfile),
-                            self.fileresult.filename,
-                            self.fileresult.labels,
-                            set(unpackedlabel))
-                        j = ScanJob(fr)
-                        self.scanenvironment.scanfilequeue.put(j)
-
-                    self.fileresult.add_unpackedfile(report)
-
-                    # skip over all of the indexes that are now known
-                    # to be false positives
-                    unpacker.set_last_unpacked_offset(offset + unpackresult['length'])
-
-                    # something was unpacked, so record it as such
-                    unpacker.set_needs_unpacking(False)
+                    self.try_signature_candidate(unpacker, offset,
+                            unpackparser, counterspersignature)
 
                 # check if the end of file has been reached, if so exit
                 if unpacker.get_current_offset_in_file() == self.fileresult.filesize:
@@ -401,40 +331,168 @@ class ScanJob:
 
                 unpacker.seek_to_find_next_signature()
                 unpacker.read_chunk_from_scanfile()
+                self.contents.feed(unpacker.scanbytes[:unpacker.bytesread], unpacker.offsetinfile)
 
             unpacker.close_scanfile()
+            self.finish_content_computations()
+
+    def check_for_signatures_in_mmap(self, unpacker):
+        '''Search the whole file for known signatures through a memory
+        mapping of the file, instead of reading it in chunks.'''
+        counterspersignature = {}
+        self.start_content_computations()
+
+        (filename_full, window) = self.get_scan_window()
+        unpacker.open_scanfile_with_mmap(filename_full, window)
+        candidates = unpacker.find_offsets_for_signatures_in_mmap(self.fileresult.filesize)
+        try:
+            # the candidates are found in the order of the offsets
+            for offset, unpackparser in candidates:
+                if unpacker.offset_overlaps_with_unpacked_data(offset):
+                    continue
+                self.try_signature_candidate(unpacker, offset,
+                        unpackparser, counterspersignature)
+        finally:
+            # the search holds on to the memory mapping, so it
+            # should be stopped first.
+            candidates.close()
+            # compute the hashes and other properties from the mapping
+            # as well, which is in memory now
+            self.contents.feed(unpacker.scanbytes, 0)
+            unpacker.close_scanfile()
+        self.finish_content_computations()
+
+    def try_signature_candidate(self, unpacker, offset, unpackparser, counterspersignature):
+        '''Try to unpack data at an offset where a signature for the
+        UnpackParser was found, and record the results.'''
+        # always change to the declared unpacking directory
+        os.chdir(self.scanenvironment.unpackdirectory)
+        # then choose an unpacking directory specifically
+        # for the signature including the pretty printed signature
+        # name and a counter for the signature. The directory is
+        # only created when the UnpackParser unpacks data.
+        # pretty_signature = bangsignatures.signatureprettyprint.get(signature, signature)
+        namecounter = counterspersignature.get(unpackparser.pretty_name, 0) + 1
+        namecounter = unpacker.make_data_unpack_directory(self.fileresult.filename,
+                unpackparser.pretty_name, offset, namecounter, create=False)
+
+        # run the scan for the offset that was found
+        # First log which identifier was found and
+        # at which offset for possible later analysis.
+        log(logging.DEBUG, "TRYING %s %s at offset: %d" %
+            (self.fileresult.filename, unpackparser.pretty_name, offset))
+
+        try:
+            unpackresult = unpacker.try_unpack_file_for_signatures(
+                self.fileresult, self.scanenvironment,
+                unpackparser, offset)
+        except UnpackParserException as e:
+            # No data could be unpacked for some reason,
+            # so log the status and error message
+            log(logging.DEBUG, "FAIL %s %s at offset: %d: %s" %
+                (self.fileresult.filename, unpackparser.pretty_name, offset,
+                 e.args))
+
+            # Fatal errors should lead to the program
+            # stopping execution. Ignored for now.
+            # if unpackresult['error']['fatal']:
+            #    pass
+
+            unpacker.remove_data_unpack_directory_tree()
+
+            # the inspected data is not recorded as
+            # unpacked, as some formats have signatures that
+            # only occur later in the file (such as ISO9660
+            # or ext2), and could still claim this data.
+            return
+
+        # first rewrite the offset, if needed
+        # (example: coreboot file system)
+        offset = unpackresult.get('offset', offset)
+
+        # the file could be unpacked successfully,
+        # so log it as such.
+        log(logging.INFO, "SUCCESS %s %s at offset: %d, length: %d" %
+            (self.fileresult.filename, unpackparser.pretty_name, offset, unpackresult['length']))
+
+        # store the name counter
+        counterspersignature[unpackparser.pretty_name] = namecounter
+
+        # store the labels for files that could be
+        # unpacked/verified completely.
+        if offset == 0 and unpackresult['length'] == self.fileresult.filesize:
+            self.fileresult.labels.update(unpackresult['labels'])
+            # self.labels = list(set(self.labels))
+            # if unpackedfilesandlabels is empty, then no
+            # files were unpacked, likely because the whole
+            # file was the result and didn't contain any
+            # files (i.e. it was not a container file or
+            # compressed file).
+            if unpackresult['filesandlabels'] == []:
+                unpacker.remove_data_unpack_directory()
+
+        # store the range of the unpacked data, so the
+        # candidates in this range are skipped as they are
+        # known to be false positives
+        unpacker.append_unpacked_range(offset, offset + unpackresult['length'])
+
+        # store lot of information about the unpacked files
+        report = {
+            'offset': offset,
+            # TODO: signature text or index?
+            'signature': unpackparser.pretty_name,
+            'type': unpackparser.pretty_name,
+            'size': unpackresult['length'],
+            'files': [],
+        }
+
+        if 'metadata' in unpackresult:
+            self.fileresult.set_metadata(unpackresult['metadata'])
+
+        # set unpackdirectory, but only if needed: if the entire
+        # file is a file that was verified (example: GIF or PNG)
+        # then there will not be an unpacking directory.
+        if unpackresult['filesandlabels'] != []:
+            report['unpackdirectory'] = \
+                str(unpacker.get_data_unpack_directory())
+
+        virtualfiles = unpackresult.get('virtualfiles', {})
+        for unpackedfile, unpackedlabel in unpackresult['filesandlabels']:
+            # TODO: make relative wrt unpackdir?
+            report['files'].append(str(unpackedfile))
+            # add the data, plus possibly any label
+            self.queue_unpacked_file(unpackedfile, unpackedlabel,
+                    virtualfiles.get(unpackedfile))
+
+        self.fileresult.add_unpackedfile(report)
+
+        # something was unpacked, so record it as such
+        unpacker.set_needs_unpacking(False)
 
     def is_padding(self, filename):
-        # try to see if the file contains NUL byte padding
-        # or 0xFF padding and if so tag it as such
-        validpadding = [b'\x00', b'\xff']
-        ispadding = True
         outfile = open(filename, 'rb')
-        c = outfile.read(1)
-        if c in validpadding:
-            padding_char = c
-            while c == padding_char:
-                c = outfile.read(1)
-            ispadding = c == b''
-        else:
-            ispadding = False
+        ispadding = self.is_padding_data(outfile)
         outfile.close()
         return ispadding
 
-        checkbytes = outfile.read(1)
-        if checkbytes in validpadding:
-            paddingchar = checkbytes
-            # now read more bytes
-            while True:
-                scanbytes = outfile.read(self.scanenvironment.get_maxbytes())
-                if scanbytes == b'':
-                    break
-                if scanbytes != len(scanbytes) * paddingchar:
-                    ispadding = False
-                    break
-        else:
-            ispadding = False
-        outfile.close()
+    def is_padding_data(self, outfile):
+        # try to see if the data contains NUL byte padding
+        # or 0xFF padding and if so tag it as such. The data is
+        # compared to a block of padding in large blocks, instead
+        # of byte by byte.
+        scanbytes = outfile.read(paddingblocksize)
+        paddingchar = scanbytes[:1]
+        if paddingchar not in validpadding:
+            return False
+        paddingblock = paddingchar * paddingblocksize
+        while scanbytes != b'':
+            if len(scanbytes) == paddingblocksize:
+                if scanbytes != paddingblock:
+                    return False
+            elif scanbytes != paddingchar * len(scanbytes):
+                return False
+            scanbytes = outfile.read(paddingblocksize)
+        return True
 
     def carve_file_data(self, unpacker):
         # Now carve any data that was not unpacked from the file and
@@ -444,89 +502,182 @@ class ScanJob:
         #
         # This also makes it easier for doing a "post mortem".
         unpacked_range = unpacker.unpacked_range()
-        if unpacked_range != []:
-            # first check if the first entry covers the entire file
-            # because if so there is nothing to do
-            if unpacked_range[0] != (0, self.fileresult.filesize):
-                synthesizedcounter = 1
-
-                # Invariant: everything up to carve_index has been inspected
-                carve_index = 0
-
-                filename_full = self.scanenvironment.unpack_path(self.fileresult.filename)
-                scanfile = open(filename_full, 'rb')
-                scanfile.seek(carve_index)
-
-                # then try to see if the any useful data can be uncarved.
-                # Add an artifical entry for the end of the file
-                # TODO: why self.fileresult.filesize + 1 ?
-                # unpack ranges are [u_low:u_high)
-                for u_low, u_high in unpacked_range + [(self.fileresult.filesize+1, self.fileresult.filesize+1)]:
-                    if carve_index == self.fileresult.filesize:
-                        break
-                    # get the bytes from range [carve_index:u_low)
-                    if u_low > carve_index:
-                        #if u_low - carve_index < scanenvironment.get_synthesizedminimum():
-                        #        carve_index = u_high
-                        #        continue
-                        synthesizedcounter = unpacker.make_data_unpack_directory(self.fileresult.filename, "synthesized", carve_index, synthesizedcounter)
-
-                        outfile_rel = os.path.join(unpacker.get_data_unpack_directory(), "unpacked-%s-%s" % (hex(carve_index), hex(u_low-1)))
-                        outfile_full = self.scanenvironment.unpack_path(outfile_rel)
-
-                        # create the unpacking directory and write the file
-                        os.makedirs(outfile_full.parent, exist_ok=True)
-
-                        outfile = open(outfile_full, 'wb')
-                        os.sendfile(outfile.fileno(), scanfile.fileno(), carve_index, u_low - carve_index)
-                        outfile.close()
-
-                        unpackedlabel = ['synthesized']
-
-                        if self.is_padding(outfile_full):
-                            unpackedlabel.append('padding')
-                            if self.scanenvironment.get_paddingname() is not None:
-                                newoutfile_rel = os.path.join(unpacker.get_data_unpack_directory(), "%s-%s-%s" % (self.scanenvironment.get_paddingname(), hex(carve_index), hex(u_low-1)))
-                                newoutfile_full = self.scanenvironment.unpack_path(newoutfile_rel)
-                                shutil.move(outfile_full, newoutfile_full)
-                                outfile_rel = newoutfile_rel
-
-                        # add the data, plus labels, to the queue
-                        fr = FileResult(
-                            pathlib.Path(outfile_rel),
-                            self.fileresult.filename,
-                            self.fileresult.labels,
-                            set(unpackedlabel))
-                        j = ScanJob(fr)
-                        self.scanenvironment.scanfilequeue.put(j)
-
-                        # ugly hack to work around default behaviour of make_data_unpack_directory
-                        synthesizedcounter += 1
-                    carve_index = u_high
-
-                scanfile.close()
+        if len(unpacked_range) == 0:
+            return
+        # the byte ranges [carve_index:carve_end) that were not unpacked
+        carve_ranges = unpacked_range.gaps(0, self.fileresult.filesize)
+        if carve_ranges == []:
+            # the entire file was unpacked, so there is nothing to do
+            return
+
+        synthesizedcounter = 1
+
+        (filename_full, dataoffset) = VirtualFile.data_location(
+                self.scanenvironment, self.fileresult)
+        scanfile = open(filename_full, 'rb')
+        usevirtualfiles = self.scanenvironment.get_virtualfiles()
+
+        # then try to see if the any useful data can be uncarved.
+        for carve_index, carve_end in carve_ranges:
+            carve_size = carve_end - carve_index
+
+            # the name of the carved data has the offset of the last
+            # byte of the data, except at the end of the file, where
+            # it has the size of the file.
+            if carve_end == self.fileresult.filesize:
+                carve_last = carve_end
+            else:
+                carve_last = carve_end - 1
 
-    def do_content_computations(self):
+            # check for padding before the data is written
+            outfile = VirtualFile.open_range(filename_full,
+                    dataoffset + carve_index, carve_size)
+            ispadding = self.is_padding_data(outfile)
+            outfile.close()
+
+            if ispadding and self.scanenvironment.get_skippadding():
+                # only record the padding as a range of the file
+                report = {
+                    'offset': carve_index,
+                    'type': 'padding',
+                    'size': carve_size,
+                    'files': [],
+                }
+                self.fileresult.add_unpackedfile(report)
+                continue
+
+            synthesizedcounter = unpacker.make_data_unpack_directory(self.fileresult.filename, "synthesized", carve_index, synthesizedcounter)
+
+            outfile_rel = os.path.join(unpacker.get_data_unpack_directory(), "unpacked-%s-%s" % (hex(carve_index), hex(carve_last)))
+            outfile_full = self.scanenvironment.unpack_path(outfile_rel)
+
+            if usevirtualfiles:
+                # only refer to the data instead of writing it
+                virtualrange = VirtualFile.virtual_range(self.fileresult,
+                        carve_index, carve_size)
+            else:
+                virtualrange = None
+
+                # create the unpacking directory and write the file
+                os.makedirs(outfile_full.parent, exist_ok=True)
+
+                outfile = open(outfile_full, 'wb')
+                bangio.copy_range(outfile.fileno(), scanfile.fileno(), dataoffset + carve_index, carve_size)
+                outfile.close()
+
+            unpackedlabel = ['synthesized']
+
+            if ispadding:
+                unpackedlabel.append('padding')
+                if self.scanenvironment.get_paddingname() is not None:
+                    newoutfile_rel = os.path.join(unpacker.get_data_unpack_directory(), "%s-%s-%s" % (self.scanenvironment.get_paddingname(), hex(carve_index), hex(carve_last)))
+                    newoutfile_full = self.scanenvironment.unpack_path(newoutfile_rel)
+                    if not usevirtualfiles:
+                        shutil.move(outfile_full, newoutfile_full)
+                    outfile_rel = newoutfile_rel
+
+            # add the data, plus labels, to the queue
+            self.queue_unpacked_file(outfile_rel, unpackedlabel, virtualrange)
+
+            # ugly hack to work around default behaviour of make_data_unpack_directory
+            synthesizedcounter += 1
+
+        scanfile.close()
+
+    def _create_hasher(self):
+        return Hasher(self.scanenvironment.get_hash_algorithms(),
+                get_hash_executor(self.scanenvironment.get_hashthreads()))
+
+    def compute_hashes(self):
+        '''Compute only the hashes of the file, so duplicates can be
+        detected before any unpacking work is done.'''
         fc = FileContentsComputer(self.scanenvironment.get_readsize())
-        hasher = Hasher(hash_algorithms)
+        hasher = self._create_hasher()
         fc.subscribe(hasher)
 
-        if self.scanenvironment.get_createbytecounter() and 'padding' not in self.fileresult.labels:
-            byte_counter = ByteCounter()
-            fc.subscribe(byte_counter)
+        scanfile = VirtualFile.open_file(self.scanenvironment, self.fileresult)
+        fc.read_file(scanfile, self.fileresult.filesize)
+        scanfile.close()
 
-        is_text = IsTextComputer()
-        fc.subscribe(is_text)
+        for hash_algorithm, hash_value in hasher.get().items():
+            self.fileresult.set_hashresult(hash_algorithm, hash_value)
+
+    def check_for_duplicate(self, processlock, checksumdict):
+        '''Check if a file with the same hash was already scanned. If not,
+        the file is registered as the canonical copy for its hash.'''
+        duplicate = False
+        processlock.acquire()
 
+        if self.fileresult.get_hash() in checksumdict:
+            duplicate = True
+            canonical = checksumdict[self.fileresult.get_hash()]
+        else:
+            checksumdict[self.fileresult.get_hash()] = self.fileresult.filename
+        processlock.release()
+
+        if duplicate:
+            self.fileresult.set_duplicateof(canonical)
+        return duplicate
+
+    def start_content_computations(self):
+        '''Set up the computations of the hashes and other properties of
+        the contents of the file. The data of the file can then be passed
+        to self.contents while it is read for other reasons, such as the
+        search for signatures, so the file is not read again.'''
+        self.contents = FileContentsComputer(self.scanenvironment.get_readsize())
+        self.contentcomputers = {}
+
+        # hashes might already have been computed, for example
+        # when deduplicating files before unpacking.
+        if self.fileresult.get_hashresult() == {}:
+            self.contentcomputers['hasher'] = self._create_hasher()
+
+        # byte statistics are stored in the results whenever they are
+        # cheap, the bytecounter setting only decides if they are also
+        # written to the result files.
+        if (self.scanenvironment.get_createbytecounter() or fast_byte_statistics) \
+                and 'padding' not in self.fileresult.labels:
+            self.contentcomputers['entropy'] = EntropyComputer()
+
+        self.contentcomputers['istext'] = IsTextComputer()
+
+        # labels that are added later can only rule out TLSH, which is
+        # checked again when the results are stored.
         if self.scanenvironment.use_tlsh(self.fileresult.filesize, self.fileresult.labels):
-            tlshc = TLSHComputerMemoryView()
-            fc.subscribe(tlshc)
+            self.contentcomputers['tlsh'] = TLSHComputerMemoryView()
 
-        filename_full = self.scanenvironment.unpack_path(self.fileresult.filename)
-        fc.read(filename_full)
+        for computer in self.contentcomputers.values():
+            self.contents.subscribe(computer)
 
-        hashresults = dict(hasher.get())
-        if self.scanenvironment.use_tlsh(self.fileresult.filesize, self.fileresult.labels):
+        self.contentsfile = VirtualFile.open_file(self.scanenvironment, self.fileresult)
+        self.contents.start(self.contentsfile, self.fileresult.filesize)
+
+    def finish_content_computations(self):
+        '''Process the data of the file that was not passed to
+        self.contents yet.'''
+        if self.contentsfile is None:
+            return
+        self.contents.finish()
+        self.contentsfile.close()
+        self.contentsfile = None
+
+    def do_content_computations(self):
+        if self.contents is None:
+            self.start_content_computations()
+        self.finish_content_computations()
+
+        compute_hashes = 'hasher' in self.contentcomputers
+        hasher = self.contentcomputers.get('hasher')
+        entropy = self.contentcomputers.get('entropy')
+        is_text = self.contentcomputers['istext']
+        tlshc = self.contentcomputers.get('tlsh')
+
+        if compute_hashes:
+            hashresults = dict(hasher.get())
+        else:
+            hashresults = {}
+        if tlshc is not None and \
+                self.scanenvironment.use_tlsh(self.fileresult.filesize, self.fileresult.labels):
             # there might not be a valid hex digest for files
             # with little or no entropy, for example files with
             # all NUL bytes
@@ -537,21 +688,24 @@ class ScanJob:
         for hash_algorithm, hash_value in hashresults.items():
             self.fileresult.set_hashresult(hash_algorithm, hash_value)
 
-        if self.scanenvironment.get_createbytecounter() and 'padding' not in self.fileresult.labels:
-            self.fileresult.byte_counter = byte_counter
+        if entropy is not None:
+            self.fileresult.set_byte_statistics(entropy.get_histogram(), entropy.get())
 
-        # store if files are text or binary
+        # store if files are text or binary, and the ratio of printable
+        # bytes for later checks
+        self.fileresult.printable_ratio = is_text.get_printable_ratio()
         if is_text.get():
             self.fileresult.labels.add('text')
         else:
             self.fileresult.labels.add('binary')
 
     def check_entire_file(self, unpacker):
-        if 'text' in self.fileresult.labels and unpacker.unpacked_range() == []:
+        if 'text' in self.fileresult.labels and len(unpacker.unpacked_range()) == 0:
             for unpack_parser in \
                     bangsignatures.unpackers_for_featureless_files:
                 namecounter = unpacker.make_data_unpack_directory(
-                        self.fileresult.filename, unpack_parser.pretty_name, 0, 1)
+                        self.fileresult.filename, unpack_parser.pretty_name, 0, 1,
+                        create=False)
 
                 log(logging.DEBUG, "TRYING %s %s at offset: 0" %
                         (self.fileresult.filename, unpack_parser.pretty_name))
@@ -609,25 +763,87 @@ class ScanJob:
                 if 'metadata' in unpackresult:
                     self.fileresult.set_metadata(unpackresult['metadata'])
 
-                unpacker.set_last_unpacked_offset(unpackresult['length'])
                 unpacker.append_unpacked_range(0, unpackresult['length'])
 
+                virtualfiles = unpackresult.get('virtualfiles', {})
                 for unpackedfile, unpackedlabel in unpackresult['filesandlabels']:
                     # TODO: make relative wrt unpackdir
                     report['files'].append(str(unpackedfile))
 
                     # add the data, plus possibly any label
-                    fr = FileResult(
-                        pathlib.Path(unpackedfile),
-                        self.fileresult.filename,
-                        self.fileresult.labels,
-                        set(unpackedlabel))
-                    j = ScanJob(fr)
-                    self.scanenvironment.scanfilequeue.put(j)
+                    self.queue_unpacked_file(unpackedfile, unpackedlabel,
+                            virtualfiles.get(unpackedfile))
 
                 self.fileresult.add_unpackedfile(report)
                 break
 
+    def write_result_files(self, resultout):
+        '''Write the per file results to a pickle (and optionally JSON)
+        named after the SHA256 of the file.'''
+        picklefilename = self.scanenvironment.resultsdirectory / ("%s.pickle" % self.fileresult.get_hash('sha256'))
+        # TODO: this is vulnerable to a race condition, replace with EAFP pattern
+        if not picklefilename.exists():
+            pickleout = picklefilename.open('wb')
+            pickle.dump(resultout, pickleout)
+            pickleout.close()
+
+        if self.scanenvironment.get_createjson():
+            jsonfilename = self.scanenvironment.resultsdirectory / ("%s.json" % self.fileresult.get_hash('sha256'))
+            # TODO: this is vulnerable to a race condition, replace with EAFP pattern
+            if not jsonfilename.exists():
+                jsonout = jsonfilename.open('w')
+                json.dump(resultout, jsonout, indent=4)
+                jsonout.close()
+
+    def restore_from_cache(self, entry, processlock, checksumdict):
+        '''Report the results for the file, and all files that were
+        unpacked from it, using an entry from the result cache instead of
+        unpacking and scanning the file.'''
+        prefix = str(self.fileresult.filename)
+        self.fileresult.labels.update(entry['labels'])
+        for hash_algorithm, hash_value in entry['hash'].items():
+            self.fileresult.set_hashresult(hash_algorithm, hash_value)
+        if entry['mimetype']:
+            self.check_mime_types()
+        if entry['metadata'] is not None:
+            self.fileresult.set_metadata(entry['metadata'])
+        if entry['bytecount'] is not None:
+            self.fileresult.set_byte_statistics(entry['bytecount'], entry['entropy'])
+
+        if entry['unpackedfiles'] is not None:
+            self.prepare_for_unpacking()
+            for report in entry['unpackedfiles']:
+                report = dict(report)
+                report['files'] = [prefix + f for f in report['files']]
+                if 'unpackdirectory' in report:
+                    report['unpackdirectory'] = prefix + report['unpackdirectory']
+                self.fileresult.add_unpackedfile(report)
+
+        self.write_result_files(entry['resultout'])
+        self.scanenvironment.resultqueue.put(self.fileresult)
+
+        for child in entry['children']:
+            fr = FileResult(
+                pathlib.Path(prefix + child['name']),
+                self.fileresult.filename,
+                self.fileresult.labels,
+                set(child['labels']))
+            if 'sha256' not in child:
+                self.scanenvironment.resultqueue.put(fr)
+                continue
+
+            fr.set_filesize(child['entry']['filesize'])
+            for hash_algorithm, hash_value in child['entry']['hash'].items():
+                fr.set_hashresult(hash_algorithm, hash_value)
+            j = ScanJob(fr)
+            j.set_scanenvironment(self.scanenvironment)
+            if j.check_for_duplicate(processlock, checksumdict) and \
+                    self.scanenvironment.get_dedupfirst():
+                j.check_mime_types()
+                self.scanenvironment.resultqueue.put(fr)
+                continue
+            j.restore_from_cache(child['entry'], processlock, checksumdict)
+
     def run_scans_on_file(self, bangfilefunctions, dbconn, dbcursor):
         for filefunc in bangfilefunctions:
             if self.fileresult.labels.isdisjoint(set(filefunc.ignore)):
@@ -655,56 +871,95 @@ def processfile(dbconn, dbcursor, scanenvironment):
     checksumdict = scanenvironment.checksumdict
 
     createbytecounter = scanenvironment.get_createbytecounter()
-    createjson = scanenvironment.get_createjson()
+    resultcache = scanenvironment.get_resultcache()
 
     carveunpacked = True
 
     while True:
         try:
             scanjob = scanfilequeue.get(timeout=86400)
-            if not scanjob: continue
-            scanjob.set_scanenvironment(scanenvironment)
-            scanjob.initialize()
+            # None is the signal that all files have been scanned
+            if scanjob is None:
+                return
+            # jobs of a batch of scans each have the scan environment
+            # of their scan
+            jobenvironment = scanenvironment.get_environment_for_scan(scanjob.scan)
+            scanfilequeue = jobenvironment.scanfilequeue
+            resultqueue = jobenvironment.resultqueue
+            checksumdict = jobenvironment.checksumdict
+            scanjob.set_scanenvironment(jobenvironment)
+            banglogging.set_scan_log(jobenvironment.logfile)
             fileresult = scanjob.fileresult
 
-            unscannable = scanjob.check_unscannable_file()
+            # the time of each phase is recorded in the result of the file
+            with phase_timer(fileresult, 'stat'):
+                scanjob.initialize()
+                unscannable = scanjob.check_unscannable_file()
             if unscannable:
                 resultqueue.put(scanjob.fileresult)
                 scanfilequeue.task_done()
                 continue
 
-            unpacker = UnpackManager(scanenvironment.unpackdirectory)
-            scanjob.prepare_for_unpacking()
-            scanjob.check_for_padding_file(unpacker)
-            scanjob.check_for_unpacked_file(unpacker)
-            scanjob.check_mime_types()
+            # optionally compute the hash first, so duplicate files
+            # (and everything inside them) are not unpacked again.
+            # This is also needed to look up the file in the result cache.
+            if scanenvironment.get_dedupfirst() or resultcache is not None:
+                with phase_timer(fileresult, 'hashes'):
+                    scanjob.compute_hashes()
+                with phase_timer(fileresult, 'dedup'):
+                    duplicate = scanjob.check_for_duplicate(processlock, checksumdict)
+                if duplicate and scanenvironment.get_dedupfirst():
+                    scanjob.check_mime_types()
+                    resultqueue.put(scanjob.fileresult)
+                    scanfilequeue.task_done()
+                    continue
+
+                # reuse the results of an earlier scan, if any
+                if resultcache is not None:
+                    with phase_timer(fileresult, 'cache'):
+                        entry = resultcache.get_subtree(scanjob.fileresult.get_hash())
+                    if entry is not None:
+                        scanjob.restore_from_cache(entry, processlock, checksumdict)
+                        scanfilequeue.task_done()
+                        continue
+
+            with phase_timer(fileresult, 'prepare'):
+                unpacker = UnpackManager(jobenvironment.unpackdirectory,
+                        scanenvironment.get_skiprandomdata())
+                scanjob.prepare_for_unpacking()
+                scanjob.check_for_padding_file(unpacker)
+                scanjob.check_for_unpacked_file(unpacker)
+                scanjob.check_mime_types()
 
             if unpacker.needs_unpacking():
-                scanjob.check_for_valid_extension(unpacker)
+                with phase_timer(fileresult, 'extension'):
+                    scanjob.check_for_valid_extension(unpacker)
 
             if unpacker.needs_unpacking():
-                scanjob.check_for_signatures(unpacker)
+                with phase_timer(fileresult, 'signatures'):
+                    scanjob.check_for_signatures(unpacker)
 
             if carveunpacked:
-                scanjob.carve_file_data(unpacker)
+                with phase_timer(fileresult, 'carving'):
+                    scanjob.carve_file_data(unpacker)
 
-            scanjob.do_content_computations()
+            with phase_timer(fileresult, 'content'):
+                scanjob.do_content_computations()
 
             if unpacker.needs_unpacking():
-                scanjob.check_entire_file(unpacker)
-
-            duplicate = False
-            processlock.acquire()
+                with phase_timer(fileresult, 'entirefile'):
+                    scanjob.check_entire_file(unpacker)
 
-            if scanjob.fileresult.get_hash() in checksumdict:
-                duplicate = True
-            else:
-                checksumdict[scanjob.fileresult.get_hash()] = scanjob.fileresult.filename
-            processlock.release()
+            # when the hash was computed first the file has already
+            # been checked for duplicates.
+            if not scanenvironment.get_dedupfirst() and resultcache is None:
+                with phase_timer(fileresult, 'dedup'):
+                    duplicate = scanjob.check_for_duplicate(processlock, checksumdict)
 
             if not duplicate:
                 if bangfilefunctions != [] and scanenvironment.runfilescans:
-                    scanjob.run_scans_on_file(bangfilefunctions, dbconn, dbcursor)
+                    with phase_timer(fileresult, 'filescans'):
+                        scanjob.run_scans_on_file(bangfilefunctions, dbconn, dbcursor)
 
                 # write a pickle with output data
                 # The pickle contains:
@@ -714,39 +969,26 @@ def processfile(dbconn, dbcursor, scanenvironment):
                 # * any extra data that might have been passed around
                 resultout = {}
 
-                if createbytecounter and 'padding' not in scanjob.fileresult.labels:
-                    resultout['bytecount'] = sorted(scanjob.fileresult.byte_counter.get().items())
-                    # also write a file with the distribution of bytes in the scanned file
-                    bytescountfilename = scanenvironment.resultsdirectory / ("%s.bytes" % scanjob.fileresult.get_hash())
-                    if not bytescountfilename.exists():
-                        bytesout = bytescountfilename.open('w')
-                        for by in resultout['bytecount']:
-                            bytesout.write("%d\t%d\n" % by)
-                        bytesout.close()
-
-                for a, h in scanjob.fileresult.get_hashresult().items():
-                    resultout[a] = h
-
-                resultout['labels'] = list(scanjob.fileresult.labels)
-                if scanjob.fileresult.metadata is not None:
-                    resultout['metadata'] = scanjob.fileresult.metadata
-
-                picklefilename = scanenvironment.resultsdirectory / ("%s.pickle" % scanjob.fileresult.get_hash('sha256'))
-                # TODO: this is vulnerable to a race condition, replace with EAFP pattern
-                if not picklefilename.exists():
-                    pickleout = picklefilename.open('wb')
-                    pickle.dump(resultout, pickleout)
-                    pickleout.close()
-
-                if createjson:
-                    jsonfilename = scanenvironment.resultsdirectory / ("%s.json" % scanjob.fileresult.get_hash('sha256'))
-                    # TODO: this is vulnerable to a race condition, replace with EAFP pattern
-                    if not jsonfilename.exists():
-                        jsonout = jsonfilename.open('w')
-                        json.dump(resultout, jsonout, indent=4)
-                        jsonout.close()
-            else:
-                scanjob.fileresult.labels.add('duplicate')
+                with phase_timer(fileresult, 'resultfiles'):
+                    if createbytecounter and 'padding' not in scanjob.fileresult.labels:
+                        resultout['bytecount'] = list(enumerate(scanjob.fileresult.bytecount))
+                        # also write a file with the distribution of bytes in the scanned file
+                        bytescountfilename = jobenvironment.resultsdirectory / ("%s.bytes" % scanjob.fileresult.get_hash())
+                        if not bytescountfilename.exists():
+                            bytesout = bytescountfilename.open('w')
+                            for by in resultout['bytecount']:
+                                bytesout.write("%d\t%d\n" % by)
+                            bytesout.close()
+                        resultout['entropy'] = scanjob.fileresult.entropy
+
+                    for a, h in scanjob.fileresult.get_hashresult().items():
+                        resultout[a] = h
+
+                    resultout['labels'] = list(scanjob.fileresult.labels)
+                    if scanjob.fileresult.metadata is not None:
+                        resultout['metadata'] = scanjob.fileresult.metadata
+
+                    scanjob.write_result_files(resultout)
 
             # scanjob.fileresult.set_filesize(scanjob.filesize)
 
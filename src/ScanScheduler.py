@@ -0,0 +1,426 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+
+# The ScanScheduler distributes ScanJobs over the worker processes
+# without a server process: jobs and results are passed through pipes
+# (multiprocessing.Queue) and the bookkeeping is done with a few
+# counters in shared memory.
+#
+# Every worker keeps the jobs it creates itself in a local deque and
+# works on the most recent one first, so most jobs never leave the
+# process that created them. Jobs are only handed over through the
+# shared queue when other workers are waiting for work: the oldest
+# jobs (which usually are the largest subtrees) are given away first.
+# A worker hands over jobs when it adds or takes a job while others are
+# waiting, and a waiting worker can also steal a job from the worker
+# with the most local jobs while that worker is busy with a job: every
+# worker has a thread that gives away its oldest job when asked to.
+
+import collections
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import os
+import pathlib
+import queue
+import struct
+import threading
+import time
+
+from banglogging import log
+
+
+class ScanScheduler:
+    """Distributes jobs over worker processes. Workers use put(), get()
+    and task_done() like a JoinableQueue, and put_result() to report
+    results. The process that created the scheduler starts the workers
+    and collects the results.
+
+    Jobs belong to a group, so several scans can share the workers:
+    every group is counted separately so the process that collects the
+    results knows when all results of a group have been collected."""
+    def __init__(self, groups=1):
+        self.sharedqueue = multiprocessing.Queue()
+        self.resultqueue = multiprocessing.Queue()
+        self.lock = multiprocessing.Lock()
+        # jobs per group that were put but are not done yet
+        self.pending = multiprocessing.RawArray('q', groups)
+        # results per group that were put
+        self.results = multiprocessing.RawArray('q', groups)
+        # workers waiting for a job from the shared queue
+        self.waiting = multiprocessing.RawValue('q', 0)
+        # jobs in the shared queue
+        self.queued = multiprocessing.RawValue('q', 0)
+        self.processes = []
+        self.closed = False
+        self.activegroups = set()
+        # seconds to wait for workers to stop after all jobs are done
+        self.stoptimeout = 60
+        # only workers have local jobs
+        self.localjobs = None
+        self.worker = None
+        # the number of local jobs of every worker, and the queues on
+        # which workers are asked to give away a job
+        self.localcounts = None
+        self.stealrequests = []
+
+    def put(self, job, group=0):
+        '''Add a job. Jobs of workers are kept local, unless another
+        worker is waiting for work.'''
+        self.lock.acquire()
+        self.pending[group] += 1
+        share = self.localjobs is None or self.waiting.value > self.queued.value
+        if share:
+            self.queued.value += 1
+        self.lock.release()
+        if share:
+            self.sharedqueue.put(job)
+        else:
+            self.localjobs.append(job)
+            self._update_localcount()
+
+    def _update_localcount(self):
+        self.localcounts[self.worker] = len(self.localjobs)
+
+    def _share_jobs(self):
+        '''Hand over local jobs to waiting workers, but keep at least one
+        job to work on.'''
+        self.lock.acquire()
+        count = min(self.waiting.value - self.queued.value, len(self.localjobs) - 1)
+        if count > 0:
+            self.queued.value += count
+        self.lock.release()
+        for i in range(count):
+            try:
+                job = self.localjobs.popleft()
+            except IndexError:
+                # the jobs were stolen in the meantime
+                self.lock.acquire()
+                self.queued.value -= count - i
+                self.lock.release()
+                break
+            self.sharedqueue.put(job)
+
+    def _serve_steal_requests(self):
+        '''Give away the oldest local job whenever another worker asks
+        for it, if a worker is still waiting for a job.'''
+        requests = self.stealrequests[self.worker]
+        while True:
+            requests.get()
+            job = None
+            self.lock.acquire()
+            if self.waiting.value > self.queued.value:
+                try:
+                    job = self.localjobs.popleft()
+                    self.queued.value += 1
+                except IndexError:
+                    pass
+            self.lock.release()
+            if job is not None:
+                self._update_localcount()
+                self.sharedqueue.put(job)
+
+    def _request_steal(self):
+        '''Ask the worker with the most local jobs to give one away.'''
+        if self.localcounts is None:
+            return
+        victim = max(range(len(self.localcounts)), key=lambda w: self.localcounts[w])
+        if victim != self.worker and self.localcounts[victim] > 0:
+            self.stealrequests[victim].put(self.worker)
+
+    def get(self, timeout=None):
+        '''Return the next job, or None if the worker should stop. Raises
+        queue.Empty if no job was available within timeout seconds.'''
+        if self.localjobs:
+            self._share_jobs()
+            try:
+                job = self.localjobs.pop()
+                self._update_localcount()
+                return job
+            except IndexError:
+                # the jobs were stolen in the meantime
+                pass
+
+        self.lock.acquire()
+        self.waiting.value += 1
+        self.lock.release()
+        self._request_steal()
+        try:
+            job = self.sharedqueue.get(timeout=timeout)
+        except queue.Empty:
+            self.lock.acquire()
+            self.waiting.value -= 1
+            self.lock.release()
+            raise
+        self.lock.acquire()
+        self.waiting.value -= 1
+        if job is not None:
+            self.queued.value -= 1
+        self.lock.release()
+        return job
+
+    def task_done(self, group=0):
+        '''Mark a job of a group as done.'''
+        self.lock.acquire()
+        self.pending[group] -= 1
+        finished = self.pending[group] == 0
+        resultcount = self.results[group]
+        self.lock.release()
+        if finished:
+            # results of other workers might still be on their way, so
+            # tell how many results there are.
+            self.resultqueue.put((group, None, resultcount))
+
+    def put_result(self, result, group=0):
+        '''Report a result for a group.'''
+        self.lock.acquire()
+        self.results[group] += 1
+        self.lock.release()
+        self.resultqueue.put((group, result, None))
+
+    def get_group_queues(self, group, scan=None):
+        '''Return a queue for jobs and a queue for results that can be used
+        like the queues of a single scan, for the jobs of a group. scan is
+        stored in every job that is put, so workers know which scan a job
+        belongs to.'''
+        return (GroupJobQueue(self, group, scan), GroupResultQueue(self, group))
+
+    def start_group(self, group):
+        '''Reset the counters of a group before jobs of the group are put
+        (again).'''
+        self.lock.acquire()
+        self.pending[group] = 0
+        self.results[group] = 0
+        self.lock.release()
+        self.activegroups.add(group)
+
+    def close(self):
+        '''Tell the scheduler that no more groups will be started, so the
+        workers can be stopped when all jobs are done.'''
+        self.closed = True
+
+    def _run_worker(self, worker, target, args):
+        self.worker = worker
+        self.localjobs = collections.deque()
+        threading.Thread(target=self._serve_steal_requests, daemon=True).start()
+        target(*args)
+
+    def start_workers(self, target, argslist):
+        '''Start a worker process for each tuple of arguments in argslist,
+        running target(*args). target should stop when get() returns
+        None.'''
+        self.localcounts = multiprocessing.RawArray('q', len(argslist))
+        self.stealrequests = [multiprocessing.SimpleQueue() for args in argslist]
+        for worker, args in enumerate(argslist):
+            process = multiprocessing.Process(target=self._run_worker,
+                                              args=(worker, target, args))
+            self.processes.append(process)
+        for process in self.processes:
+            process.start()
+
+    def _is_stalled(self):
+        '''Check if jobs are left that no worker can do any more, because
+        a worker that had them stopped unexpectedly.'''
+        alive = len([p for p in self.processes if p.is_alive()])
+        self.lock.acquire()
+        stalled = sum(self.pending) > 0 and self.queued.value == 0 and \
+                self.waiting.value >= alive
+        self.lock.release()
+        return stalled and alive < len(self.processes)
+
+    def collect_results(self):
+        '''Yield tuples (group, result) with the results of the workers.
+        When all results of a group have been yielded (group, None) is
+        yielded, after which the group can be started again. Stops when
+        the scheduler is closed, all groups are done and the workers have
+        stopped.'''
+        received = {}
+        expected = {}
+        stopping = False
+        while True:
+            if not stopping and self.closed and self.activegroups == set():
+                for process in self.processes:
+                    self.sharedqueue.put(None)
+                stopping = True
+                stoptime = time.monotonic()
+            try:
+                (group, result, resultcount) = self.resultqueue.get(timeout=0.1)
+            except queue.Empty:
+                if stopping:
+                    # workers send all their results before they exit.
+                    # A worker that was killed can leave the others
+                    # unable to send, so do not wait forever.
+                    if not any(p.is_alive() for p in self.processes):
+                        break
+                    if time.monotonic() - stoptime > self.stoptimeout:
+                        break
+                elif self._is_stalled():
+                    # no more results will come for the active groups
+                    log(logging.WARNING, "Worker stopped, %d jobs not done" % sum(self.pending))
+                    for group in sorted(self.activegroups):
+                        self.start_group(group)
+                        yield (group, None)
+                    self.activegroups = set()
+                    received = {}
+                    expected = {}
+                continue
+
+            if result is None:
+                expected[group] = resultcount
+            else:
+                received[group] = received.get(group, 0) + 1
+                yield (group, result)
+            if expected.get(group) == received.get(group, 0):
+                del expected[group]
+                received.pop(group, None)
+                self.activegroups.discard(group)
+                yield (group, None)
+
+    def stop_workers(self):
+        '''Wait for the workers to stop, after all results were collected.'''
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+
+class GroupJobQueue:
+    """The jobs of one group of a ScanScheduler, with the methods of a
+    JoinableQueue that are used in a scan."""
+    def __init__(self, scheduler, group, scan):
+        self.scheduler = scheduler
+        self.group = group
+        self.scan = scan
+
+    def put(self, job):
+        job.scan = self.scan
+        self.scheduler.put(job, self.group)
+
+    def get(self, timeout=None):
+        # workers take jobs of any group
+        return self.scheduler.get(timeout)
+
+    def task_done(self):
+        self.scheduler.task_done(self.group)
+
+    def get_group_queues(self, group, scan):
+        return self.scheduler.get_group_queues(group, scan)
+
+
+class GroupResultQueue:
+    """The results of one group of a ScanScheduler."""
+    def __init__(self, scheduler, group):
+        self.scheduler = scheduler
+        self.group = group
+
+    def put(self, result):
+        self.scheduler.put_result(result, self.group)
+
+
+class SharedChecksumDict:
+    """A dictionary from hashes to file names (pathlib.Path) that can be
+    shared between processes without a server process. The entries are
+    kept in a hash table in a single file in a directory, which every
+    process maps in memory. The file is sparse, so only the parts that
+    are used take up space. Like a dictionary that is shared through a
+    multiprocessing.Manager it does not lock by itself, so a lock should
+    be held to check and set an entry."""
+
+    # the table has slots of a fingerprint of the key and the position
+    # of the entry in the file (0 for empty slots), and is followed by the
+    # entries: the lengths of the key and the value, the key and the value.
+    slots = 1 << 21
+    slotformat = '<QQ'
+    entryformat = '<II'
+    size = 1 << 30
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self.slotsize = struct.calcsize(self.slotformat)
+        # the end of the entries is stored at the start of the file
+        self.tableoffset = 8
+        self.entriesoffset = self.tableoffset + self.slots * self.slotsize
+        fd = os.open(self.directory / 'checksums', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size != self.size:
+                os.ftruncate(fd, self.size)
+            self.table = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _fingerprint(key):
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(),
+                              byteorder='little')
+
+    def _find(self, key):
+        """Return the slot of key, and the position of its entry, or
+        0 if the key is not in the table and the slot is free."""
+        key = key.encode()
+        fingerprint = self._fingerprint(key)
+        slot = fingerprint % self.slots
+        while True:
+            (slotfingerprint, position) = struct.unpack_from(self.slotformat,
+                    self.table, self.tableoffset + slot * self.slotsize)
+            if position == 0:
+                return (slot, 0)
+            if slotfingerprint == fingerprint:
+                (keylength, valuelength) = struct.unpack_from(self.entryformat,
+                        self.table, position)
+                keystart = position + struct.calcsize(self.entryformat)
+                if self.table[keystart:keystart+keylength] == key:
+                    return (slot, position)
+            slot = (slot + 1) % self.slots
+
+    def __contains__(self, key):
+        return self._find(key)[1] != 0
+
+    def __getitem__(self, key):
+        position = self._find(key)[1]
+        if position == 0:
+            raise KeyError(key)
+        (keylength, valuelength) = struct.unpack_from(self.entryformat,
+                self.table, position)
+        valuestart = position + struct.calcsize(self.entryformat) + keylength
+        return pathlib.Path(self.table[valuestart:valuestart+valuelength].decode())
+
+    def __setitem__(self, key, value):
+        # an existing entry is replaced by a new entry in the same slot
+        (slot, position) = self._find(key)
+        (end, ) = struct.unpack_from('<Q', self.table, 0)
+        if end == 0:
+            end = self.entriesoffset
+        key = key.encode()
+        value = str(value).encode()
+        entry = struct.pack(self.entryformat, len(key), len(value)) + key + value
+        if end + len(entry) > self.size:
+            raise ValueError("no space left for checksums")
+        self.table[end:end+len(entry)] = entry
+        struct.pack_into('<Q', self.table, 0, end + len(entry))
+        # the position is written last, as it marks the slot as used
+        # for processes that look up entries without holding the lock.
+        struct.pack_into('<Q', self.table, self.tableoffset + slot * self.slotsize,
+                self._fingerprint(key))
+        struct.pack_into('<Q', self.table, self.tableoffset + slot * self.slotsize + 8,
+                end)
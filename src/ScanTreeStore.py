@@ -0,0 +1,118 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# On disk storage for the scan tree. The result of every file is
+# appended to a JSON Lines file as soon as it arrives, instead of keeping
+# all results in memory until the scan is done. Only an index with the
+# position of each result in the file is kept in memory.
+
+import json
+import collections.abc
+
+
+class ScanTreeStore(collections.abc.Mapping):
+    """A read only mapping from file names to the results of the files,
+    stored in a JSON Lines file. Every line is a JSON object with the
+    name of the file and the result of the file. Results are read from
+    the file when they are needed, so iterating over items() or values()
+    only has one result in memory at a time."""
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self.storefile = None
+
+    @classmethod
+    def create(cls, path):
+        '''Create a new, empty store in path that results can be added
+        to.'''
+        store = cls(path)
+        store.storefile = open(path, 'w+b')
+        return store
+
+    @classmethod
+    def open(cls, path):
+        '''Open an existing store, for example one from a previous scan.'''
+        store = cls(path)
+        store.storefile = open(path, 'rb')
+        position = 0
+        for line in store.storefile:
+            record = json.loads(line)
+            store.index[record['name']] = position
+            position += len(line)
+        return store
+
+    def add(self, filename, result):
+        '''Append the result of the file filename to the store. A later
+        result for the same file replaces the earlier one.'''
+        line = json.dumps({'name': filename, 'result': result}).encode() + b'\n'
+        self.storefile.seek(0, 2)
+        self.index[filename] = self.storefile.tell()
+        self.storefile.write(line)
+
+    def _read(self, position):
+        self.storefile.seek(position)
+        return json.loads(self.storefile.readline())
+
+    def __getitem__(self, filename):
+        return self._read(self.index[filename])['result']
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, filename):
+        return filename in self.index
+
+    def items(self):
+        '''Yield (file name, result) pairs, in the order in which the
+        results were added, reading the file from start to end.'''
+        self.storefile.flush()
+        # read lines at positions that are in the index, so results that
+        # were replaced are skipped. The file is seeked for every line as
+        # results can be looked up while iterating.
+        positions = set(self.index.values())
+        position = 0
+        while True:
+            self.storefile.seek(position)
+            line = self.storefile.readline()
+            if line == b'':
+                break
+            if position in positions:
+                record = json.loads(line)
+                yield (record['name'], record['result'])
+            position += len(line)
+
+    def values(self):
+        for filename, result in self.items():
+            yield result
+
+    def close(self):
+        if self.storefile is not None:
+            self.storefile.close()
+            self.storefile = None
+
+    def __reduce__(self):
+        # pickle the store as a plain dict, with the items written one at
+        # a time, so the store can be part of a pickled scan result and
+        # is read back as a dict.
+        return (dict, (), None, None, self.items())
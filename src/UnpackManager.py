@@ -20,60 +20,67 @@
 # version 3
 # SPDX-License-Identifier: AGPL-3.0-only
 
-import re
 import os
 import shutil
 import stat
 import pathlib
+import mmap
+import heapq
+import time
 
 import bangsignatures
 from bangsignatures import maxsignaturesoffset
 
 from UnpackParserException import UnpackParserException
+from IntervalSet import IntervalSet
+from FileContentsComputer import byte_histogram, shannon_entropy
+import VirtualFile
+
+# Data is considered to be random (encrypted or compressed) if the
+# entropy of a window of randomwindowsize bytes is at least
+# randomentropy bits per byte. Weak signatures are not tried in random
+# data if the UnpackManager is told to skip random data.
+randomwindowsize = 4096
+randomentropy = 7.8
 
 class UnpackManager:
     """The UnpackManager manages the unpacking (analysis and extraction) of a
     file."""
-    def __init__(self, unpackroot):
+    def __init__(self, unpackroot, skiprandomdata=False):
         """Create UnpackManager object, relative to unpackroot.
-        unpackroot is an absolute path object.
+        unpackroot is an absolute path object. If skiprandomdata is set,
+        weak signatures are not tried in data that looks random.
         """
-        # Invariant: lastunpackedoffset ==
-        # last known position in file with successfully unpacked data
-        # everything before this offset is unpacked and identified.
-        self.lastunpackedoffset = -1
-        self.unpackedrange = []
+        # the byte ranges of the file with successfully unpacked data,
+        # which are unpacked and identified, and do not need to be
+        # searched again.
+        self.unpackedranges = IntervalSet()
         self.needsunpacking = True
         # signature based unpacking?
         self.signaturesfound = []
         self.counterspersignature = {}
         self.unpackroot = unpackroot
+        self.skiprandomdata = skiprandomdata
+        # cache with for each window of the file if it looks random
+        self.randomwindows = {}
 
     def needs_unpacking(self):
         ''' Return whether or not a file needs further unpacking'''
         return self.needsunpacking
 
-    def last_unpacked_offset(self):
-        '''Return the offset of the last successfully unpacked data'''
-        return self.lastunpackedoffset
-
     def unpacked_range(self):
-        '''Return a list of byte ranges of unpacked data'''
-        return self.unpackedrange
-
-    def set_last_unpacked_offset(self, offset):
-        '''Set the offset of the last successfully unpacked data'''
-        self.lastunpackedoffset = offset
+        '''Return the byte ranges of unpacked data, as an IntervalSet'''
+        return self.unpackedranges
 
     def set_needs_unpacking(self, needsunpacking):
         ''' Set whether or not a file needs further unpacking'''
         self.needsunpacking = needsunpacking
 
     def append_unpacked_range(self, low, high):
-        '''Add a byte range of unpacked data to a list'''
-        self.unpackedrange.append((low, high))
+        '''Add a byte range [low, high) of unpacked data'''
+        self.unpackedranges.add(low, high)
 
-    def make_data_unpack_directory(self, relpath, filetype, offset, seqnr=1):
+    def make_data_unpack_directory(self, relpath, filetype, offset, seqnr=1, create=True):
         '''Makes a data unpack directory.
         relpath is the relative path to the file that is unpacked.
         filetype is the type of the file.
@@ -81,10 +88,19 @@ class UnpackManager:
         data unpack directory name)
         seqnr is a sequence number that will be increased
         if the directory with that nr already exists.
+        If create is False, the name of the directory is chosen, but the
+        directory is not created: UnpackParsers create it when they
+        write files to it.
         returns the sequence number of the directory
         '''
         while True:
             dirname = "%s-%#010x-%s-%d" % (relpath, offset, filetype, seqnr)
+            if not create:
+                if not os.path.exists(os.path.join(self.unpackroot, dirname)):
+                    self.dataunpackdirectory = pathlib.Path(dirname)
+                    break
+                seqnr += 1
+                continue
             try:
                 
                 os.mkdir(os.path.join(self.unpackroot, dirname))
@@ -130,19 +146,30 @@ class UnpackManager:
 
     def try_unpack_file_for_extension(self, fileresult, scanenvironment,
             relpath, extension, unpackparser):
-        self.make_data_unpack_directory(relpath, unpackparser.pretty_name, 0)
+        self.make_data_unpack_directory(relpath, unpackparser.pretty_name, 0, create=False)
         up = unpackparser(fileresult, scanenvironment, self.dataunpackdirectory,
                 0)
+        return self._parse_and_unpack(fileresult, up)
+
+    def _parse_and_unpack(self, fileresult, up):
+        '''Parse and unpack data with the UnpackParser up, and carve the
+        data if it is not the whole file. The attempt, and the time it
+        took, is added to the statistics of the UnpackParser in
+        fileresult.'''
         up.open()
+        start = time.monotonic()
         try:
             unpackresult = up.parse_and_unpack()
             if unpackresult['length'] != fileresult.filesize:
                 up.carve()
         except UnpackParserException as e:
+            fileresult.add_parser_attempt(up.__class__.__name__,
+                    time.monotonic() - start)
             raise e
         finally:
             up.close()
-
+        fileresult.add_parser_attempt(up.__class__.__name__,
+                time.monotonic() - start, unpackresult['length'])
         return unpackresult
 
     def open_scanfile(self, filename):
@@ -151,22 +178,51 @@ class UnpackManager:
             filename.chmod(stat.S_IRUSR)
         self.scanfile = open(filename, 'rb')
 
-    def open_scanfile_with_memoryview(self, filename, maxbytes):
-        '''Open the file using a memory view to reduce I/O'''
+    def open_scanfile_with_memoryview(self, filename, maxbytes, window=None):
+        '''Open the file using a memory view to reduce I/O. window is an
+        optional tuple (offset, size) of the range of the file that should
+        be scanned, which is used for virtual files.'''
         if filename.stat().st_mode &  stat.S_IRUSR != stat.S_IRUSR:
             filename.chmod(stat.S_IRUSR)
-        self.scanfile = open(filename, 'rb')
+        if window is None:
+            self.scanfile = open(filename, 'rb')
+        else:
+            self.scanfile = VirtualFile.WindowedFile(filename, *window)
         self.scanbytesarray = bytearray(maxbytes)
         self.scanbytes = memoryview(self.scanbytesarray)
+        self.randomwindows = {}
+
+    def open_scanfile_with_mmap(self, filename, window=None):
+        '''Open the file and map it into memory, so it can be searched
+        without reading and copying it in chunks. window is an optional
+        tuple (offset, size) of the range of the file that should be
+        scanned, which is used for virtual files.'''
+        if filename.stat().st_mode &  stat.S_IRUSR != stat.S_IRUSR:
+            filename.chmod(stat.S_IRUSR)
+        self.scanfile = open(filename, 'rb')
+        if window is None:
+            self.scanmmap = mmap.mmap(self.scanfile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.scanbytes = memoryview(self.scanmmap)
+        else:
+            # mappings have to start at a multiple of the allocation
+            # granularity, so map a bit more and skip the extra bytes.
+            (offset, size) = window
+            mapoffset = offset - offset % mmap.ALLOCATIONGRANULARITY
+            self.scanmmap = mmap.mmap(self.scanfile.fileno(), offset - mapoffset + size,
+                    access=mmap.ACCESS_READ, offset=mapoffset)
+            self.scanbytes = memoryview(self.scanmmap)[offset - mapoffset:]
+        self.offsetinfile = 0
+        self.bytesread = len(self.scanbytes)
+        self.randomwindows = {}
 
     def seek_to(self, pos):
         '''Seek to the desired position in the file'''
         self.scanfile.seek(pos)
 
-    def seek_to_last_unpacked_offset(self):
-        '''Seek to the position of the data that
-        was unpacked successfully last'''
-        self.scanfile.seek(max(self.last_unpacked_offset(), 0))
+    def seek_to_first_free_offset(self):
+        '''Seek to the first byte of the file that
+        has not been unpacked'''
+        self.scanfile.seek(self.unpackedranges.next_free(0))
 
     def get_current_offset_in_file(self):
         '''Return the current position in the file'''
@@ -178,78 +234,153 @@ class UnpackManager:
 
     def close_scanfile(self):
         '''Close the file'''
+        if getattr(self, 'scanmmap', None) is not None:
+            self.scanbytes.release()
+            self.scanmmap.close()
+            self.scanmmap = None
         self.scanfile.close()
 
     def seek_to_find_next_signature(self):
-        if self.scanfile.tell() < self.lastunpackedoffset:
+        nextoffset = self.unpackedranges.next_free(self.scanfile.tell())
+        if nextoffset > self.scanfile.tell():
             # skip data that has already been unpacked
-            self.scanfile.seek(self.lastunpackedoffset)
+            self.scanfile.seek(nextoffset)
         else:
             # use an overlap, i.e. go back
             self.scanfile.seek(-maxsignaturesoffset, 1)
 
-    def find_offsets_for_signature(self, sig, unpackparsers, filesize):
+    def _is_random_window(self, windowindex):
+        '''Return whether or not the window with index windowindex of
+        the file looks random. Windows that are not completely in the data
+        that was read are never considered to be random.'''
+        if windowindex in self.randomwindows:
+            return self.randomwindows[windowindex]
+        start = windowindex * randomwindowsize - self.offsetinfile
+        if start < 0 or start + randomwindowsize > self.bytesread:
+            return False
+        histogram = byte_histogram(self.scanbytes[start:start+randomwindowsize])
+        israndom = shannon_entropy(histogram) >= randomentropy
+        self.randomwindows[windowindex] = israndom
+        return israndom
+
+    def is_random_data(self, offset):
+        '''Return whether or not the data on both sides of offset in the
+        file looks random, so data that starts at offset is unlikely to be
+        an actual file.'''
+        return self._is_random_window((offset - 1) // randomwindowsize) and \
+                self._is_random_window(offset // randomwindowsize)
+
+    def _probe(self, buffer, offset, filesize, unpackparsers):
+        '''Return the UnpackParsers that do not reject the data at offset
+        in buffer, see UnpackParser.probe(). filesize is the size of the
+        data from the start of buffer to the end of the file.'''
+        if offset < 0:
+            # the data starts before the data that was read
+            return unpackparsers
+        return [u for u in unpackparsers if u.probe(buffer, offset, filesize)]
+
+    def _remove_weak_signatures(self, offset, signature, unpackparsers):
+        '''Return the UnpackParsers that should be tried for a signature
+        found with a candidate offset in the file.'''
+        weak = bangsignatures.weak_signatures.get(signature)
+        if not self.skiprandomdata or weak is None:
+            return unpackparsers
+        if not self.is_random_data(offset):
+            return unpackparsers
+        return [u for u in unpackparsers if u not in weak]
+
+    def find_offsets_for_signatures(self, filesize):
+        '''Find the candidate offsets for all signatures in the data that
+        was read, in a single pass. Returns a set of tuples
+        (offset in file, UnpackParser).'''
         offsets = set()
-        s_offset, s_text = sig
-        # TODO: precompile regexp patterns in bangsignatures
-        res = re.finditer(re.escape(s_text), self.scanbytes[:self.bytesread])
-        if res is not None:
-            for r in res:
-                # skip files that aren't big enough if the
-                # signature is not at the start of the data
-                # to be carved (example: ISO9660).
-                if r.start() + self.offsetinfile - s_offset < 0:
-                    continue
-
-                offset = r.start()
-                if not bangsignatures.prescan(s_text, self.scanbytes, self.bytesread, filesize, offset, self.offsetinfile):
-                    continue
-
-                # default: store a tuple (offset, signature name)
-                offsets.update({ (offset + self.offsetinfile - s_offset, u) for
-                    u in unpackparsers })
+        scanbytes = self.scanbytes[:self.bytesread]
+        for offset, s_offset, s_text, unpackparsers in \
+                bangsignatures.signature_matcher.find(scanbytes):
+            # skip files that aren't big enough if the
+            # signature is not at the start of the data
+            # to be carved (example: ISO9660).
+            if offset + self.offsetinfile - s_offset < 0:
+                continue
+
+            unpackparsers = self._remove_weak_signatures(
+                    offset + self.offsetinfile - s_offset, (s_offset, s_text), unpackparsers)
+            unpackparsers = self._probe(scanbytes, offset - s_offset,
+                    filesize - self.offsetinfile, unpackparsers)
+
+            # default: store a tuple (offset, signature name)
+            offsets.update({ (offset + self.offsetinfile - s_offset, u) for
+                u in unpackparsers })
         return offsets
 
+    def find_offsets_for_signatures_in_mmap(self, filesize):
+        '''Lazily yield the candidate offsets for all signatures in a file
+        opened with open_scanfile_with_mmap, in the order of the offsets
+        in the file, as tuples (offset in file, UnpackParser).
+        Data that was unpacked in the meantime is not searched again.'''
+        candidates = []
+        candidatecounter = 0
+        searchoffset = self.unpackedranges.next_free(0)
+        matches = bangsignatures.signature_matcher.find_from(self.scanbytes, searchoffset)
+        while True:
+            # skip data that was unpacked after the search was started
+            if self.unpackedranges.next_free(searchoffset) > searchoffset:
+                matches.close()
+                searchoffset = self.unpackedranges.next_free(searchoffset)
+                matches = bangsignatures.signature_matcher.find_from(self.scanbytes, searchoffset)
+                candidates = [c for c in candidates if c[0] not in self.unpackedranges]
+                heapq.heapify(candidates)
+
+            match = next(matches, None)
+            if match is None:
+                break
+            (offset, s_offset, s_text, unpackparsers) = match
+            searchoffset = offset
+
+            # a signature that is not at the start of the data means that
+            # the candidate offset is before the signature (example: ISO9660)
+            # so candidates can only be reported once the search has moved
+            # past them far enough.
+            while candidates != [] and candidates[0][0] < offset - maxsignaturesoffset:
+                yield heapq.heappop(candidates)[::2]
+
+            # skip files that aren't big enough if the
+            # signature is not at the start of the data
+            # to be carved (example: ISO9660).
+            if offset - s_offset < 0:
+                continue
+
+            unpackparsers = self._remove_weak_signatures(
+                    offset - s_offset, (s_offset, s_text), unpackparsers)
+            unpackparsers = self._probe(self.scanbytes, offset - s_offset,
+                    filesize, unpackparsers)
+            for u in unpackparsers:
+                heapq.heappush(candidates, (offset - s_offset, candidatecounter, u))
+                candidatecounter += 1
+
+        matches.close()
+        while candidates != []:
+            yield heapq.heappop(candidates)[::2]
+
     def offset_overlaps_with_unpacked_data(self, offset):
-        return offset < self.lastunpackedoffset
+        return offset in self.unpackedranges
 
     def try_unpack_file_for_signatures(self, fileresult, scanenvironment,
             unpackparser, offset):
         up = unpackparser(fileresult, scanenvironment, self.dataunpackdirectory,
                 offset)
-        up.open()
-        try:
-            unpackresult = up.parse_and_unpack()
-            if unpackresult['length'] != fileresult.filesize:
-                up.carve()
-        except UnpackParserException as e:
-            raise e
-        finally:
-            up.close()
-        return unpackresult
+        return self._parse_and_unpack(fileresult, up)
 
     def try_unpack_without_features(self, fileresult, scanenvironment, unpackparser,  offset):
         up = unpackparser(fileresult, scanenvironment, self.dataunpackdirectory,
                 0)
-        up.open()
-        try:
-            unpackresult = up.parse_and_unpack()
-            if unpackresult['length'] != fileresult.filesize:
-                # TODO: let up generate name
-                up.carve()
-        except UnpackParserException as e:
-            raise e
-        finally:
-            up.close()
-        return unpackresult
+        # TODO: let up generate name for carved data
+        return self._parse_and_unpack(fileresult, up)
 
     def file_unpacked(self, unpackresult, filesize):
-        # store the location of where the successfully
-        # unpacked file ends (the offset is always 0  here).
-        self.lastunpackedoffset = unpackresult['length']
-
         # store the range of the unpacked data
-        self.unpackedrange.append((0, unpackresult['length']))
+        # (the offset is always 0 here).
+        self.unpackedranges.add(0, unpackresult['length'])
 
         # if unpackedfilesandlabels is empty, then no files
         # were unpacked likely because the whole file was the
@@ -1,6 +1,9 @@
 from UnpackParserException import UnpackParserException
 
 import os
+import copy
+import bangio
+import VirtualFile
 
 class UnpackParser:
     """The UnpackParser class can parse input according to a certain format,
@@ -22,6 +25,13 @@ class UnpackParser:
         always have an extension or a signature. Text-based formats often
         need this. Default is False.
 
+    weak_signatures:
+        a list of signatures (from signatures) that are easily found by
+        chance. These are not tried in data that looks random (encrypted
+        or compressed) if the skiprandomdata option is set. Default is
+        None, which means that all signatures shorter than
+        bangsignatures.weak_signature_length bytes are weak.
+
     pretty_name:
         a name of the file type, used in the unpack directory name and in
         logs. There is no default.
@@ -31,6 +41,7 @@ class UnpackParser:
     extensions = []
 
     signatures = []
+    weak_signatures = None
     scan_if_featureless = False
 
     def __init__(self, fileresult, scan_environment, rel_unpack_dir, offset):
@@ -43,6 +54,24 @@ class UnpackParser:
         self.scan_environment = scan_environment
         self.rel_unpack_dir = rel_unpack_dir
         self.offset = offset
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        """Override this to quickly reject data that cannot be parsed by
+        this UnpackParser, before the UnpackParser is instantiated and the
+        file is opened. buffer is a bytes-like object with data that was
+        already read from the file, offset is the offset of the data in
+        buffer, and filesize is the size of the data from the start of
+        buffer to the end of the file, which can be more than len(buffer).
+        Return False if the data can be rejected. Data after the end of
+        buffer can only be checked by parse(). Default is True.
+        """
+        return True
+    def make_unpack_directory(self):
+        """Creates the unpack directory, once it is known that files will
+        be written to it. Normally you do not need to call this.
+        """
+        os.makedirs(self.scan_environment.unpack_path(self.rel_unpack_dir),
+                exist_ok=True)
     def parse(self):
         """Override this method to implement parsing the file data. If there is
         a (non-fatal) error during the parsing, you should raise an
@@ -57,8 +86,10 @@ class UnpackParser:
         self.parse()
         self.calculate_unpacked_size()
     def open(self):
-        filename_full = self.scan_environment.unpack_path(self.fileresult.filename)
-        self.infile = filename_full.open('rb')
+        self.infile = VirtualFile.open_file(self.scan_environment, self.fileresult)
+        # offset of the data in the file behind self.infile.fileno(),
+        # which is not 0 for virtual files.
+        self.infile_offset = VirtualFile.data_location(self.scan_environment, self.fileresult)[1]
     def close(self):
         self.infile.close()
     def calculate_unpacked_size(self):
@@ -85,6 +116,7 @@ class UnpackParser:
                 'length': self.unpacked_size
             }
         self.set_metadata_and_labels()
+        self.make_unpack_directory()
         files_and_labels = self.unpack()
         self.unpack_results['filesandlabels'] = files_and_labels
         return self.unpack_results
@@ -100,14 +132,16 @@ class UnpackParser:
         """If the UnpackParser recognizes data but there is still data left in
         the file, this method saves the parsed part of the file, leaving the
         rest to be  analyzed. The part is saved to the unpack data directory,
-        under the name given by get_carved_filename.
+        under the name given by get_carved_filename. If virtual files are
+        used the part is not written, but recorded in the virtualfiles field
+        of the self.unpack_results dictionary instead.
         """
         rel_output_path = self.rel_unpack_dir / self.get_carved_filename()
-        abs_output_path = self.scan_environment.unpack_path(rel_output_path)
-        os.makedirs(abs_output_path.parent, exist_ok=True)
-        outfile = open(abs_output_path, 'wb')
-        os.sendfile(outfile.fileno(), self.infile.fileno(), self.offset, self.unpacked_size)
-        outfile.close()
+        if self.scan_environment.get_virtualfiles():
+            self.unpack_results.setdefault('virtualfiles', {})[rel_output_path] = \
+                VirtualFile.virtual_range(self.fileresult, self.offset, self.unpacked_size)
+        else:
+            self.extract_to_file(rel_output_path, self.offset, self.unpacked_size)
         out_labels = self.unpack_results['labels'] + ['unpacked']
         self.unpack_results['filesandlabels'].append( (rel_output_path, out_labels) )
     def set_metadata_and_labels(self):
@@ -138,7 +172,8 @@ class UnpackParser:
         outfile_full = self.scan_environment.unpack_path(filename)
         os.makedirs(outfile_full.parent, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), self.infile.fileno(), start, length)
+        bangio.copy_range(outfile.fileno(), self.infile.fileno(),
+                self.infile_offset + start, length)
         outfile.close()
 
 class WrappedUnpackParser(UnpackParser):
@@ -156,12 +191,41 @@ class WrappedUnpackParser(UnpackParser):
         """
         raise UnpackParserException("%s: must call unpack function" % self.__class__.__name__)
     def parse_and_unpack(self):
-        r = self.unpack_function(self.fileresult, self.scan_environment,
-                self.offset, self.rel_unpack_dir)
+        # unpack functions parse and unpack in one go
+        self.make_unpack_directory()
+        if self.fileresult.is_virtual():
+            r = self.unpack_virtual_file()
+        else:
+            r = self.unpack_function(self.fileresult, self.scan_environment,
+                    self.offset, self.rel_unpack_dir)
         if r['status'] is False:
             raise UnpackParserException(r.get('error'))
         return r
+    def unpack_virtual_file(self):
+        """Unpack functions work on files on disk. Unpack functions label and
+        name files differently if all data of a file is unpacked, which can
+        only be the case for data at the start of the file, so for data at
+        the start the virtual file is written to disk first. For data at
+        other offsets they are given the file on disk with the data, and the
+        offset of the data in it, so no data is written for candidates that
+        turn out to be false positives.
+        """
+        if self.offset == 0:
+            VirtualFile.materialize(self.scan_environment, self.fileresult)
+            return self.unpack_function(self.fileresult, self.scan_environment,
+                    self.offset, self.rel_unpack_dir)
+        (datafilename, dataoffset, datasize) = self.fileresult.virtual
+        datafileresult = copy.copy(self.fileresult)
+        datafileresult.filename = datafilename
+        datafileresult.set_filesize(dataoffset + datasize)
+        datafileresult.clear_virtual()
+        r = self.unpack_function(datafileresult, self.scan_environment,
+                dataoffset + self.offset, self.rel_unpack_dir)
+        if 'offset' in r:
+            r['offset'] -= dataoffset
+        return r
     def open(self):
+        # unpack functions open the file themselves
         pass
     def close(self):
         pass
@@ -0,0 +1,220 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# A manifest of all UnpackParsers: their names, the modules they are
+# defined in, their signatures and extensions, whether or not they
+# should be tried for featureless files, and whether or not they have a
+# probe() method. With the manifest the tables of
+# UnpackParsers can be built without importing the code of the
+# UnpackParsers, which is only imported when an UnpackParser is used for
+# the first time.
+#
+# The manifest is generated by importing all UnpackParsers, and is
+# generated again if any of the Python files in the parsers directory
+# changed (checked with the modification time and size of the files),
+# or, if some modules could not be imported, if Python packages were
+# installed or removed since (checked with the modification time of the
+# site-packages directories), as a missing dependency might have been
+# installed. The modules that could not be imported are not imported
+# again to check this, as that is as slow as importing all UnpackParsers.
+
+import os
+import sys
+import json
+import importlib
+import importlib.util
+import inspect
+import tempfile
+
+from UnpackParser import UnpackParser
+
+manifestversion = 3
+
+
+class LazyUnpackParser:
+    """Stands in for an UnpackParser class, with the attributes from the
+    manifest. The UnpackParser is imported when it is instantiated or when
+    an attribute is used that is not in the manifest."""
+    def __init__(self, entry):
+        self.module_name = entry['module']
+        self.__name__ = entry['name']
+        self.pretty_name = entry['pretty_name']
+        self.signatures = [(s_offset, bytes.fromhex(s_text))
+                           for s_offset, s_text in entry['signatures']]
+        self.extensions = entry['extensions']
+        self.scan_if_featureless = entry['scan_if_featureless']
+        if entry['weak_signatures'] is None:
+            self.weak_signatures = None
+        else:
+            self.weak_signatures = [(s_offset, bytes.fromhex(s_text))
+                                    for s_offset, s_text in entry['weak_signatures']]
+        self.has_probe = entry['probe']
+        self.unpackparser = None
+
+    def load(self):
+        '''Import the UnpackParser, if needed, and return its class.'''
+        if self.unpackparser is None:
+            module = importlib.import_module(self.module_name)
+            self.unpackparser = getattr(module, self.__name__)
+        return self.unpackparser
+
+    def source_file(self):
+        '''Return the name of the file the UnpackParser is defined in,
+        without importing the UnpackParser.'''
+        if self.unpackparser is not None:
+            return inspect.getsourcefile(self.unpackparser)
+        return importlib.util.find_spec(self.module_name).origin
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def probe(self, buffer, offset, filesize):
+        # UnpackParsers without a probe accept everything, so
+        # they do not need to be imported.
+        if not self.has_probe:
+            return True
+        return self.load().probe(buffer, offset, filesize)
+
+    def __getattr__(self, name):
+        # only called for attributes that are not in the manifest
+        if name.startswith('__') or name == 'unpackparser':
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        return '<LazyUnpackParser %s.%s>' % (self.module_name, self.__name__)
+
+
+def _signatures_to_manifest(signatures):
+    return [[s_offset, s_text.hex()] for s_offset, s_text in signatures]
+
+
+def manifest_entry(module_name, unpackparser):
+    '''Return the manifest entry for the class unpackparser, which was
+    found in the module module_name.'''
+    weak_signatures = unpackparser.weak_signatures
+    if weak_signatures is not None:
+        weak_signatures = _signatures_to_manifest(weak_signatures)
+    return {
+        'module': module_name,
+        'name': unpackparser.__name__,
+        'pretty_name': unpackparser.pretty_name,
+        'signatures': _signatures_to_manifest(unpackparser.signatures),
+        'extensions': list(unpackparser.extensions),
+        'scan_if_featureless': unpackparser.scan_if_featureless,
+        'weak_signatures': weak_signatures,
+        'probe': unpackparser.probe.__func__ is not UnpackParser.probe.__func__,
+    }
+
+
+def parser_files(parsersdirectory):
+    '''Return the path (relative to parsersdirectory), modification time
+    and size of all Python files in parsersdirectory, in a fixed order.'''
+    files = []
+    for dirpath, dirnames, filenames in os.walk(parsersdirectory):
+        dirnames[:] = sorted([d for d in dirnames if d != '__pycache__'])
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+            path = os.path.join(dirpath, filename)
+            st = os.stat(path)
+            files.append([os.path.relpath(path, parsersdirectory),
+                          st.st_mtime_ns, st.st_size])
+    return files
+
+
+def package_directory_times():
+    '''Return the modification time of the directories in the Python path
+    that Python packages are installed in, which change when packages are
+    installed or removed.'''
+    times = []
+    for path in sys.path:
+        if os.path.basename(path) not in ['site-packages', 'dist-packages']:
+            continue
+        try:
+            times.append([path, os.stat(path).st_mtime_ns])
+        except OSError:
+            pass
+    return times
+
+
+def _is_up_to_date(manifest, parsersdirectory):
+    if manifest.get('version') != manifestversion:
+        return False
+    if manifest['files'] != parser_files(parsersdirectory):
+        return False
+    # modules that could not be imported might have missing
+    # dependencies that have been installed in the meantime.
+    if manifest['failed'] != [] and \
+            manifest['packagetimes'] != package_directory_times():
+        return False
+    return True
+
+
+def write_manifest(manifestpath, manifest):
+    '''Write the manifest to manifestpath. The manifest is written to a
+    temporary file first, as several scans could write it at the same
+    time. Errors are ignored, as the manifest is only used to speed up
+    starting a scan.'''
+    try:
+        fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(manifestpath),
+                                       prefix='.manifest-')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'w') as manifestfile:
+            json.dump(manifest, manifestfile, indent=1)
+        os.replace(tmppath, manifestpath)
+    except OSError:
+        try:
+            os.unlink(tmppath)
+        except OSError:
+            pass
+
+
+def load_unpackparsers(manifestpath, parsersdirectory, find_unpackparsers):
+    '''Return a LazyUnpackParser for every UnpackParser in the manifest in
+    manifestpath. If there is no manifest, or if it is out of date, a new
+    manifest is created from the result of find_unpackparsers(failed),
+    which should import all UnpackParsers in parsersdirectory and return
+    tuples (module name, UnpackParser class), and append the names of the
+    modules that could not be imported to the list failed.'''
+    try:
+        with open(manifestpath, 'r') as manifestfile:
+            manifest = json.load(manifestfile)
+        if _is_up_to_date(manifest, parsersdirectory):
+            return [LazyUnpackParser(entry) for entry in manifest['unpackparsers']]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    files = parser_files(parsersdirectory)
+    failed = []
+    entries = [manifest_entry(module_name, unpackparser)
+               for module_name, unpackparser in find_unpackparsers(failed)]
+    manifest = {
+        'version': manifestversion,
+        'files': files,
+        'failed': failed,
+        'packagetimes': package_directory_times(),
+        'unpackparsers': entries,
+    }
+    write_manifest(manifestpath, manifest)
+    return [LazyUnpackParser(entry) for entry in entries]
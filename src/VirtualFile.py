@@ -0,0 +1,143 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+
+# Virtual files are files that were found inside another file, such as
+# data that was carved from a file, but that are not written to disk:
+# a virtual file refers to a range of bytes (offset and size) in a file
+# that does exist on disk. Virtual files found in virtual files refer to
+# the same file on disk, so carving data from carved data does not lead
+# to extra copies of the data.
+#
+# Data of virtual files is read through a WindowedFile. It is only
+# written to disk (materialized) when a real file is needed, for
+# example when an external tool is run on the data.
+
+import io
+import os
+
+import bangio
+
+
+class WindowedFile(io.RawIOBase):
+    """A read-only file object for size bytes starting at offset in
+    another file. Positions are relative to the start of the range and
+    reading stops at the end of the range."""
+    def __init__(self, filename, offset, size):
+        self.rawfile = open(filename, 'rb')
+        self.window_offset = offset
+        self.window_size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        count = min(len(b), self.window_size - self.position)
+        if count <= 0:
+            return 0
+        with memoryview(b) as view:
+            bytesread = os.preadv(self.rawfile.fileno(), [view[:count]],
+                                  self.window_offset + self.position)
+        self.position += bytesread
+        return bytesread
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self.position + offset
+        elif whence == os.SEEK_END:
+            position = self.window_size + offset
+        else:
+            raise ValueError("invalid whence (%r)" % whence)
+        if position < 0:
+            raise OSError("negative seek position %d" % position)
+        self.position = position
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def fileno(self):
+        # the file descriptor is the one of the underlying file, so
+        # offsets used with it have to be adjusted with window_offset.
+        return self.rawfile.fileno()
+
+    def close(self):
+        if not self.closed:
+            self.rawfile.close()
+        super().close()
+
+
+def virtual_range(fileresult, offset, size):
+    '''Return the range (relative path of the file on disk, offset, size)
+    for a virtual file of size bytes at offset in the file of fileresult.'''
+    if fileresult.is_virtual():
+        (datafilename, dataoffset, datasize) = fileresult.virtual
+        return (datafilename, dataoffset + offset, size)
+    return (fileresult.filename, offset, size)
+
+
+def data_location(scanenvironment, fileresult):
+    '''Return the absolute path of the file on disk that contains the
+    data of fileresult, and the offset of the data in that file.'''
+    if fileresult.is_virtual():
+        (datafilename, dataoffset, datasize) = fileresult.virtual
+        return (scanenvironment.unpack_path(datafilename), dataoffset)
+    return (scanenvironment.unpack_path(fileresult.filename), 0)
+
+
+def open_range(filename, offset, size):
+    '''Open a buffered, read-only file object for size bytes at offset
+    in the file filename.'''
+    return io.BufferedReader(WindowedFile(filename, offset, size))
+
+
+def open_file(scanenvironment, fileresult):
+    '''Open the data of fileresult for reading, both for virtual files
+    and for files on disk. Note that the fileno() of the returned file
+    is the one of the file on disk, see data_location().'''
+    if fileresult.is_virtual():
+        (datafilename, dataoffset, datasize) = fileresult.virtual
+        return open_range(scanenvironment.unpack_path(datafilename),
+                          dataoffset, datasize)
+    return open(scanenvironment.unpack_path(fileresult.filename), 'rb')
+
+
+def materialize(scanenvironment, fileresult):
+    '''Write the data of a virtual file to the path of the file, so it can
+    be used like any other file. Does nothing for files that are not
+    virtual.'''
+    if not fileresult.is_virtual():
+        return
+    (datafilename, dataoffset, datasize) = fileresult.virtual
+    outfile_full = scanenvironment.unpack_path(fileresult.filename)
+    os.makedirs(outfile_full.parent, exist_ok=True)
+    infile = open(scanenvironment.unpack_path(datafilename), 'rb')
+    outfile = open(outfile_full, 'wb')
+    bangio.copy_range(outfile.fileno(), infile.fileno(), dataoffset, datasize)
+    outfile.close()
+    infile.close()
+    fileresult.clear_virtual()
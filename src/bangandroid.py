@@ -35,6 +35,7 @@ import pathlib
 
 # own modules
 import bangunpack
+import bangio
 
 encodingstotranslate = ['utf-8', 'ascii', 'latin-1', 'euc_jp', 'euc_jis_2004',
                         'jisx0213', 'iso2022_jp', 'iso2022_jp_1',
@@ -219,7 +220,7 @@ def unpack_android_sparse_data(fileresult, scanenvironment, offset, unpackdir):
         if transfercommand == 'new':
             for b in range(0, len(blocks), 2):
                 targetfile.seek(blocks[b]*blocksize)
-                os.sendfile(targetfile.fileno(), checkfile.fileno(), None, (blocks[b+1] - blocks[b]) * blocksize)
+                bangio.copy_range(targetfile.fileno(), checkfile.fileno(), None, (blocks[b+1] - blocks[b]) * blocksize)
         else:
             pass
 
@@ -651,7 +652,7 @@ def unpack_chrome_pak(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, endoffile - offset)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, endoffile - offset)
     outfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['resource', 'pak', 'unpacked']))
     checkfile.close()
@@ -1552,7 +1553,7 @@ def unpack_dex(
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['dex', 'android', 'unpacked']))
 
@@ -1702,7 +1703,7 @@ def unpack_odex(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -2057,7 +2058,7 @@ def unpack_android_resource(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     if resourcetype == 3:
@@ -2420,7 +2421,7 @@ def unpack_android_tzdata(fileresult, scanenvironment, offset, unpackdir):
 
         # open the output file for writing
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset + data_offset + tzoffset, tzlength)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + data_offset + tzoffset, tzlength)
         outfile.close()
 
         unpackedfilesandlabels.append((outfile_rel, []))
@@ -2450,7 +2451,7 @@ def unpack_android_tzdata(fileresult, scanenvironment, offset, unpackdir):
     outfile_rel = os.path.join(unpackdir, 'zone.tab')
     outfile_full = scanenvironment.unpack_path(outfile_rel)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset + zonetab_offset, filesize - maxoffset)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + zonetab_offset, filesize - maxoffset)
     outfile.close()
     checkfile.close()
 
@@ -2695,7 +2696,7 @@ def unpack_avb(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -2810,7 +2811,7 @@ def unpack_android_boot_msm(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, i[0])
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), i[1])
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), i[1])
         outfile.close()
         checkfile.seek(i[1], os.SEEK_CUR)
         unpackedfilesandlabels.append((outfile_rel, []))
@@ -3013,7 +3014,7 @@ def unpack_android_boot_img(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), kernelsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), kernelsize)
     outfile.close()
     checkfile.seek(kernelsize, os.SEEK_CUR)
     unpackedfilesandlabels.append((outfile_rel, []))
@@ -3037,7 +3038,7 @@ def unpack_android_boot_img(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, ramdiskname)
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), ramdisksize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), ramdisksize)
         outfile.close()
         checkfile.seek(ramdisksize, os.SEEK_CUR)
         unpackedfilesandlabels.append((outfile_rel, []))
@@ -3060,7 +3061,7 @@ def unpack_android_boot_img(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, secondstagename)
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), secondsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), secondsize)
         outfile.close()
         checkfile.seek(secondsize, os.SEEK_CUR)
         unpackedfilesandlabels.append((outfile_rel, ["bootloader"]))
@@ -3083,7 +3084,7 @@ def unpack_android_boot_img(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, dtbname)
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), dtbsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), dtbsize)
         outfile.close()
         checkfile.seek(secondsize, os.SEEK_CUR)
         unpackedfilesandlabels.append((outfile_rel, ["dtb"]))
@@ -3218,7 +3219,7 @@ def unpack_android_boot_huawei(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, imgname)
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), imgsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), imgsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, []))
         maxoffset = max(maxoffset, startoffset + imgsize)
@@ -3328,7 +3329,7 @@ def unpack_nb0(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, headers[header]['name'])
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), unpackoffset, headers[header]['size'])
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), unpackoffset, headers[header]['size'])
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, []))
 
@@ -3403,7 +3404,7 @@ def unpack_dhtb(fileresult, scanenvironment, offset, unpackdir):
             # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['dhtb', 'android', 'unpacked']))
     checkfile.close()
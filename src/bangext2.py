@@ -0,0 +1,369 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# A reader for ext2, ext3 and ext4 file systems, so file systems can be
+# unpacked in the process, instead of running e2ls for every directory
+# and e2cp for every file. The metadata (superblock, group descriptors,
+# inodes, block maps, extent trees and directories) is read from a
+# bytes-like object, such as a memory mapping of the file. The data of
+# files is not read by the reader: it returns the runs of blocks of a
+# file, which can then be copied with bangio.copy_range().
+#
+# Directories that are indexed with a hash tree (htree) are read as
+# linear directories: the blocks of the hash tree look like empty
+# directory entries, so they are skipped, as are the checksums at the
+# end of directory blocks.
+#
+# The layout is described in:
+#
+# https://www.kernel.org/doc/html/latest/filesystems/ext4/index.html
+
+import stat
+import struct
+import collections
+
+ROOT_INODE = 2
+
+# feature flags (superblock section)
+COMPAT_SPARSE_SUPER = 0x1
+INCOMPAT_COMPRESSION = 0x1
+INCOMPAT_FILETYPE = 0x2
+INCOMPAT_META_BG = 0x10
+INCOMPAT_64BIT = 0x80
+
+# inode flags (inode section)
+INODE_EXTENTS = 0x80000
+INODE_INLINE_DATA = 0x10000000
+
+EXTENT_MAGIC = 0xf30a
+XATTR_MAGIC = 0xea020000
+
+# an extent tree cannot be deeper than this (extent tree section)
+MAXEXTENTDEPTH = 5
+
+# the size of i_block in the inode, used for block maps, extent trees,
+# inline data and fast symbolic links
+IBLOCKSIZE = 60
+
+Inode = collections.namedtuple('Inode',
+        ['number', 'mode', 'size', 'flags', 'blocks', 'file_acl',
+         'iblock', 'raw'])
+
+
+class Ext2Error(Exception):
+    '''Raised when the file system is not valid or uses features that
+    are not supported.'''
+    pass
+
+
+class Ext2FileSystem:
+    """An ext2/3/4 file system at offset in data, which is a bytes-like
+    object, for example a memory mapping of a file."""
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+        if len(data) - offset < 2048:
+            raise Ext2Error('not enough data for superblock')
+        sb = data[offset+1024:offset+2048]
+        if sb[0x38:0x3a] != b'\x53\xef':
+            raise Ext2Error('invalid superblock magic')
+
+        (self.inodecount, blockcount) = struct.unpack_from('<II', sb, 0)
+        (self.firstdatablock, logblocksize) = struct.unpack_from('<II', sb, 20)
+        if logblocksize > 6:
+            raise Ext2Error('invalid block size')
+        self.blocksize = 1024 << logblocksize
+        (self.blockspergroup, ) = struct.unpack_from('<I', sb, 32)
+        (self.inodespergroup, ) = struct.unpack_from('<I', sb, 40)
+        if self.blockspergroup == 0 or self.inodespergroup == 0:
+            raise Ext2Error('invalid number of blocks or inodes per group')
+        (revision, ) = struct.unpack_from('<I', sb, 76)
+        (self.compat, self.incompat, self.rocompat) = struct.unpack_from('<III', sb, 92)
+        if revision == 0:
+            self.inodesize = 128
+            self.compat = self.incompat = self.rocompat = 0
+        else:
+            (self.inodesize, ) = struct.unpack_from('<H', sb, 88)
+            if self.inodesize < 128 or self.inodesize > self.blocksize:
+                raise Ext2Error('invalid inode size')
+        if self.incompat & INCOMPAT_COMPRESSION:
+            raise Ext2Error('compressed file systems are not supported')
+
+        self.descsize = 32
+        if self.incompat & INCOMPAT_64BIT:
+            (blockcounthigh, ) = struct.unpack_from('<I', sb, 0x150)
+            blockcount |= blockcounthigh << 32
+            (self.descsize, ) = struct.unpack_from('<H', sb, 0xfe)
+            if self.descsize < 32 or self.descsize > self.blocksize:
+                raise Ext2Error('invalid group descriptor size')
+        self.blockcount = blockcount
+        (self.firstmetabg, ) = struct.unpack_from('<I', sb, 0x104)
+
+        if offset + self.blockcount * self.blocksize > len(data):
+            raise Ext2Error('declared file system size larger than file size')
+
+        # the inode tables of the groups, read when needed
+        self.inodetables = {}
+
+    def block(self, blocknr, count=1):
+        '''Return count blocks, starting at block blocknr.'''
+        if blocknr + count > self.blockcount:
+            raise Ext2Error('block outside of file system')
+        start = self.offset + blocknr * self.blocksize
+        return self.data[start:start + count * self.blocksize]
+
+    def _group_has_superblock(self, group):
+        if group <= 1 or not self.rocompat & COMPAT_SPARSE_SUPER:
+            return True
+        for p in [3, 5, 7]:
+            power = p
+            while power < group:
+                power *= p
+            if power == group:
+                return True
+        return False
+
+    def _inode_table(self, group):
+        '''Return the first block of the inode table of a group.'''
+        if group in self.inodetables:
+            return self.inodetables[group]
+        descsperblock = self.blocksize // self.descsize
+        metagroup = group // descsperblock
+        if self.incompat & INCOMPAT_META_BG and metagroup >= self.firstmetabg:
+            # the descriptors of a meta group are in the first
+            # group of the meta group, after the superblock
+            firstgroup = metagroup * descsperblock
+            descblock = self.firstdatablock + firstgroup * self.blockspergroup
+            if self._group_has_superblock(firstgroup):
+                descblock += 1
+        else:
+            descblock = self.firstdatablock + 1 + metagroup
+        desc = self.block(descblock)
+        descoffset = (group % descsperblock) * self.descsize
+        (inodetable, ) = struct.unpack_from('<I', desc, descoffset + 8)
+        if self.descsize >= 64:
+            (inodetablehigh, ) = struct.unpack_from('<I', desc, descoffset + 0x28)
+            inodetable |= inodetablehigh << 32
+        self.inodetables[group] = inodetable
+        return inodetable
+
+    def inode(self, number):
+        '''Return inode number.'''
+        if number < 1 or number > self.inodecount:
+            raise Ext2Error('invalid inode number %d' % number)
+        (group, index) = divmod(number - 1, self.inodespergroup)
+        inodeoffset = self._inode_table(group) * self.blocksize + index * self.inodesize
+        if inodeoffset + self.inodesize > self.blockcount * self.blocksize:
+            raise Ext2Error('inode outside of file system')
+        start = self.offset + inodeoffset
+        raw = bytes(self.data[start:start + self.inodesize])
+        (mode, sizelow, blocks, flags) = struct.unpack_from('<H2xI20xII', raw, 0)
+        (file_acl, sizehigh) = struct.unpack_from('<II', raw, 104)
+        size = sizelow
+        if stat.S_ISREG(mode) or stat.S_ISDIR(mode):
+            size |= sizehigh << 32
+        return Inode(number, mode, size, flags, blocks, file_acl,
+                     raw[40:40 + IBLOCKSIZE], raw)
+
+    def _extent_runs(self, node, depth, runs):
+        (magic, entries, maxentries, nodedepth) = struct.unpack_from('<HHHH', node, 0)
+        if magic != EXTENT_MAGIC or 12 + entries * 12 > len(node):
+            raise Ext2Error('invalid extent header')
+        if nodedepth > depth:
+            raise Ext2Error('extent tree too deep')
+        for i in range(entries):
+            entryoffset = 12 + i * 12
+            if nodedepth == 0:
+                (logical, length, starthigh, startlow) = \
+                        struct.unpack_from('<IHHI', node, entryoffset)
+                if length > 32768:
+                    # uninitialized extents read as zeros,
+                    # so they are holes in the file.
+                    continue
+                runs.append((logical, starthigh << 32 | startlow, length))
+            else:
+                (logical, leaflow, leafhigh) = struct.unpack_from('<IIH', node, entryoffset)
+                self._extent_runs(self.block(leafhigh << 32 | leaflow),
+                                  nodedepth - 1, runs)
+
+    def _blockmap_runs(self, inode, runs):
+        nrblocks = -(-inode.size // self.blocksize)
+        pointersperblock = self.blocksize // 4
+        pointers = struct.unpack('<15I', inode.iblock)
+
+        def add(logical, blocknr):
+            if blocknr == 0:
+                # a hole in the file
+                return
+            if runs != [] and runs[-1][0] + runs[-1][2] == logical and \
+                    runs[-1][1] + runs[-1][2] == blocknr:
+                runs[-1] = (runs[-1][0], runs[-1][1], runs[-1][2] + 1)
+            else:
+                runs.append((logical, blocknr, 1))
+
+        def indirect(blocknr, level, logical):
+            # returns the number of logical blocks that are covered
+            covered = pointersperblock ** level
+            if blocknr == 0:
+                return covered
+            blockpointers = struct.unpack('<%dI' % pointersperblock, self.block(blocknr))
+            if level == 1:
+                for p in blockpointers[:nrblocks - logical]:
+                    add(logical, p)
+                    logical += 1
+                return covered
+            for p in blockpointers:
+                if logical >= nrblocks:
+                    break
+                logical += indirect(p, level - 1, logical)
+            return covered
+
+        for logical in range(min(nrblocks, 12)):
+            add(logical, pointers[logical])
+        logical = 12
+        for level in range(1, 4):
+            if logical >= nrblocks:
+                break
+            logical += indirect(pointers[11 + level], level, logical)
+
+    def block_runs(self, inode):
+        '''Return the runs of blocks with data of inode, as a list of
+        tuples (first logical block, first block, number of blocks).
+        Holes in the file are not in the list.'''
+        runs = []
+        if inode.flags & INODE_INLINE_DATA:
+            return runs
+        if inode.flags & INODE_EXTENTS:
+            self._extent_runs(inode.iblock, MAXEXTENTDEPTH, runs)
+            runs.sort()
+        else:
+            self._blockmap_runs(inode, runs)
+        for logical, blocknr, count in runs:
+            if blocknr + count > self.blockcount:
+                raise Ext2Error('block outside of file system')
+        return runs
+
+    def _inline_data(self, inode):
+        # data that does not fit in i_block is stored in the
+        # extended attribute system.data in the inode.
+        data = inode.iblock
+        if self.inodesize < 132:
+            return data
+        (extrasize, ) = struct.unpack_from('<H', inode.raw, 128)
+        xattroffset = 128 + extrasize
+        if self.inodesize < xattroffset + 4:
+            return data
+        (magic, ) = struct.unpack_from('<I', inode.raw, xattroffset)
+        if magic != XATTR_MAGIC:
+            return data
+        entriesoffset = xattroffset + 4
+        entryoffset = entriesoffset
+        while entryoffset + 16 <= self.inodesize:
+            (namelen, nameindex, valueoffset, valueinode, valuesize) = \
+                    struct.unpack_from('<BBHII', inode.raw, entryoffset)
+            if namelen == 0 and nameindex == 0:
+                break
+            name = inode.raw[entryoffset+16:entryoffset+16+namelen]
+            if nameindex == 7 and name == b'data':
+                valuestart = entriesoffset + valueoffset
+                return data + inode.raw[valuestart:valuestart+valuesize]
+            entryoffset += (16 + namelen + 3) & ~3
+        return data
+
+    def read(self, inode):
+        '''Return the data of inode. Should only be used for small
+        files, such as directories and symbolic links.'''
+        if inode.flags & INODE_INLINE_DATA:
+            return self._inline_data(inode)[:inode.size]
+        # the size comes from the inode, so check it against the
+        # blocks of the inode before allocating memory for it.
+        runs = self.block_runs(inode)
+        if inode.size > max([logical + count for logical, blocknr, count in runs],
+                            default=0) * self.blocksize:
+            raise Ext2Error('inode size larger than its blocks')
+        data = bytearray(inode.size)
+        for logical, blocknr, count in runs:
+            start = logical * self.blocksize
+            if start >= inode.size:
+                continue
+            length = min(count * self.blocksize, inode.size - start)
+            data[start:start+length] = self.block(blocknr, count)[:length]
+        return bytes(data)
+
+    def readlink(self, inode):
+        '''Return the target of a symbolic link.'''
+        # the target of short links is stored in the inode itself
+        eablocks = self.blocksize // 512 if inode.file_acl != 0 else 0
+        if not inode.flags & INODE_INLINE_DATA and inode.size < IBLOCKSIZE \
+                and inode.blocks - eablocks == 0:
+            return inode.iblock[:inode.size]
+        return self.read(inode)
+
+    def directory_entries(self, inode):
+        '''Return the entries of the directory inode, except . and ..,
+        as tuples (name, inode number), in the order of the directory.'''
+        data = self.read(inode)
+        if inode.flags & INODE_INLINE_DATA:
+            # inline directories start with the inode of the parent
+            data = data[4:]
+        entries = []
+        names = set()
+        entryoffset = 0
+        while entryoffset + 8 <= len(data):
+            (inodenumber, reclen, namelen, filetype) = \
+                    struct.unpack_from('<IHBB', data, entryoffset)
+            if reclen < 8 or entryoffset + reclen > len(data):
+                raise Ext2Error('invalid directory entry')
+            if not self.incompat & INCOMPAT_FILETYPE:
+                namelen |= filetype << 8
+            if 8 + namelen > reclen:
+                raise Ext2Error('invalid directory entry')
+            name = data[entryoffset+8:entryoffset+8+namelen]
+            entryoffset += reclen
+            # entries that are not in use, or that are part of
+            # the hash tree or checksum have inode 0
+            if inodenumber == 0 or name in [b'.', b'..']:
+                continue
+            if b'/' in name or b'\x00' in name or name == b'':
+                raise Ext2Error('invalid file name')
+            if name in names:
+                raise Ext2Error('duplicate file name')
+            names.add(name)
+            entries.append((name, inodenumber))
+        return entries
+
+    def walk(self):
+        '''Yield all files in the file system, as tuples (path, inode),
+        with directories before the files in them. The path is relative
+        to the root of the file system.'''
+        dirstoscan = collections.deque([(b'', self.inode(ROOT_INODE))])
+        seendirs = set([ROOT_INODE])
+        while dirstoscan:
+            (dirpath, dirinode) = dirstoscan.popleft()
+            for name, inodenumber in self.directory_entries(dirinode):
+                inode = self.inode(inodenumber)
+                path = dirpath + b'/' + name if dirpath else name
+                if stat.S_ISDIR(inode.mode):
+                    if inodenumber in seendirs:
+                        raise Ext2Error('directory loop')
+                    seendirs.add(inodenumber)
+                    dirstoscan.append((path, inode))
+                yield (path, inode)
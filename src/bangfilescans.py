@@ -37,6 +37,7 @@ import sys
 
 # import own code
 import bangsignatures
+import VirtualFile
 
 
 def knownfile_nsrl(fileresult, hashresults, dbconn, dbcursor, scanenvironment):
@@ -47,6 +48,10 @@ def knownfile_nsrl(fileresult, hashresults, dbconn, dbcursor, scanenvironment):
     if dbconn is None:
         return results
 
+    # the SHA1 might not be computed, see the configuration
+    if 'sha1' not in hashresults:
+        return results
+
     # first grab a *possible* filename from the NSRL database using
     # the SHA1 of the file. At the moment just one *possible* filename
     # is recorded in the database.
@@ -109,11 +114,10 @@ def extract_identifier(fileresult, hashresults, dbconn, dbcursor, scanenvironmen
     forgeresults = {}
 
     seekbuf = bytearray(1000000)
-    filename_full = scanenvironment.unpack_path(fileresult.filename)
     filesize = fileresult.filesize
 
-    # open the file in binary mode
-    checkfile = open(filename_full, 'rb')
+    # open the file in binary mode, this also works for virtual files
+    checkfile = VirtualFile.open_file(scanenvironment, fileresult)
     checkfile.seek(0)
     while True:
         bytesread = checkfile.readinto(seekbuf)
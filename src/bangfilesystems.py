@@ -25,7 +25,7 @@
 # Built in carvers/verifiers/unpackers for file systems.
 #
 # For these unpackers it has been attempted to reduce disk I/O as much
-# as possible using the os.sendfile() method, as well as techniques
+# as possible using the bangio.copy_range() method, as well as techniques
 # described in this blog post:
 #
 # https://eli.thegreenplace.net/2011/11/28/less-copies-in-python-with-the-buffer-protocol-and-memoryviews
@@ -43,8 +43,11 @@ import gzip
 import stat
 import subprocess
 import json
-import re
 import pathlib
+import mmap
+
+import bangio
+import bangext2
 
 encodingstotranslate = ['utf-8', 'ascii', 'latin-1', 'euc_jp', 'euc_jis_2004',
                         'jisx0213', 'iso2022_jp', 'iso2022_jp_1',
@@ -53,6 +56,25 @@ encodingstotranslate = ['utf-8', 'ascii', 'latin-1', 'euc_jp', 'euc_jis_2004',
                         'shift_jis_2004', 'shift_jisx0213']
 
 
+# whether or not unsquashfs supports the -o option (squashfs-tools 4.4
+# and later), which is checked the first time it is needed.
+unsquashfs_offset_supported = None
+
+
+def unsquashfs_supports_offset():
+    '''Return whether or not unsquashfs can unpack a file system that
+    does not start at the beginning of a file.'''
+    global unsquashfs_offset_supported
+    if unsquashfs_offset_supported is None:
+        try:
+            p = subprocess.run(['unsquashfs', '-help'],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            unsquashfs_offset_supported = b'-o[ffset]' in p.stdout
+        except OSError:
+            unsquashfs_offset_supported = False
+    return unsquashfs_offset_supported
+
+
 # Unpacking for squashfs
 # There are many different flavours of squashfs and configurations
 # differ per Linux distribution.
@@ -168,108 +190,90 @@ def unpack_squashfs(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'file system cannot extend past file'}
         return {'status': False, 'error': unpackingerror}
 
-    # then create a temporary file and copy the data into the
-    # temporary file but only if offset != 0
-    if offset != 0:
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        # depending on the variant of squashfs a file size can be
-        # determined meaning less data needs to be copied.
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, filesize - offset)
-        os.fdopen(temporaryfile[0]).close()
     checkfile.close()
 
-    # unpack in a temporary directory, as unsquashfs expects
-    # to create the directory itself, but the unpacking directory
-    # already exists.
-    squashfsunpackdirectory = tempfile.mkdtemp(dir=scanenvironment.temporarydirectory)
-
-    if offset != 0:
-        p = subprocess.Popen(['unsquashfs', temporaryfile[1]],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=squashfsunpackdirectory)
+    # newer versions of unsquashfs can be told where the file system
+    # starts, otherwise the file system is copied to a temporary file.
+    # Data after the file system (such as padding) is ignored by
+    # unsquashfs, so a file system at the start of the file is never
+    # copied.
+    if unsquashfs_supports_offset():
+        offsetarguments = lambda o: ['-o', '%d' % o]
+    else:
+        offsetarguments = None
+    if offset == 0:
+        rangesize = filesize
     else:
-        p = subprocess.Popen(['unsquashfs', filename_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=squashfsunpackdirectory)
-    (outputmsg, errormsg) = p.communicate()
+        rangesize = squashfssize
+
+    # the file system is unpacked straight into the unpacking directory
+    # (-f is needed as the directory already exists), and the names of
+    # the unpacked files are printed (-i) instead of a progress bar (-n)
+    # so the directory does not need to be walked afterwards.
+    os.makedirs(unpackdir_full, exist_ok=True)
+    unsquashfsargs = ['-n', '-i', '-f', '-d', unpackdir_full,
+                      '-p', '%d' % scanenvironment.get_toolthreads('unsquashfs')]
+    with bangio.range_file(filename_full, offset, rangesize,
+                           scanenvironment.temporarydirectory,
+                           offsetarguments) as (squashfsfile, squashfsargs):
+        p = subprocess.Popen(['unsquashfs'] + unsquashfsargs + squashfsargs + [squashfsfile],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (outputmsg, errormsg) = p.communicate()
+
+    # the unpacking directory gets the permissions of the root
+    # directory of the file system, so make sure it can be accessed.
+    os.chmod(unpackdir_full, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
 
     if p.returncode != 0:
-        shutil.rmtree(squashfsunpackdirectory)
-        if usesasquatch:
-            # retry with sasquatch, using 1 thread
-            squashfsunpackdirectory = tempfile.mkdtemp(dir=scanenvironment.temporarydirectory)
-            if offset != 0:
-                p = subprocess.Popen(['sasquatch', '-p', '1', temporaryfile[1]],
-                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                     cwd=squashfsunpackdirectory)
-            else:
-                p = subprocess.Popen(['sasquatch', '-p', '1', filename_full],
-                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                     cwd=squashfsunpackdirectory)
+        if not usesasquatch:
+            unpackingerror = {'offset': offset+unpackedsize,
+                              'fatal': False,
+                              'reason': 'Not a valid squashfs file'}
+            return {'status': False, 'error': unpackingerror}
+
+        # retry with sasquatch. sasquatch cannot be told where the
+        # file system starts, and the size in the header of vendor
+        # variants cannot always be trusted, so everything from the
+        # offset is used. First remove anything that unsquashfs
+        # unpacked.
+        remove_unpacked_tree(unpackdir_full)
+        os.makedirs(unpackdir_full)
+        sasquatchargs = ['-n', '-i', '-f', '-d', unpackdir_full,
+                         '-p', '%d' % scanenvironment.get_toolthreads('sasquatch')]
+        with bangio.range_file(filename_full, offset, filesize - offset,
+                               scanenvironment.temporarydirectory) as (squashfsfile, squashfsargs):
+            p = subprocess.Popen(['sasquatch'] + sasquatchargs + [squashfsfile],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             (outputmsg, errormsg) = p.communicate()
+        os.chmod(unpackdir_full, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
 
-            if p.returncode != 0:
-                # remove old data
-                if offset != 0:
-                    os.unlink(temporaryfile[1])
-                unpackingerror = {'offset': offset+unpackedsize,
-                                  'fatal': False,
-                                  'reason': 'Not a valid squashfs file'}
-                return {'status': False, 'error': unpackingerror}
-        else:
-            if offset != 0:
-                os.unlink(temporaryfile[1])
+        if p.returncode != 0:
             unpackingerror = {'offset': offset+unpackedsize,
                               'fatal': False,
                               'reason': 'Not a valid squashfs file'}
             return {'status': False, 'error': unpackingerror}
 
-    # remove old data
-    if offset != 0:
-        os.unlink(temporaryfile[1])
-
     unpackedsize = squashfssize
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
-
-    # move contents of the unpacked file system
-    foundfiles = os.listdir(squashfsunpackdirectory)
-    if len(foundfiles) == 1:
-        old_dir = os.getcwd()
-        if foundfiles[0] == 'squashfs-root':
-            os.chdir(os.path.join(squashfsunpackdirectory, 'squashfs-root'))
-        else:
-            os.chdir(squashfsunpackdirectory)
-        listoffiles = os.listdir()
-        for l in listoffiles:
-            try:
-                shutil.move(l, unpackdir_full, copy_function=local_copy2)
-            except:
-                # TODO: make exception more specific
-                # TODO: report
-                # not all files can be copied.
-                # example: named pipe /dev/initctl in FW_WL_600g_1036A.zip
-                pass
-        os.chdir(old_dir)
-
-    # clean up the temporary directory
-    shutil.rmtree(squashfsunpackdirectory)
-
-    # now add everything that was unpacked
-    dirwalk = os.walk(unpackdir_full)
-    for direntries in dirwalk:
-        # make sure all subdirectories and files can be accessed
-        for entryname in direntries[1]:
-            fullfilename = os.path.join(direntries[0], entryname)
-            if not os.path.islink(fullfilename):
-                os.chmod(fullfilename, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
-            relfilename = scanenvironment.rel_unpack_path(fullfilename)
-            unpackedfilesandlabels.append((relfilename, []))
-        for entryname in direntries[2]:
-            fullfilename = os.path.join(direntries[0], entryname)
-            relfilename = scanenvironment.rel_unpack_path(fullfilename)
-            unpackedfilesandlabels.append((relfilename, []))
+    # now add everything that was unpacked. The path of every unpacked
+    # file is printed on a line of its own, starting with the unpacking
+    # directory. Other lines, such as statistics, are ignored.
+    unpackprefix = os.fsencode(unpackdir_full) + b'/'
+    for line in outputmsg.splitlines():
+        if not line.startswith(unpackprefix):
+            continue
+        fullfilename = os.fsdecode(line)
+        try:
+            filestat = os.lstat(fullfilename)
+        except OSError:
+            # for example device files, which cannot be created
+            # without root privileges.
+            continue
+        # make sure all subdirectories can be accessed
+        if stat.S_ISDIR(filestat.st_mode):
+            os.chmod(fullfilename, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+        relfilename = scanenvironment.rel_unpack_path(fullfilename)
+        unpackedfilesandlabels.append((relfilename, []))
 
     if offset + unpackedsize != filesize:
         # by default mksquashfs pads to 4K blocks with NUL bytes.
@@ -294,6 +298,18 @@ def unpack_squashfs(fileresult, scanenvironment, offset, unpackdir):
             'filesandlabels': unpackedfilesandlabels}
 
 
+def remove_unpacked_tree(directory):
+    '''Remove a directory with unpacked files, after making sure that
+    all subdirectories can be accessed.'''
+    os.chmod(directory, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+    for direntries in os.walk(directory):
+        for subdir in direntries[1]:
+            subdirname = os.path.join(direntries[0], subdir)
+            if not os.path.islink(subdirname):
+                os.chmod(subdirname, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+    shutil.rmtree(directory)
+
+
 # a wrapper around shutil.copy2 to copy symbolic links instead of
 # following them and copying the data. This is used in squashfs
 # unpacking amongst others.
@@ -1036,7 +1052,7 @@ def unpack_iso9660(fileresult, scanenvironment, offset, unpackdir):
                         if createfile:
                             outfile = open(outfile_full, 'wb')
                             if not havezisofs:
-                                os.sendfile(outfile.fileno(), checkfile.fileno(), offset + extent_location * logical_size, directory_extent_length)
+                                bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + extent_location * logical_size, directory_extent_length)
                             else:
                                 # first some sanity checks
                                 zisofs_oldoffset = checkfile.tell()
@@ -1765,9 +1781,9 @@ def unpack_jffs2(fileresult, scanenvironment, offset, unpackdir):
 #
 # The format is described in Chapter 3 and is used to implement
 # several sanity checks. References to the specification point
-# to this document. The heavy lifting is done using e2tools
-# because it already takes care of deleted files, etc. through
-# e2fsprogs-libs.
+# to this document. The file system is read with the reader in
+# bangext2, which also supports the ext4 extensions, such as extent
+# trees, indexed directories and inline data.
 def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
     '''Unpack an ext2/ext3/ext4 file system.'''
     filesize = fileresult.filesize
@@ -1784,16 +1800,6 @@ def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'not enough data for superblock'}
         return {'status': False, 'error': unpackingerror}
 
-    if shutil.which('e2ls') is None:
-        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                          'reason': 'e2ls program not found'}
-        return {'status': False, 'error': unpackingerror}
-
-    if shutil.which('e2cp') is None:
-        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                          'reason': 'e2cp program not found'}
-        return {'status': False, 'error': unpackingerror}
-
     # open the file and skip directly to the superblock
     checkfile = open(filename_full, 'rb')
     checkfile.seek(offset+1024)
@@ -2002,41 +2008,14 @@ def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
     except UnicodeDecodeError:
         pass
 
-    # e2tools can work with trailing data, but if there is any data
-    # preceding the file system then some carving has to be done first.
-    havetmpfile = False
-    if not offset == 0:
-        # if files are larger than a certain limit, then os.sendfile()
-        # won't write more data than 2147479552 so write bytes
-        # out in chunks. Reference:
-        # https://bugzilla.redhat.com/show_bug.cgi?id=612839
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        if unpackedsize > 2147479552:
-            bytesleft = unpackedsize
-            bytestowrite = min(bytesleft, 2147479552)
-            readoffset = offset
-            while bytesleft > 0:
-                os.sendfile(temporaryfile[0], checkfile.fileno(), readoffset, bytestowrite)
-                bytesleft -= bytestowrite
-                readoffset += bytestowrite
-                bytestowrite = min(bytesleft, 2147479552)
-        else:
-            os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-    checkfile.close()
-
-    # Now read the contents of the file system with e2ls and
-    # copy the files with e2cp.
-    # Unfortunately e2cp does not allow recursive copying, so the entire
-    # directory structure has to be walked recursively and recreated.
-    # Individual files have then to be copied with e2cp.
-    ext2dirstoscan = collections.deque([''])
+    # Now read the contents of the file system and copy the files
+    # directly from the file, without carving the file system first.
+    # The metadata is read through a memory mapping of the file.
+    checkbytes = mmap.mmap(checkfile.fileno(), 0, access=mmap.ACCESS_READ)
 
     # store a mapping for inodes and files. This is needed to detect
     # hard links, where files have the same inode.
     inodetofile = {}
-    filetoinode = {}
 
     # keep track of if any data was unpacked. Since file systems that
     # have been created always have the "lost+found" directory it means
@@ -2044,39 +2023,12 @@ def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
     # or at least it was not a useful file system.
     dataunpacked = False
 
-    while True:
-        try:
-            ext2dir = ext2dirstoscan.popleft()
-        except IndexError:
-            # there are no more entries to process
-            break
-        if havetmpfile:
-            p = subprocess.Popen(['e2ls', '-lai', temporaryfile[1] + ":" + ext2dir], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        else:
-            p = subprocess.Popen(['e2ls', '-lai', str(filename_full) + ":" + ext2dir], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        if p.returncode != 0:
-            if havetmpfile:
-                os.unlink(temporaryfile[1])
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'e2ls error'}
-            return {'status': False, 'error': unpackingerror}
-        dirlisting = outputmsg.rstrip().split(b'\n')
-
-        # create the unpacking directory
-        os.makedirs(unpackdir_full, exist_ok=True)
-        for d in dirlisting:
-            # ignore deleted files
-            if d.strip().startswith(b'>'):
-                continue
-            dirsplit = re.split(b'\s+', d.strip(), 7)
-            if len(dirsplit) != 8:
-                unpackingerror = {'offset': offset, 'fatal': False,
-                                  'reason': 'not enough data in directory entry'}
-                return {'status': False, 'error': unpackingerror}
-            (inode, filemode, userid, groupid, size, filedate, filetime, ext2name) = re.split(b'\s+', d.strip(), 7)
-            filemode = int(filemode, base=8)
+    # create the unpacking directory
+    os.makedirs(unpackdir_full, exist_ok=True)
 
+    try:
+        ext2fs = bangext2.Ext2FileSystem(checkbytes, offset)
+        for ext2name, inode in ext2fs.walk():
             dataunpacked = True
 
             # try to make sense of the filename by decoding it first.
@@ -2090,78 +2042,71 @@ def unpack_ext2(fileresult, scanenvironment, offset, unpackdir):
                 except Exception as e:
                     pass
             if not namedecoded:
-                if havetmpfile:
-                    os.unlink(temporaryfile[1])
+                checkbytes.close()
+                checkfile.close()
+                remove_unpacked_tree(unpackdir_full)
                 unpackingerror = {'offset': offset, 'fatal': False,
                                   'reason': 'could not decode file name'}
                 return {'status': False, 'error': unpackingerror}
 
+            outfile_rel = os.path.join(unpackdir, ext2name)
+            outfile_full = scanenvironment.unpack_path(outfile_rel)
+
             # Check the different file types
-            if stat.S_ISDIR(filemode):
-                # It is a directory, so create it and then add
-                # it to the scanning queue, unless it is . or ..
-                if ext2name == '.' or ext2name == '..':
+            if stat.S_ISDIR(inode.mode):
+                # It is a directory, so create it. The files in
+                # it are returned by walk() after the directory.
+                os.mkdir(outfile_full)
+                unpackedfilesandlabels.append((outfile_rel, []))
+            elif stat.S_ISLNK(inode.mode):
+                symlinktarget = ext2fs.readlink(inode)
+                try:
+                    symlinktarget = symlinktarget.decode()
+                except UnicodeDecodeError:
                     continue
-                newext2dir = os.path.join(ext2dir, ext2name)
-                ext2dirstoscan.append(newext2dir)
-                ext2dir_rel = os.path.join(unpackdir, newext2dir)
-                ext2dir_full = scanenvironment.unpack_path(ext2dir_rel)
-                os.mkdir(ext2dir_full)
-                unpackedfilesandlabels.append((ext2dir_rel, []))
-            elif stat.S_ISBLK(filemode):
-                # ignore block devices
-                continue
-            elif stat.S_ISCHR(filemode):
-                # ignore character devices
-                continue
-            elif stat.S_ISFIFO(filemode):
-                # ignore FIFO
-                continue
-            elif stat.S_ISSOCK(filemode):
-                # ignore sockets
-                continue
-
-            fullext2name = os.path.join(ext2dir, ext2name)
-            filetoinode[fullext2name] = inode
-            if stat.S_ISLNK(filemode):
-                # e2cp cannot copy symbolic links
-                # so just record it as a symbolic link
-                # TODO: process symbolic links
-                pass
-            elif stat.S_ISREG(filemode):
-                fileunpacked = False
-                if inode not in inodetofile:
-                    inodetofile[inode] = fullext2name
-                    # use e2cp to copy the file
-                    ext2dir_rel = os.path.join(unpackdir, ext2dir)
-                    ext2dir_full = scanenvironment.unpack_path(ext2dir_rel)
-                    if havetmpfile:
-                        p = subprocess.Popen(['e2cp', temporaryfile[1] + ":" + fullext2name, "-d", ext2dir_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    else:
-                        p = subprocess.Popen(['e2cp', str(filename_full) + ":" + fullext2name, "-d", ext2dir_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    (outputmsg, errormsg) = p.communicate()
-                    if p.returncode != 0:
-                        if havetmpfile:
-                            os.unlink(temporaryfile[1])
-                        unpackingerror = {'offset': offset, 'fatal': False,
-                                          'reason': 'e2cp error'}
-                        return {'status': False, 'error': unpackingerror}
-                    fileunpacked = True
-                else:
+                os.symlink(symlinktarget, outfile_full)
+                unpackedfilesandlabels.append((outfile_rel, ['symbolic link']))
+            elif stat.S_ISREG(inode.mode):
+                if inode.number in inodetofile:
                     # hardlink the file to an existing
                     # file and record it as such.
-                    if inodetofile[inode] != fullext2name:
-                        os.link(os.path.join(unpackdir_full, inodetofile[inode]), os.path.join(unpackdir_full, fullext2name))
-                        fileunpacked = True
-                if fileunpacked:
-                    unpackedfilesandlabels.append((os.path.join(unpackdir, fullext2name), []))
+                    os.link(inodetofile[inode.number], outfile_full)
+                else:
+                    inodetofile[inode.number] = outfile_full
+                    # copy the data of the file from the blocks in
+                    # the file system. Holes in the file are
+                    # skipped, so they are sparse in the unpacked file.
+                    with open(outfile_full, 'wb') as outfile:
+                        if inode.flags & bangext2.INODE_INLINE_DATA:
+                            outfile.write(ext2fs.read(inode))
+                        else:
+                            for logical, blocknr, count in ext2fs.block_runs(inode):
+                                datastart = logical * ext2fs.blocksize
+                                if datastart >= inode.size:
+                                    continue
+                                outfile.seek(datastart)
+                                bangio.copy_range(outfile.fileno(), checkfile.fileno(),
+                                        offset + blocknr * ext2fs.blocksize,
+                                        min(count * ext2fs.blocksize, inode.size - datastart))
+                        outfile.truncate(inode.size)
+                unpackedfilesandlabels.append((outfile_rel, []))
+            # block devices, character devices, FIFOs and
+            # sockets are ignored
+    except (bangext2.Ext2Error, OSError) as e:
+        # remove the files that were unpacked before the error
+        checkbytes.close()
+        checkfile.close()
+        remove_unpacked_tree(unpackdir_full)
+        unpackingerror = {'offset': offset, 'fatal': False,
+                          'reason': str(e)}
+        return {'status': False, 'error': unpackingerror}
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
+    checkbytes.close()
+    checkfile.close()
 
     # only report if any data was unpacked
     if not dataunpacked:
+        remove_unpacked_tree(unpackdir_full)
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'no data unpacked'}
         return {'status': False, 'error': unpackingerror}
@@ -2746,9 +2691,9 @@ def unpack_dlink_romfs(fileresult, scanenvironment, offset, unpackdir):
                     try:
                         outfile.write(lzma.decompress(checkfile.read(entrysize)))
                     except:
-                        os.sendfile(outfile.fileno(), checkfile.fileno(), offset + entryoffset, entrysize)
+                        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + entryoffset, entrysize)
                 else:
-                    os.sendfile(outfile.fileno(), checkfile.fileno(), offset + entryoffset, entrysize)
+                    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + entryoffset, entrysize)
                 outfile.close()
                 unpackedfilesandlabels.append((outfile_rel, []))
                 maxunpacked = max(maxunpacked, offset + entryoffset + entrysize)
@@ -3199,7 +3144,7 @@ def unpack_fat(fileresult, scanenvironment, offset, unpackdir):
                 # now walk the chain and write the contents of each cluster
                 byteswritten = 0
                 while True:
-                    byteswritten += os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), clustersize)
+                    byteswritten += bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), clustersize)
 
                     maxoffset = max(maxoffset, checkfile.tell() + clustersize - offset)
 
@@ -3513,7 +3458,7 @@ def unpack_cbfs(fileresult, scanenvironment, offset, unpackdir):
     outfile_rel = os.path.join(unpackdir, "unpacked.coreboot")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), cbfsstart, romsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), cbfsstart, romsize)
     outfile.close()
     checkfile.close()
 
@@ -3838,7 +3783,7 @@ def unpack_minix1l(fileresult, scanenvironment, offset, unpackdir):
             # write all the data
             for z in zonestowrite:
                 dataoffset = offset + z * blocksize
-                os.sendfile(outfile.fileno(), checkfile.fileno(), dataoffset, blocksize)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), dataoffset, blocksize)
                 maxoffset = max(maxoffset, z * blocksize + blocksize)
             outfile.truncate(inodes[i]['size'])
             outfile.close()
@@ -4164,7 +4109,7 @@ def unpack_romfs(fileresult, scanenvironment, offset, unpackdir):
             outfile_rel = os.path.join(unpackdir, curcwd, inodename)
             outfile_full = scanenvironment.unpack_path(outfile_rel)
             outfile = open(outfile_full, 'wb')
-            os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), inodesize)
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), inodesize)
             outfile.close()
             unpackedfilesandlabels.append((outfile_rel, []))
         elif modeinfo == 3:
@@ -4507,8 +4452,6 @@ def unpack_cramfs(fileresult, scanenvironment, offset, unpackdir):
                                       'reason': 'invalid directory entry'}
                     return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-
     # unpack in a temporary directory, as fsck.cramfs expects
     # to create the directory itself, but the unpacking directory
     # already exists.
@@ -4519,25 +4462,12 @@ def unpack_cramfs(fileresult, scanenvironment, offset, unpackdir):
     # remove the directory. Possible race condition?
     shutil.rmtree(cramfsunpackdirectory)
 
-    if offset == 0 and cramfssize == filesize:
-        checkfile.close()
-        p = subprocess.Popen(['fsck.cramfs', '--extract=%s' % cramfsunpackdirectory, filename_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    else:
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, cramfssize)
-        os.fdopen(temporaryfile[0]).close()
-        checkfile.close()
-        havetmpfile = True
-
-        p = subprocess.Popen(['fsck.cramfs', '--extract=%s' % cramfsunpackdirectory, temporaryfile[1]],
+    checkfile.close()
+    with bangio.range_file(filename_full, offset, cramfssize,
+                           scanenvironment.temporarydirectory) as (cramfsfile, cramfsargs):
+        p = subprocess.Popen(['fsck.cramfs', '--extract=%s' % cramfsunpackdirectory, cramfsfile],
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
-
-    # clean up
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
+        (outputmsg, errormsg) = p.communicate()
 
     if p.returncode != 0:
         # clean up the temporary directory. It could be that
@@ -4753,7 +4683,7 @@ def unpack_plf(fileresult, scanenvironment, offset, unpackdir):
             outfile_full = scanenvironment.unpack_path(outfile_rel)
             os.makedirs(outfile_full.parent, exist_ok=True)
             outfile = open(outfile_full, 'wb')
-            os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
 
             # add result to result set
             unpackedfilesandlabels.append((outfile_rel, []))
@@ -4821,7 +4751,7 @@ def unpack_plf(fileresult, scanenvironment, offset, unpackdir):
                 if is_compressed:
                     outfile.write(entry_data)
                 else:
-                    os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size-local_bytes_read)
+                    bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size-local_bytes_read)
                 outfile.close()
 
                 # add the file system to the result set
@@ -4846,7 +4776,7 @@ def unpack_plf(fileresult, scanenvironment, offset, unpackdir):
                     if is_compressed:
                         outfile.write(entry_data[12:])
                     else:
-                        os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell()+8, entry_size-local_bytes_read)
+                        bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell()+8, entry_size-local_bytes_read)
                     outfile.close()
 
                     # add result to result set
@@ -4888,7 +4818,7 @@ def unpack_plf(fileresult, scanenvironment, offset, unpackdir):
             outfile_full = scanenvironment.unpack_path(outfile_rel)
             os.makedirs(outfile_full.parent, exist_ok=True)
             outfile = open(outfile_full, 'wb')
-            os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
             outfile.close()
 
             # add result to result set
@@ -4913,7 +4843,7 @@ def unpack_plf(fileresult, scanenvironment, offset, unpackdir):
                 outfile_full = scanenvironment.unpack_path(outfile_rel)
                 os.makedirs(outfile_full.parent, exist_ok=True)
                 outfile = open(outfile_full, 'wb')
-                os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
                 outfile.close()
 
                 # skip over the data
@@ -4931,7 +4861,7 @@ def unpack_plf(fileresult, scanenvironment, offset, unpackdir):
                 outfile_full = scanenvironment.unpack_path(outfile_rel)
                 os.makedirs(outfile_full.parent, exist_ok=True)
                 outfile = open(outfile_full, 'wb')
-                os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), entry_size)
                 outfile.close()
 
                 # skip over the data
@@ -5390,7 +5320,7 @@ def unpack_ubi(fileresult, scanenvironment, offset, unpackdir):
                 readoffset = erase_block * blocksize + blocks[block]['offset']
                 blockreadsize = blocksize - blocks[erase_block]['offset']
                 unpackedsize = max(unpackedsize, readoffset + blockreadsize)
-                os.sendfile(outfile.fileno(), checkfile.fileno(), offset + readoffset, blockreadsize)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + readoffset, blockreadsize)
             outfile.close()
 
             if broken_image:
@@ -5523,7 +5453,7 @@ def unpack_pfs(fileresult, scanenvironment, offset, unpackdir):
         os.makedirs(outfile_full.parent, exist_ok=True)
         outfile = open(outfile_full, 'wb')
         if i['size'] != 0:
-            os.sendfile(outfile.fileno(), checkfile.fileno(), orig_offset + i['offset'], i['size'])
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), orig_offset + i['offset'], i['size'])
         unpackedfilesandlabels.append((outfile_rel, []))
         outfile.close()
         maxoffset = max(maxoffset, i['offset'] + i['size'] + orig_offset - offset)
@@ -5770,7 +5700,7 @@ def unpack_yaffs2(fileresult, scanenvironment, offset, unpackdir):
                 if last_open is None:
                     break
                 # jump to the offset of the chunk and write data
-                os.sendfile(last_open.fileno(), checkfile.fileno(), oldoffset, byte_count)
+                bangio.copy_range(last_open.fileno(), checkfile.fileno(), oldoffset, byte_count)
             else:
                 # object id should not have been seen yet
                 if objectid in objectid_to_latest_chunk:
@@ -25,12 +25,13 @@
 # Built in carvers/verifiers/unpackers for various game formats.
 #
 # For these unpackers it has been attempted to reduce disk I/O as much
-# as possible using the os.sendfile() method, as well as techniques
+# as possible using the bangio.copy_range() method, as well as techniques
 # described in this blog post:
 #
 # https://eli.thegreenplace.net/2011/11/28/less-copies-in-python-with-the-buffer-protocol-and-memoryviews
 
 import os
+import bangio
 
 
 # unpack Quake PAK files
@@ -149,7 +150,7 @@ def unpack_quake_pak(fileresult, scanenvironment, offset, unpackdir):
 
         # write the file
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset + fn_offset, fn_size)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + fn_offset, fn_size)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, []))
         dataunpacked = True
@@ -261,7 +262,7 @@ def unpack_doom_wad(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, maxoffset)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, maxoffset)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['doom', 'wad', 'resource', 'unpacked']))
 
@@ -0,0 +1,185 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# Helper functions to copy (ranges of) files with as little I/O as
+# possible. In order of preference data is:
+#
+# 1. shared with the source file using a reflink (FICLONERANGE ioctl),
+#    which works on file systems like XFS and btrfs if the range is
+#    aligned to the block size of the file system
+# 2. copied inside the kernel using copy_file_range(), which can do
+#    server side copies or reflinks on some file systems as well
+# 3. copied inside the kernel using sendfile()
+#
+# If a method is not supported it is not tried again for the rest of
+# the process.
+#
+# There is also a helper to give a range of a file to an external
+# program, without copying everything from the offset to the end of the
+# file to a temporary file first: range_file() gives the program the
+# file itself if the range is the whole file, or if the program can be
+# told where the data starts with its own options (such as
+# "unsquashfs -o"). Otherwise it creates a temporary file with only the
+# range, with copy_range().
+
+import os
+import stat
+import errno
+import fcntl
+import struct
+import shutil
+import tempfile
+import contextlib
+
+# from linux/fs.h: _IOW(0x94, 13, struct file_clone_range)
+FICLONERANGE = 0x4020940d
+
+# sendfile() and copy_file_range() do not copy more than this
+# amount of bytes per call.
+# https://bugzilla.redhat.com/show_bug.cgi?id=612839
+MAXCOPYSIZE = 2147479552
+
+# errors that indicate that a method cannot be used for these files
+_unsupportederrors = set([errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+                          errno.EINVAL, errno.ENOSYS, errno.EBADF,
+                          errno.ETXTBSY, errno.EPERM])
+
+use_reflink = True
+use_copy_file_range = hasattr(os, 'copy_file_range')
+
+
+def _reflink_range(outfd, infd, offset, count):
+    '''Try to share count bytes from offset in infd with outfd at the
+    current position of outfd. Returns True if this succeeded.'''
+    global use_reflink
+    instat = os.fstat(infd)
+    outoffset = os.lseek(outfd, 0, os.SEEK_CUR)
+    blocksize = instat.st_blksize
+
+    # offsets have to be aligned to the block size, and so has the
+    # length, unless the range runs until the end of the source file.
+    if offset % blocksize != 0 or outoffset % blocksize != 0:
+        return False
+    if count % blocksize != 0 and offset + count != instat.st_size:
+        return False
+    if not stat.S_ISREG(instat.st_mode):
+        return False
+
+    try:
+        fcntl.ioctl(outfd, FICLONERANGE,
+                    struct.pack('qQQQ', infd, offset, count, outoffset))
+    except OSError as e:
+        if e.errno in [errno.EOPNOTSUPP, errno.ENOTTY, errno.ENOSYS]:
+            # the file system cannot do reflinks at all
+            use_reflink = False
+        return False
+    os.lseek(outfd, outoffset + count, os.SEEK_SET)
+    return True
+
+
+def copy_range(outfd, infd, offset, count):
+    '''Copy count bytes starting at offset in the file descriptor infd to
+    the current position of the file descriptor outfd, like os.sendfile()
+    but without the 2 GiB limit, and without copying the data if the
+    file system supports this. The position of infd is not changed, the
+    position of outfd is moved past the data. Returns the amount of bytes
+    that were copied.'''
+    global use_copy_file_range
+    if count <= 0:
+        return 0
+
+    if use_reflink and _reflink_range(outfd, infd, offset, count):
+        return count
+
+    bytescopied = 0
+    if use_copy_file_range:
+        try:
+            while bytescopied < count:
+                copied = os.copy_file_range(infd, outfd,
+                        min(count - bytescopied, MAXCOPYSIZE),
+                        offset + bytescopied)
+                if copied == 0:
+                    return bytescopied
+                bytescopied += copied
+            return bytescopied
+        except OSError as e:
+            if e.errno not in _unsupportederrors:
+                raise
+            if e.errno in [errno.ENOSYS, errno.EXDEV]:
+                # older kernels do not support copy_file_range() or
+                # copies between file systems.
+                use_copy_file_range = False
+
+    while bytescopied < count:
+        copied = os.sendfile(outfd, infd, offset + bytescopied,
+                             min(count - bytescopied, MAXCOPYSIZE))
+        if copied == 0:
+            break
+        bytescopied += copied
+    return bytescopied
+
+
+def copy_file(src, dst):
+    '''Copy the file src to dst (which can be a directory) including the
+    permission bits, like shutil.copy(), using copy_range().
+    Returns the path of the new file.'''
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    infile = open(src, 'rb')
+    outfile = open(dst, 'wb')
+    copy_range(outfile.fileno(), infile.fileno(), 0, os.fstat(infile.fileno()).st_size)
+    outfile.close()
+    infile.close()
+    shutil.copymode(src, dst)
+    return dst
+
+
+@contextlib.contextmanager
+def range_file(filename, offset, size, temporarydirectory,
+               offsetarguments=None):
+    '''Yield a tuple (file name, arguments) to run an external program
+    on the size bytes from offset in filename. If the range is the whole
+    file the file name is filename and there are no arguments. Otherwise,
+    if offsetarguments is set, it is called with the offset and should
+    return the arguments that tell the program where the data starts in
+    filename (the program should find the end of the data itself).
+    As a last resort the range is copied to a temporary file in
+    temporarydirectory, which is removed afterwards.'''
+    if offset == 0 and size == os.stat(filename).st_size:
+        yield (filename, [])
+        return
+    if offsetarguments is not None:
+        yield (filename, offsetarguments(offset))
+        return
+    (fd, temporaryfile) = tempfile.mkstemp(dir=temporarydirectory)
+    try:
+        try:
+            with open(filename, 'rb') as infile:
+                copy_range(fd, infile.fileno(), offset, size)
+        finally:
+            os.close(fd)
+        yield (temporaryfile, [])
+    finally:
+        try:
+            os.unlink(temporaryfile)
+        except FileNotFoundError:
+            pass
+
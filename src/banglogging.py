@@ -7,4 +7,52 @@ def log(level, message):
         logging.log(level, message)
 
 
+class ScanLogHandler(logging.Handler):
+    '''Writes log records to the log file of the scan that is worked on,
+    which is set with set_scan_log(), so processes that work on files of
+    several scans write the messages of each scan to the log file of that
+    scan. Log files stay open until close_scan_log() is called. Records
+    are dropped when no scan is set.'''
+    def __init__(self):
+        super().__init__()
+        self.logfile = None
+        self.handlers = {}
 
+    def set_scan_log(self, logfile):
+        self.logfile = logfile
+
+    def close_scan_log(self, logfile):
+        handler = self.handlers.pop(logfile, None)
+        if handler is not None:
+            handler.close()
+        if self.logfile == logfile:
+            self.logfile = None
+
+    def emit(self, record):
+        if self.logfile is None:
+            return
+        handler = self.handlers.get(self.logfile)
+        if handler is None:
+            handler = logging.FileHandler(filename=self.logfile)
+            self.handlers[self.logfile] = handler
+        handler.emit(record)
+
+# the handler for the log files of the scans, if logging is used
+scanloghandler = None
+
+def use_scan_logs():
+    '''Write the log of every scan to its own log file, see
+    set_scan_log().'''
+    global scanloghandler
+    scanloghandler = ScanLogHandler()
+    logging.getLogger().addHandler(scanloghandler)
+
+def set_scan_log(logfile):
+    '''Log to logfile from now on, or nowhere if logfile is None.'''
+    if scanloghandler is not None:
+        scanloghandler.set_scan_log(logfile)
+
+def close_scan_log(logfile):
+    '''Flush and close logfile, when the scan is done.'''
+    if scanloghandler is not None:
+        scanloghandler.close_scan_log(logfile)
@@ -26,7 +26,7 @@
 # video, audio, PDF).
 #
 # For these unpackers it has been attempted to reduce disk I/O as much
-# as possible using the os.sendfile() method, as well as techniques
+# as possible using the bangio.copy_range() method, as well as techniques
 # described in this blog post:
 #
 # https://eli.thegreenplace.net/2011/11/28/less-copies-in-python-with-the-buffer-protocol-and-memoryviews
@@ -44,6 +44,8 @@ import datetime
 import defusedxml.minidom
 import PIL.Image
 
+import bangio
+
 encodingstotranslate = ['utf-8', 'ascii', 'latin-1', 'euc_jp', 'euc_jis_2004',
                         'jisx0213', 'iso2022_jp', 'iso2022_jp_1',
                         'iso2022_jp_2', 'iso2022_jp_2004', 'iso2022_jp_3',
@@ -404,7 +406,7 @@ def unpack_riff(
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     # TODO: missing labels?
@@ -993,7 +995,7 @@ def unpack_png(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         checkfile.close()
 
@@ -1147,7 +1149,7 @@ def unpack_bmp(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, bmpsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, bmpsize)
     outfile.close()
     checkfile.close()
 
@@ -1654,7 +1656,7 @@ def unpack_gif(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -1860,7 +1862,7 @@ def unpack_jpeg(fileresult, scanenvironment, offset, unpackdir):
             # create the unpacking directory
             os.makedirs(unpackdir_full, exist_ok=True)
             outfile = open(outfile_full, 'wb')
-            os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
             outfile.close()
             unpackedfilesandlabels.append((outfile_rel, ['graphics', 'jpeg', 'unpacked']))
             checkfile.close()
@@ -2254,7 +2256,7 @@ def unpack_jpeg(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -2436,7 +2438,7 @@ def unpack_ico(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory and write the file
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
 
     # reopen output file in read only mode
@@ -2618,7 +2620,7 @@ def unpack_sgi(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, imagelength)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, imagelength)
         outfile.close()
         checkfile.close()
 
@@ -2694,7 +2696,7 @@ def unpack_sgi(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['sgi', 'graphics', 'unpacked']))
@@ -2814,7 +2816,7 @@ def unpack_aiff(fileresult, scanenvironment, offset, unpackdir):
     outfile_rel = os.path.join(unpackdir, "unpacked-aiff")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['audio', 'aiff', 'unpacked', aifftype]))
@@ -2923,7 +2925,7 @@ def unpack_au(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         checkfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['audio', 'au', 'unpacked']))
@@ -3044,7 +3046,7 @@ def unpack_sunraster(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['sun raster', 'raster', 'graphics', 'unpacked']))
@@ -3156,7 +3158,7 @@ def unpack_apple_icon(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -3305,7 +3307,7 @@ def unpack_mng(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         checkfile.close()
 
@@ -3514,7 +3516,7 @@ def unpack_swf(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         checkfile.close()
         outlabels = ['swf', 'video', 'unpacked']
@@ -3574,7 +3576,7 @@ def unpack_swf(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         checkfile.close()
         outlabels = ['swf', 'zlib compressed swf', 'video', 'unpacked']
@@ -3679,7 +3681,7 @@ def unpack_swf(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     outlabels = ['swf', 'lzma compressed swf', 'video', 'unpacked']
@@ -3914,7 +3916,7 @@ def unpack_flv(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     outlabels = ['flv', 'video', 'unpacked']
@@ -4441,7 +4443,7 @@ def unpack_pdf(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, validpdfsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, validpdfsize)
         outfile.close()
         checkfile.close()
 
@@ -4575,7 +4577,7 @@ def unpack_gimp_brush(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -4697,7 +4699,7 @@ def unpack_midi(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -4991,7 +4993,7 @@ def unpack_dds(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -5228,7 +5230,7 @@ def unpack_ktx11(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -5459,7 +5461,7 @@ def unpack_psd(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
 
     # reopen as read only
@@ -5742,7 +5744,7 @@ def unpack_pnm(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
 
     # reopen as read only
@@ -5865,7 +5867,7 @@ def unpack_mapsforge(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, map_size)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, map_size)
     outfile.close()
     checkfile.close()
 
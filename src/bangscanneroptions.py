@@ -26,6 +26,9 @@ import argparse
 import stat
 import configparser
 import tempfile
+import hashlib
+
+from FileContentsComputer import hash_algorithms, fast_byte_statistics
 
 
 class ObjectDict(dict):
@@ -52,9 +55,20 @@ class BangScannerOptions:
             'baseunpackdirectory': '',
             'temporarydirectory': None,
             'removescandirectory': False,
-            'createbytecounter': False,
+            'createbytecounter': fast_byte_statistics,
             'createjson': True,
             'runfilescans': True,
+            'dedupfirst': False,
+            'resultcachedirectory': None,
+            'usemmap': False,
+            'virtualfiles': False,
+            'skippadding': False,
+            'batchscans': 0,
+            'readsize': 1048576,
+            'hashalgorithms': hash_algorithms,
+            'hashthreads': 0,
+            'toolthreads': {},
+            'skiprandomdata': False,
             'tlshmaximum': sys.maxsize,
             'postgresql_enabled': True,
             'postgresql_host': None,
@@ -194,6 +208,28 @@ class BangScannerOptions:
                 section='configuration', option='runfilescans')
         self._set_integer_option_from_config('tlshmaximum',
                 section='configuration')
+        self._set_boolean_option_from_config('dedupfirst',
+                section='configuration')
+        self._set_string_option_from_config('resultcachedirectory',
+                section='configuration')
+        self._set_boolean_option_from_config('usemmap',
+                section='configuration', option='mmap')
+        self._set_boolean_option_from_config('virtualfiles',
+                section='configuration')
+        self._set_boolean_option_from_config('skippadding',
+                section='configuration')
+        self._set_integer_option_from_config('batchscans',
+                section='configuration')
+        self._set_integer_option_from_config('readsize',
+                section='configuration')
+        self._set_string_option_from_config('hashalgorithms',
+                section='configuration', option='hashes')
+        self._set_integer_option_from_config('hashthreads',
+                section='configuration')
+        self._set_string_option_from_config('toolthreads',
+                section='configuration')
+        self._set_boolean_option_from_config('skiprandomdata',
+                section='configuration')
         self._set_boolean_option_from_config('writereport',
                 section='configuration', option='report')
         self._set_boolean_option_from_config('uselogging',
@@ -229,6 +265,53 @@ class BangScannerOptions:
         # bangthreads >= 1
         if self.options.bangthreads < 1:
             self.options.bangthreads = self.defaults['bangthreads']
+        # batchscans >= 0
+        if self.options.batchscans < 0:
+            self.options.batchscans = self.defaults['batchscans']
+        # readsize >= 1
+        if self.options.readsize < 1:
+            self.options.readsize = self.defaults['readsize']
+        # hashthreads >= 0
+        if self.options.hashthreads < 0:
+            self.options.hashthreads = self.defaults['hashthreads']
+        # the threads of external tools are given as a comma separated
+        # list of tool:threads in the configuration file. Tools that are
+        # not in the list (the "default" tool) share the CPUs with the
+        # scanning threads, so the machine is not oversubscribed.
+        if isinstance(self.options.toolthreads, str):
+            toolthreads = {}
+            for entry in self.options.toolthreads.split(','):
+                if entry.strip() == '':
+                    continue
+                (tool, sep, threads) = entry.partition(':')
+                try:
+                    threads = int(threads)
+                except ValueError:
+                    threads = 0
+                if sep == '' or threads < 1:
+                    self._error("Invalid tool threads %s, exiting" % entry.strip())
+                toolthreads[tool.strip()] = threads
+            self.options.toolthreads = toolthreads
+        else:
+            # do not change the dictionary in the defaults
+            self.options.toolthreads = dict(self.options.toolthreads)
+        if 'default' not in self.options.toolthreads:
+            self.options.toolthreads['default'] = max(1,
+                    multiprocessing.cpu_count() // self.options.bangthreads)
+        # hashes are given as a comma separated list in the configuration
+        # file. The SHA256 is always computed, as it identifies files.
+        if isinstance(self.options.hashalgorithms, str):
+            hashalgorithms = ['sha256']
+            for algorithm in self.options.hashalgorithms.split(','):
+                algorithm = algorithm.strip().lower()
+                if algorithm == '' or algorithm in hashalgorithms:
+                    continue
+                # variable length digests (shake) cannot be used
+                if algorithm not in hashlib.algorithms_available or \
+                        hashlib.new(algorithm).digest_size == 0:
+                    self._error("Unsupported hash algorithm %s, exiting" % algorithm)
+                hashalgorithms.append(algorithm)
+            self.options.hashalgorithms = hashalgorithms
         # option usedatabase true if db parameters set
         self.options.usedatabase = self.options.postgresql_enabled and \
             self.options.postgresql_db and \
@@ -272,6 +355,19 @@ class BangScannerOptions:
                         % self.options.temporarydirectory)
         self.options.temporarydirectory = os.path.realpath(self.options.temporarydirectory)
 
+        # if resultcachedirectory is defined it must be a writable directory
+        if self.options.resultcachedirectory:
+            if not os.path.isdir(self.options.resultcachedirectory):
+                self._error("Result cache directory %s is not a directory, exiting"
+                        % self.options.resultcachedirectory)
+            if not self.check_if_directory_is_writable(
+                    self.options.resultcachedirectory):
+                self._error("Result cache directory %s cannot be written to, exiting"
+                        % self.options.resultcachedirectory)
+            self.options.resultcachedirectory = os.path.realpath(self.options.resultcachedirectory)
+        else:
+            self.options.resultcachedirectory = None
+
         # either a check directory or a check file must be specified
         if self.options.checkpath is None:
             self._error("No file(s) provided to scan, exiting")
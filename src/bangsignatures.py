@@ -22,15 +22,6 @@
 # version 3
 # SPDX-License-Identifier: AGPL-3.0-only
 
-import math
-
-import bangandroid
-import bangfilesystems
-import banggames
-import bangmedia
-import bangtext
-import bangunpack
-
 # store a few standard signatures
 signatures = {
     'webp': b'WEBP',
@@ -217,143 +208,144 @@ signaturesoffset = {
 
 
 # keep a list of signatures to the (built in) functions
-signaturetofunction = {
-    'webp': bangmedia.unpack_webp,
-    'wav': bangmedia.unpack_wav,
-    'ani': bangmedia.unpack_ani,
-    'png': bangmedia.unpack_png,
-    'mng': bangmedia.unpack_mng,
-    'gzip': bangunpack.unpack_gzip,
-    'bmp': bangmedia.unpack_bmp,
-    'xz': bangunpack.unpack_xz,
-    'lzma_var1': bangunpack.unpack_lzma,
-    'lzma_var2': bangunpack.unpack_lzma,
-    'lzma_var3': bangunpack.unpack_lzma,
-    'timezone': bangunpack.unpack_timezone,
-    'tar_posix': bangunpack.unpack_tar,
-    'tar_gnu': bangunpack.unpack_tar,
-    'ar': bangunpack.unpack_ar,
-    'squashfs_var1': bangfilesystems.unpack_squashfs,
-    'squashfs_var2': bangfilesystems.unpack_squashfs,
-    'squashfs_var3': bangfilesystems.unpack_squashfs,
-    'squashfs_var4': bangfilesystems.unpack_squashfs,
-    'squashfs_var5': bangfilesystems.unpack_squashfs,
-    'squashfs_var6': bangfilesystems.unpack_squashfs,
-    'squashfs_var7': bangfilesystems.unpack_squashfs,
-    'appledouble': bangunpack.unpack_appledouble,
-    'icc': bangunpack.unpack_icc,
-    'zip': bangunpack.unpack_zip,
-    'dahua': bangunpack.unpack_dahua,
-    'bzip2': bangunpack.unpack_bzip2,
-    'xar': bangunpack.unpack_xar,
-    'gif87': bangmedia.unpack_gif,
-    'gif89': bangmedia.unpack_gif,
-    'iso9660': bangfilesystems.unpack_iso9660,
-    'lzip': bangunpack.unpack_lzip,
-    'jpeg': bangmedia.unpack_jpeg,
-    'woff': bangunpack.unpack_woff,
-    'opentype': bangunpack.unpack_opentype_font,
-    'ttc': bangunpack.unpack_opentype_font_collection,
-    'truetype': bangunpack.unpack_truetype_font,
-    'android_backup': bangandroid.unpack_android_backup,
-    'ico': bangmedia.unpack_ico,
-    'gnu_message_catalog_le': bangunpack.unpack_gnu_message_catalog,
-    'gnu_message_catalog_be': bangunpack.unpack_gnu_message_catalog,
-    'cab': bangunpack.unpack_cab,
-    'sgi': bangmedia.unpack_sgi,
-    'aiff': bangmedia.unpack_aiff,
-    'terminfo': bangunpack.unpack_terminfo,
-    'rzip': bangunpack.unpack_rzip,
-    'au': bangmedia.unpack_au,
-    'jffs2_little_endian': bangfilesystems.unpack_jffs2,
-    'jffs2_big_endian': bangfilesystems.unpack_jffs2,
-    'cpio_old': bangunpack.unpack_cpio,
-    'cpio_portable': bangunpack.unpack_cpio,
-    'cpio_newascii': bangunpack.unpack_cpio,
-    'cpio_newcrc': bangunpack.unpack_cpio,
-    '7z': bangunpack.unpack_7z,
-    'chm': bangunpack.unpack_chm,
-    'mswim': bangunpack.unpack_wim,
-    'sunraster': bangmedia.unpack_sunraster,
-    'ext2': bangfilesystems.unpack_ext2,
-    'rpm': bangunpack.unpack_rpm,
-    'zstd_08': bangunpack.unpack_zstd,
-    'apple_icon': bangmedia.unpack_apple_icon,
-    'androidsparse': bangandroid.unpack_android_sparse,
-    'lz4': bangunpack.unpack_lz4,
-    'lz4_legacy': bangunpack.unpack_lz4legacy,
-    'vmdk': bangfilesystems.unpack_vmdk,
-    'qcow2': bangfilesystems.unpack_qcow2,
-    'vdi': bangfilesystems.unpack_vdi,
-    'javaclass': bangunpack.unpack_java_class,
-    'dex': bangandroid.unpack_dex,
-    'odex': bangandroid.unpack_odex,
-    'snappy_framed': bangunpack.unpack_snappy,
-    'elf': bangunpack.unpack_elf,
-    'swf': bangmedia.unpack_swf,
-    'swf_zlib': bangmedia.unpack_swf,
-    'swf_lzma': bangmedia.unpack_swf,
-    'ubootlegacy': bangunpack.unpack_uboot_legacy,
-    'certificate': bangunpack.unpack_certificate,
-    'git_index': bangunpack.unpack_git_index,
-    'flv': bangmedia.unpack_flv,
-    'lzop': bangunpack.unpack_lzop,
-    'dlinkromfs': bangfilesystems.unpack_dlink_romfs,
-    'pdf': bangmedia.unpack_pdf,
-    'pack200': bangunpack.unpack_pack200,
-    'gimpbrush': bangmedia.unpack_gimp_brush,
-    'zim': bangunpack.unpack_zim,
-    'midi': bangmedia.unpack_midi,
-    'javakeystore': bangunpack.unpack_java_keystore,
-    'xg3d': bangmedia.unpack_xg3d,
-    'acdb': bangunpack.unpack_acdb,
-    'dds': bangmedia.unpack_dds,
-    'ktx11': bangmedia.unpack_ktx11,
-    'avb': bangandroid.unpack_avb,
-    'sqlite3': bangunpack.unpack_sqlite,
-    'dtb': bangunpack.unpack_device_tree,
-    'trx': bangunpack.unpack_trx,
-    'psd': bangmedia.unpack_psd,
-    'minidump': bangunpack.unpack_minidump,
-    'ppm': bangmedia.unpack_pnm,
-    'pgm': bangmedia.unpack_pnm,
-    'pbm': bangmedia.unpack_pnm,
-    'androidbootmsm': bangandroid.unpack_android_boot_msm,
-    'androidbootimg': bangandroid.unpack_android_boot_img,
-    'androidboothuawei': bangandroid.unpack_android_boot_huawei,
-    'fat': bangfilesystems.unpack_fat,
-    'cbfs': bangfilesystems.unpack_cbfs,
-    'minix_1l': bangfilesystems.unpack_minix1l,
-    'compress': bangunpack.unpack_compress,
-    'romfs': bangfilesystems.unpack_romfs,
-    'cramfs_le': bangfilesystems.unpack_cramfs,
-    'cramfs_be': bangfilesystems.unpack_cramfs,
-    'quakepak': banggames.unpack_quake_pak,
-    'doomwad': banggames.unpack_doom_wad,
-    'ambarella': bangunpack.unpack_ambarella,
-    'romfs_ambarella': bangunpack.unpack_romfs_ambarella,
-    'bflt': bangunpack.unpack_bflt,
-    'ubi': bangfilesystems.unpack_ubi,
-    'grub2font': bangunpack.unpack_grub2font,
-    'bittorrent': bangunpack.unpack_bittorrent,
-    'pcapng': bangunpack.unpack_pcapng,
-    'pcap_le': bangunpack.unpack_pcap,
-    'pcap_be': bangunpack.unpack_pcap,
-    'pcap_le_nano': bangunpack.unpack_pcap,
-    'pcap_be_nano': bangunpack.unpack_pcap,
-    'android_binary_xml': bangandroid.unpack_android_resource,
-    'serialized_java': bangunpack.unpack_serialized_java,
-    'mapsforge': bangmedia.unpack_mapsforge,
-    'plf': bangfilesystems.unpack_plf,
-    'pfs': bangfilesystems.unpack_pfs,
-    'yaffs_le_1': bangfilesystems.unpack_yaffs2,
-    'yaffs_le_2': bangfilesystems.unpack_yaffs2,
-    'yaffs_be_1': bangfilesystems.unpack_yaffs2,
-    'yaffs_be_2': bangfilesystems.unpack_yaffs2,
-    'qcdt': bangunpack.unpack_qcdt,
-    #'dhtb': bangandroid.unpack_dhtb,
-    'crx': bangunpack.unpack_crx,
-}
+def _get_signaturetofunction():
+    return {
+        'webp': bangmedia.unpack_webp,
+        'wav': bangmedia.unpack_wav,
+        'ani': bangmedia.unpack_ani,
+        'png': bangmedia.unpack_png,
+        'mng': bangmedia.unpack_mng,
+        'gzip': bangunpack.unpack_gzip,
+        'bmp': bangmedia.unpack_bmp,
+        'xz': bangunpack.unpack_xz,
+        'lzma_var1': bangunpack.unpack_lzma,
+        'lzma_var2': bangunpack.unpack_lzma,
+        'lzma_var3': bangunpack.unpack_lzma,
+        'timezone': bangunpack.unpack_timezone,
+        'tar_posix': bangunpack.unpack_tar,
+        'tar_gnu': bangunpack.unpack_tar,
+        'ar': bangunpack.unpack_ar,
+        'squashfs_var1': bangfilesystems.unpack_squashfs,
+        'squashfs_var2': bangfilesystems.unpack_squashfs,
+        'squashfs_var3': bangfilesystems.unpack_squashfs,
+        'squashfs_var4': bangfilesystems.unpack_squashfs,
+        'squashfs_var5': bangfilesystems.unpack_squashfs,
+        'squashfs_var6': bangfilesystems.unpack_squashfs,
+        'squashfs_var7': bangfilesystems.unpack_squashfs,
+        'appledouble': bangunpack.unpack_appledouble,
+        'icc': bangunpack.unpack_icc,
+        'zip': bangunpack.unpack_zip,
+        'dahua': bangunpack.unpack_dahua,
+        'bzip2': bangunpack.unpack_bzip2,
+        'xar': bangunpack.unpack_xar,
+        'gif87': bangmedia.unpack_gif,
+        'gif89': bangmedia.unpack_gif,
+        'iso9660': bangfilesystems.unpack_iso9660,
+        'lzip': bangunpack.unpack_lzip,
+        'jpeg': bangmedia.unpack_jpeg,
+        'woff': bangunpack.unpack_woff,
+        'opentype': bangunpack.unpack_opentype_font,
+        'ttc': bangunpack.unpack_opentype_font_collection,
+        'truetype': bangunpack.unpack_truetype_font,
+        'android_backup': bangandroid.unpack_android_backup,
+        'ico': bangmedia.unpack_ico,
+        'gnu_message_catalog_le': bangunpack.unpack_gnu_message_catalog,
+        'gnu_message_catalog_be': bangunpack.unpack_gnu_message_catalog,
+        'cab': bangunpack.unpack_cab,
+        'sgi': bangmedia.unpack_sgi,
+        'aiff': bangmedia.unpack_aiff,
+        'terminfo': bangunpack.unpack_terminfo,
+        'rzip': bangunpack.unpack_rzip,
+        'au': bangmedia.unpack_au,
+        'jffs2_little_endian': bangfilesystems.unpack_jffs2,
+        'jffs2_big_endian': bangfilesystems.unpack_jffs2,
+        'cpio_old': bangunpack.unpack_cpio,
+        'cpio_portable': bangunpack.unpack_cpio,
+        'cpio_newascii': bangunpack.unpack_cpio,
+        'cpio_newcrc': bangunpack.unpack_cpio,
+        '7z': bangunpack.unpack_7z,
+        'chm': bangunpack.unpack_chm,
+        'mswim': bangunpack.unpack_wim,
+        'sunraster': bangmedia.unpack_sunraster,
+        'ext2': bangfilesystems.unpack_ext2,
+        'rpm': bangunpack.unpack_rpm,
+        'zstd_08': bangunpack.unpack_zstd,
+        'apple_icon': bangmedia.unpack_apple_icon,
+        'androidsparse': bangandroid.unpack_android_sparse,
+        'lz4': bangunpack.unpack_lz4,
+        'lz4_legacy': bangunpack.unpack_lz4legacy,
+        'vmdk': bangfilesystems.unpack_vmdk,
+        'qcow2': bangfilesystems.unpack_qcow2,
+        'vdi': bangfilesystems.unpack_vdi,
+        'javaclass': bangunpack.unpack_java_class,
+        'dex': bangandroid.unpack_dex,
+        'odex': bangandroid.unpack_odex,
+        'snappy_framed': bangunpack.unpack_snappy,
+        'elf': bangunpack.unpack_elf,
+        'swf': bangmedia.unpack_swf,
+        'swf_zlib': bangmedia.unpack_swf,
+        'swf_lzma': bangmedia.unpack_swf,
+        'ubootlegacy': bangunpack.unpack_uboot_legacy,
+        'certificate': bangunpack.unpack_certificate,
+        'git_index': bangunpack.unpack_git_index,
+        'flv': bangmedia.unpack_flv,
+        'lzop': bangunpack.unpack_lzop,
+        'dlinkromfs': bangfilesystems.unpack_dlink_romfs,
+        'pdf': bangmedia.unpack_pdf,
+        'pack200': bangunpack.unpack_pack200,
+        'gimpbrush': bangmedia.unpack_gimp_brush,
+        'zim': bangunpack.unpack_zim,
+        'midi': bangmedia.unpack_midi,
+        'javakeystore': bangunpack.unpack_java_keystore,
+        'xg3d': bangmedia.unpack_xg3d,
+        'acdb': bangunpack.unpack_acdb,
+        'dds': bangmedia.unpack_dds,
+        'ktx11': bangmedia.unpack_ktx11,
+        'avb': bangandroid.unpack_avb,
+        'sqlite3': bangunpack.unpack_sqlite,
+        'dtb': bangunpack.unpack_device_tree,
+        'trx': bangunpack.unpack_trx,
+        'psd': bangmedia.unpack_psd,
+        'minidump': bangunpack.unpack_minidump,
+        'ppm': bangmedia.unpack_pnm,
+        'pgm': bangmedia.unpack_pnm,
+        'pbm': bangmedia.unpack_pnm,
+        'androidbootmsm': bangandroid.unpack_android_boot_msm,
+        'androidbootimg': bangandroid.unpack_android_boot_img,
+        'androidboothuawei': bangandroid.unpack_android_boot_huawei,
+        'fat': bangfilesystems.unpack_fat,
+        'cbfs': bangfilesystems.unpack_cbfs,
+        'minix_1l': bangfilesystems.unpack_minix1l,
+        'compress': bangunpack.unpack_compress,
+        'romfs': bangfilesystems.unpack_romfs,
+        'cramfs_le': bangfilesystems.unpack_cramfs,
+        'cramfs_be': bangfilesystems.unpack_cramfs,
+        'quakepak': banggames.unpack_quake_pak,
+        'doomwad': banggames.unpack_doom_wad,
+        'ambarella': bangunpack.unpack_ambarella,
+        'romfs_ambarella': bangunpack.unpack_romfs_ambarella,
+        'bflt': bangunpack.unpack_bflt,
+        'ubi': bangfilesystems.unpack_ubi,
+        'grub2font': bangunpack.unpack_grub2font,
+        'bittorrent': bangunpack.unpack_bittorrent,
+        'pcapng': bangunpack.unpack_pcapng,
+        'pcap_le': bangunpack.unpack_pcap,
+        'pcap_be': bangunpack.unpack_pcap,
+        'pcap_le_nano': bangunpack.unpack_pcap,
+        'pcap_be_nano': bangunpack.unpack_pcap,
+        'android_binary_xml': bangandroid.unpack_android_resource,
+        'serialized_java': bangunpack.unpack_serialized_java,
+        'mapsforge': bangmedia.unpack_mapsforge,
+        'plf': bangfilesystems.unpack_plf,
+        'pfs': bangfilesystems.unpack_pfs,
+        'yaffs_le_1': bangfilesystems.unpack_yaffs2,
+        'yaffs_le_2': bangfilesystems.unpack_yaffs2,
+        'yaffs_be_1': bangfilesystems.unpack_yaffs2,
+        'yaffs_be_2': bangfilesystems.unpack_yaffs2,
+        'qcdt': bangunpack.unpack_qcdt,
+        #'dhtb': bangandroid.unpack_dhtb,
+        'crx': bangunpack.unpack_crx,
+    }
 
 # a lookup table to map signatures to a name for
 # pretty printing.
@@ -401,45 +393,46 @@ signatureprettyprint = {
 # reliably recognized any other way.
 # One example is the Android sparse data format.
 # These extensions should be lower case
-extensiontofunction = {
-    '.swp': bangunpack.unpack_vim_swapfile,
-    '.new.dat': bangandroid.unpack_android_sparse_data,
-    '.pak': bangandroid.unpack_chrome_pak,
-    '.ihex': bangtext.unpack_ihex,
-    '.hex': bangtext.unpack_ihex,
-    '.srec': bangtext.unpack_srec,
-    '.xml': bangunpack.unpack_xml,
-    '.xsd': bangunpack.unpack_xml,
-    '.ncx': bangunpack.unpack_xml,
-    '.opf': bangunpack.unpack_xml,
-    '.svg': bangunpack.unpack_xml,
-    '.tar': bangunpack.unpack_tar,
-    'resources.arsc': bangandroid.unpack_android_resource,
-    'manifest.mf': bangtext.unpack_java_manifest,
-    '.sf': bangtext.unpack_java_manifest,
-    'dockerfile': bangtext.unpack_dockerfile,
-    '.dockerfile': bangtext.unpack_dockerfile,
-    'pkg-info': bangtext.unpack_python_pkginfo,
-    'known_hosts': bangtext.unpack_ssh_known_hosts,
-    'ssh_known_hosts': bangtext.unpack_ssh_known_hosts,
-    '.rsa': bangunpack.unpack_certificate,
-    '.pem': bangunpack.unpack_certificate,
-    '.lsm': bangtext.unpack_lsm,
-    '.json': bangunpack.unpack_json,
-    'passwd': bangtext.unpack_passwd,
-    'shadow': bangtext.unpack_shadow,
-    'group': bangtext.unpack_group,
-    '.css': bangtext.unpack_css,
-    'tzdata': bangandroid.unpack_android_tzdata,
-    'fstab': bangtext.unpack_fstab,
-    '.pc': bangtext.unpack_pkg_config,
-    '.ics': bangtext.unpack_ics,
-    'trans.tbl': bangtext.unpack_trans_tbl,
-    '.nb0': bangandroid.unpack_nb0,
-    'smbpasswd': bangtext.unpack_smbpasswd,
-    '.ini': bangtext.unpack_ini,
-    'wcprops': bangtext.unpack_subversion_hash,
-}
+def _get_extensiontofunction():
+    return {
+        '.swp': bangunpack.unpack_vim_swapfile,
+        '.new.dat': bangandroid.unpack_android_sparse_data,
+        '.pak': bangandroid.unpack_chrome_pak,
+        '.ihex': bangtext.unpack_ihex,
+        '.hex': bangtext.unpack_ihex,
+        '.srec': bangtext.unpack_srec,
+        '.xml': bangunpack.unpack_xml,
+        '.xsd': bangunpack.unpack_xml,
+        '.ncx': bangunpack.unpack_xml,
+        '.opf': bangunpack.unpack_xml,
+        '.svg': bangunpack.unpack_xml,
+        '.tar': bangunpack.unpack_tar,
+        'resources.arsc': bangandroid.unpack_android_resource,
+        'manifest.mf': bangtext.unpack_java_manifest,
+        '.sf': bangtext.unpack_java_manifest,
+        'dockerfile': bangtext.unpack_dockerfile,
+        '.dockerfile': bangtext.unpack_dockerfile,
+        'pkg-info': bangtext.unpack_python_pkginfo,
+        'known_hosts': bangtext.unpack_ssh_known_hosts,
+        'ssh_known_hosts': bangtext.unpack_ssh_known_hosts,
+        '.rsa': bangunpack.unpack_certificate,
+        '.pem': bangunpack.unpack_certificate,
+        '.lsm': bangtext.unpack_lsm,
+        '.json': bangunpack.unpack_json,
+        'passwd': bangtext.unpack_passwd,
+        'shadow': bangtext.unpack_shadow,
+        'group': bangtext.unpack_group,
+        '.css': bangtext.unpack_css,
+        'tzdata': bangandroid.unpack_android_tzdata,
+        'fstab': bangtext.unpack_fstab,
+        '.pc': bangtext.unpack_pkg_config,
+        '.ics': bangtext.unpack_ics,
+        'trans.tbl': bangtext.unpack_trans_tbl,
+        '.nb0': bangandroid.unpack_nb0,
+        'smbpasswd': bangtext.unpack_smbpasswd,
+        '.ini': bangtext.unpack_ini,
+        'wcprops': bangtext.unpack_subversion_hash,
+    }
 
 import os
 import pkgutil
@@ -448,8 +441,9 @@ import inspect
 import parsers
 import pathlib
 from UnpackParser import UnpackParser, WrappedUnpackParser
+from UnpackParserManifest import load_unpackparsers
 
-def _get_unpackers_recursive(unpackers_root, parent_module_path):
+def _get_unpackers_recursive(unpackers_root, parent_module_path, failed=None):
     unpackers = []
     abs_module_path = unpackers_root / parent_module_path
     for m in pkgutil.iter_modules([abs_module_path]):
@@ -463,22 +457,31 @@ def _get_unpackers_recursive(unpackers_root, parent_module_path):
                     if inspect.isclass(member) and issubclass(member, UnpackParser) \
                         and member != UnpackParser \
                         and member != WrappedUnpackParser:
-                        unpackers.append(member)
+                        unpackers.append((module_name, member))
             except ModuleNotFoundError as e:
-                pass
+                if failed is not None and e.name != module_name:
+                    failed.append(module_name)
             unpackers.extend(_get_unpackers_recursive(
-                unpackers_root, full_module_path ))
+                unpackers_root, full_module_path, failed))
     return unpackers
 
+parsers_directory = pathlib.Path(os.path.dirname(parsers.__file__))
+
+def _find_unpackers(failed):
+    return _get_unpackers_recursive(parsers_directory, pathlib.Path('.'), failed)
 
 def get_unpackers():
-    unpackers = _get_unpackers_recursive(
-            pathlib.Path(os.path.dirname(parsers.__file__)), pathlib.Path('.'))
-    return unpackers
+    '''Import all UnpackParsers and return their classes.'''
+    return [u for module_name, u in _find_unpackers(None)]
+
+# All UnpackParsers, from the manifest in the parsers directory. The
+# code of an UnpackParser is only imported when it is used.
+unpackparsers = load_unpackparsers(parsers_directory / 'manifest.json',
+        parsers_directory, _find_unpackers)
 
 def get_unpackers_for_extensions():
     d = {}
-    for u in get_unpackers():
+    for u in unpackparsers:
         for e in u.extensions:
             d.setdefault(e,[])
             d[e].append(u)
@@ -488,7 +491,7 @@ extension_to_unpackparser = get_unpackers_for_extensions()
 
 def get_unpackers_for_signatures():
     d = {}
-    for u in get_unpackers():
+    for u in unpackparsers:
         for s in u.signatures:
             d.setdefault(s,[])
             d[s].append(u)
@@ -496,8 +499,33 @@ def get_unpackers_for_signatures():
 
 signature_to_unpackparser = get_unpackers_for_signatures()
 
+# signatures shorter than this many bytes are found by chance very
+# often in random data, such as encrypted or compressed data, unless
+# the UnpackParser says otherwise.
+weak_signature_length = 4
+
+def get_weak_signatures():
+    '''Return a dictionary with for every weak signature the
+    UnpackParsers for which the signature is weak.'''
+    d = {}
+    for s, unpackparsers in signature_to_unpackparser.items():
+        for u in unpackparsers:
+            if u.weak_signatures is None:
+                weak = len(s[1]) < weak_signature_length
+            else:
+                weak = s in u.weak_signatures
+            if weak:
+                d.setdefault(s, set()).add(u)
+    return d
+
+weak_signatures = get_weak_signatures()
+
+# matcher to find all signatures in a buffer in a single pass
+from SignatureMatcher import SignatureMatcher
+signature_matcher = SignatureMatcher(signature_to_unpackparser)
+
 def get_unpackers_for_featureless_files():
-    return [u for u in get_unpackers() if u.scan_if_featureless ]
+    return [u for u in unpackparsers if u.scan_if_featureless ]
 
 unpackers_for_featureless_files = get_unpackers_for_featureless_files()
 
@@ -546,16 +574,60 @@ extensionprettyprint = {
 def matches_file_pattern(filename, extension):
     return filename.name.lower().endswith(extension)
 
+# the lengths of all extensions, so the extensions that a file name ends
+# with can be looked up with the suffixes of the file name of these
+# lengths, instead of checking every extension.
+extension_lengths = sorted(set([len(e) for e in extension_to_unpackparser]))
+extension_order = dict([(e, i) for i, e in enumerate(extension_to_unpackparser)])
+
+def get_unpackers_for_file_name(filename):
+    '''Return tuples (extension, UnpackParser) for all extensions that
+    the name of filename ends with, in the same order as in
+    extension_to_unpackparser.'''
+    name = filename.name.lower()
+    extensions = []
+    for length in extension_lengths:
+        if length > len(name):
+            break
+        if name[-length:] in extension_to_unpackparser:
+            extensions.append(name[-length:])
+    extensions.sort(key=extension_order.get)
+    return [(e, u) for e in extensions for u in extension_to_unpackparser[e]]
+
 # certain unpacking functions if the whole file is text
-textonlyfunctions = {
-    'ihex': bangtext.unpack_ihex,
-    'srec': bangtext.unpack_srec,
-    'kernelconfig': bangtext.unpack_kernel_config,
-    #'dockerfile': bangtext.unpack_dockerfile,
-    'base64': bangtext.unpack_base64,
-    'script': bangtext.unpack_script,
+def _get_textonlyfunctions():
+    return {
+        'ihex': bangtext.unpack_ihex,
+        'srec': bangtext.unpack_srec,
+        'kernelconfig': bangtext.unpack_kernel_config,
+        #'dockerfile': bangtext.unpack_dockerfile,
+        'base64': bangtext.unpack_base64,
+        'script': bangtext.unpack_script,
+    }
+
+# The tables with the unpack functions are only built when they are
+# used, as the modules with the unpack functions take a long time to
+# import, and the UnpackParsers import them when they are needed.
+_unpack_function_tables = {
+    'signaturetofunction': _get_signaturetofunction,
+    'extensiontofunction': _get_extensiontofunction,
+    'textonlyfunctions': _get_textonlyfunctions,
 }
 
+def __getattr__(name):
+    if name not in _unpack_function_tables:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    global bangandroid, bangfilesystems, banggames, bangmedia, bangtext, bangunpack
+    import bangandroid
+    import bangfilesystems
+    import banggames
+    import bangmedia
+    import bangtext
+    import bangunpack
+    table = _unpack_function_tables[name]()
+    globals()[name] = table
+    return table
+
 # The result of the scan is a dictionary with the
 # following data, depending on the status of the scan
 # * the status of the scan (successful or not)
@@ -575,236 +647,6 @@ textonlyfunctions = {
 def unpack_file_with_extension(fileresult, scanenvironment, unpackparser, unpack_directory):
     return unpackparser().parse_and_unpack(fileresult, scanenvironment, 0, unpack_directory)
 
-# Prescan functions:
-#
-# first perform a few sanity checks to prevent
-# false positives for the built in unpack
-# functions in BANG, as function calls are
-# expensive so prevent them as much as possible.
-# For big files this can easily save hundreds of
-# thousands of function calls.
-#
-# Included here are checks for:
-#
-# * LZMA
-# * bzip2
-# * gzip
-# * BMP
-# * SGI images
-# * ICO
-# * PNG
-# * MNG
-# * TrueType and OpenType fonts
-# * terminfo
-
-def prescan_true(scanbytes, bytesread, filesize, offset, offsetinfile):
-    return True
-
-def prescan_lzma(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # header of LZMA files is 13 bytes
-    if filesize - (offset + offsetinfile) < 13:
-        return False
-    # Only do this if there are enough bytes
-    # left to test on, otherwise let the sliding
-    # window do its work
-    if bytesread - offset >= 13:
-        # bytes 5 - 13 are the size field. It
-        # could be that it is undefined, but if
-        # it is defined then check if it is too
-        # large or too small.
-        if scanbytes[offset+5:offset+13] != b'\xff\xff\xff\xff\xff\xff\xff\xff':
-            lzmaunpackedsize = int.from_bytes(scanbytes[offset+5:offset+13], byteorder='little')
-            if lzmaunpackedsize == 0:
-                return False
-            # XZ Utils cannot unpack or create
-            # files with size of 256 GiB or more
-            if lzmaunpackedsize > 274877906944:
-                return False
-    return True
-
-def prescan_bzip2(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # first some sanity checks consisting of
-    # header checks:
-    #
-    # * block size
-    # * magic
-    #
-    # Only do this if there are enough bytes
-    # left to test on, otherwise
-    # let the sliding window do its work
-    if bytesread - offset >= 10:
-        # the byte indicating the block size
-        # has to be in the range 1 - 9
-        try:
-            blocksize = int(scanbytes[offset+3])
-        except:
-            return False
-        # block size byte cannot be 0
-        if blocksize == 0:
-            return False
-        # then check if the file is a stream or
-        # not. If so, some more checks can be
-        # made (bzip2 source code decompress.c,
-        # line 224).
-        if scanbytes[offset+4] != b'\x17':
-            if scanbytes[offset+4:offset+10] != b'\x31\x41\x59\x26\x53\x59':
-                return False
-    return True
-
-def prescan_gzip(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # first some sanity checks consisting of
-    # header checks.
-    #
-    # RFC 1952 http://www.zlib.org/rfc-gzip.html
-    # describes the flags, but omits the
-    # "encrytion" flag (bit 5)
-    #
-    # Python 3's zlib module does not support:
-    # * continuation of multi-part gzip (bit 2)
-    # * encrypt (bit 5)
-    #
-    # RFC 1952 says that bit 6 and 7 should not
-    # be set.
-    if bytesread - offset >= 4:
-        gzipbyte = scanbytes[offset+3]
-        if (gzipbyte >> 2 & 1) == 1:
-            # continuation of multi-part gzip
-            return False
-        if (gzipbyte >> 5 & 1) == 1:
-            # encrypted
-            return False
-        if (gzipbyte >> 6 & 1) == 1:
-            # reserved
-            return False
-        if (gzipbyte >> 7 & 1) == 1:
-            # reserved
-            return False
-    return True
-
-def prescan_bmp(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # header of BMP files is 26 bytes
-    if filesize - (offset + offsetinfile) < 26:
-        return False
-    if bytesread - offset >= 6:
-        bmpsize = int.from_bytes(scanbytes[offset+2:offset+6], byteorder='little')
-        if offsetinfile + offset + bmpsize > filesize:
-            return False
-    return True
-
-def prescan_sgi(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # header of SGI files is 512 bytes
-    if filesize - (offset + offsetinfile) < 512:
-        return False
-    if bytesread - offset > 512:
-        # storage format
-        if not (scanbytes[offset+2] == 0 or scanbytes[offset+2] == 1):
-            return False
-        # BPC
-        if not (scanbytes[offset+3] == 1 or scanbytes[offset+3] == 2):
-            return False
-        # dummy values, last 404 bytes of
-        # the header are 0x00
-        if not scanbytes[offset+108:offset+512] == b'\x00' * 404:
-            return False
-    return True
-
-def prescan_ico(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # check the number of images
-    if filesize - (offset + offsetinfile) < 22:
-        return False
-    numberofimages = int.from_bytes(scanbytes[offset+4:offset+6], byteorder='little')
-    if numberofimages == 0:
-        return False
-
-    # images cannot be outside of the file
-    if offsetinfile + offset + 6 + numberofimages * 16 > filesize:
-        return False
-
-    # Then check the first image, as this
-    # is where most false positives happen.
-    imagesize = int.from_bytes(scanbytes[offset+14:offset+18], byteorder='little')
-    if imagesize == 0:
-        return False
-
-    # ICO cannot be outside of the file
-    imageoffset = int.from_bytes(scanbytes[offset+18:offset+22], byteorder='little')
-
-    if offsetinfile + offset + imageoffset + imagesize > filesize:
-        return False
-
-    return True
-
-def prescan_png(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # minimum size of PNG files is 57 bytes
-    if filesize - (offsetinfile + offset) < 57:
-        return False
-    if bytesread - offset >= 13:
-        # bytes 8 - 11 are always the same in
-        # every PNG
-        if scanbytes[offset+8:offset+12] != b'\x00\x00\x00\x0d':
-            return False
-    return True
-
-def prescan_mng(scanbytes, bytesread, filesize, offset, offsetinfile):
-    # minimum size of MNG files is 52 bytes
-    if filesize - (offsetinfile + offset) < 52:
-        return False
-    if bytesread - offset >= 13:
-        # bytes 8 - 11 are always the same in
-        # every MNG
-        if scanbytes[offset+8:offset+12] != b'\x00\x00\x00\x1c':
-            return False
-    return True
-
-def prescan_truetype(scanbytes, bytesread, filesize, offset, offsetinfile):
-    if filesize - (offsetinfile + offset) < 12:
-        return False
-    # two simple sanity checks: number of
-    # tables and search range
-    numtables = int.from_bytes(scanbytes[offset+4:offset+6], byteorder='big')
-
-    if numtables == 0:
-        return False
-
-    # then the search range
-    searchrange = int.from_bytes(scanbytes[offset+6:offset+8], byteorder='big')
-    if pow(2, int(math.log2(numtables)))*16 != searchrange:
-        return False
-    return True
-
-def prescan_terminfo(scanbytes, bytesread, filesize, offset, offsetinfile):
-    if filesize - (offsetinfile + offset) < 12:
-        return False
-
-    # simple sanity check: names section
-    # size cannot be < 2 or > 128
-    namessectionsize = int.from_bytes(scanbytes[offset+2:offset+4], byteorder='little')
-
-    if namessectionsize < 2 or namessectionsize > 128:
-        return False
-
-    return True
-
-prescan_functions = {
-    'lzma_var1': prescan_lzma,
-    'lzma_var2': prescan_lzma,
-    'lzma_var3': prescan_lzma,
-    'bzip2': prescan_bzip2,
-    'gzip': prescan_gzip,
-    'bmp' : prescan_bmp,
-    'sgi' : prescan_sgi,
-    'ico' : prescan_ico,
-    'png' : prescan_png,
-    'mng' : prescan_mng,
-    'truetype' : prescan_truetype,
-    'opentype' : prescan_truetype,
-    'terminfo' : prescan_terminfo,
-}
-
-def prescan(s, scanbytes, bytesread, filesize, offset, offsetinfile):
-    f = prescan_functions.get(s, prescan_true)
-    return f(scanbytes, bytesread, filesize, offset, offsetinfile)
-
 # license references extracted from a Fedora 28 system:
 # $ cd /usr/share/doc
 # $ grep -r license | grep http
@@ -0,0 +1,109 @@
+# Binary Analysis Next Generation (BANG!)
+#
+# This file is part of BANG.
+#
+# BANG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# BANG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License, version 3, along with BANG.  If not, see
+# <http://www.gnu.org/licenses/>
+#
+# Licensed under the terms of the GNU Affero General Public License
+# version 3
+# SPDX-License-Identifier: AGPL-3.0-only
+
+# Helper functions to measure how much time is spent in each phase of
+# scanning a file. The time of each phase is recorded in the result of
+# the file, and the timings of all files of a scan are summarized in the
+# session section of bang.pickle, as are the statistics of the
+# UnpackParsers that were tried for each file.
+
+import math
+import time
+import heapq
+import contextlib
+
+# the percentiles that are computed for each phase
+percentiles = [50, 90, 99]
+
+
+@contextlib.contextmanager
+def phase_timer(fileresult, phase):
+    '''Add the (monotonic) time spent in the body of the with statement
+    to the time of phase in fileresult.'''
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        fileresult.add_timing(phase, time.monotonic() - start)
+
+
+def _percentile(sortedtimes, percentile):
+    # nearest rank method
+    rank = max(math.ceil(percentile / 100 * len(sortedtimes)), 1)
+    return sortedtimes[rank - 1]
+
+
+def summarize_timings(scantree, slowest=10):
+    '''Summarize the timings of the files in scantree: per phase the total
+    time, the number of files, the percentiles and the maximum time, and
+    the slowest files (by total time) with their timings. Results are
+    read from scantree one at a time.'''
+    phasetimes = {}
+    slowestfiles = []
+    for filename, node in scantree.items():
+        if 'timings' not in node:
+            continue
+        for phase, seconds in node['timings'].items():
+            phasetimes.setdefault(phase, []).append(seconds)
+        total = sum(node['timings'].values())
+        # keep the slowest files in a heap, with the fastest first
+        heapitem = (total, filename, node['timings'])
+        if len(slowestfiles) < slowest:
+            heapq.heappush(slowestfiles, heapitem)
+        elif slowest > 0:
+            heapq.heappushpop(slowestfiles, heapitem)
+
+    phases = {}
+    for phase, times in phasetimes.items():
+        times.sort()
+        phases[phase] = {
+            'total': sum(times),
+            'count': len(times),
+            'max': times[-1],
+        }
+        for percentile in percentiles:
+            phases[phase]['p%d' % percentile] = _percentile(times, percentile)
+
+    return {
+        'phases': phases,
+        'slowest': [{'filename': filename, 'total': total, 'timings': timings}
+                    for total, filename, timings in sorted(slowestfiles, reverse=True)],
+    }
+
+
+def summarize_parser_statistics(scantree):
+    '''Add up the statistics of the UnpackParsers of the files in
+    scantree: per UnpackParser the number of attempts, successes and
+    failures, the total and maximum time of an attempt, and the amount
+    of bytes that was unpacked.'''
+    parserstats = {}
+    for node in scantree.values():
+        if 'parserstats' not in node:
+            continue
+        for parsername, stats in node['parserstats'].items():
+            if parsername not in parserstats:
+                parserstats[parsername] = dict(stats)
+                continue
+            total = parserstats[parsername]
+            for counter in ['attempts', 'successes', 'failures', 'time', 'bytes']:
+                total[counter] += stats[counter]
+            total['maxtime'] = max(total['maxtime'], stats['maxtime'])
+    return parserstats
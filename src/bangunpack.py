@@ -25,7 +25,7 @@
 # Built in carvers/verifiers/unpackers for various formats.
 #
 # For these unpackers it has been attempted to reduce disk I/O as much
-# as possible using the os.sendfile() method, as well as techniques
+# as possible using the bangio.copy_range() method, as well as techniques
 # described in this blog post:
 #
 # https://eli.thegreenplace.net/2011/11/28/less-copies-in-python-with-the-buffer-protocol-and-memoryviews
@@ -54,10 +54,26 @@ import sqlite3
 # some external packages that are needed
 import defusedxml.minidom
 import lz4
+import lz4.block
 import lz4.frame
 import snappy
 
+# zstandard and python-lzo are optional: without them zstd and lzop
+# compressed data is unpacked with the zstd and lzop programs, which
+# is slower for small files.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lzo
+except ImportError:
+    lzo = None
+
 from FileResult import *
+from LZWDecompressor import LZWDecompressor, LZWError
+import bangio
+import VirtualFile
 
 encodingstotranslate = ['utf-8', 'ascii', 'latin-1', 'euc_jp', 'euc_jis_2004',
                         'jisx0213', 'iso2022_jp', 'iso2022_jp_1',
@@ -864,7 +880,7 @@ def unpack_timezone(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory and write the file
         os.makedirs(outfile_full.parent, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['timezone', 'resource', 'unpacked']))
         checkfile.close()
@@ -1119,7 +1135,7 @@ def unpack_timezone(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory and write the file
     os.makedirs(outfile_full.parent, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['timezone', 'resource', 'unpacked']))
     checkfile.close()
@@ -1527,7 +1543,7 @@ def unpack_appledouble(fileresult, scanenvironment, offset, unpackdir):
     outfile_rel = os.path.join(unpackdir, "unpacked-from-appledouble")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['appledouble', 'resource', 'unpacked']))
@@ -1728,7 +1744,7 @@ def unpack_icc(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, maxtagoffset - offset)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, maxtagoffset - offset)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['icc', 'resource', 'unpacked']))
@@ -2591,10 +2607,9 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
         if checkfile.tell() == filesize:
             carved = False
         else:
-            # else carve the file from the larger ZIP first
-            temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-            os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-            os.fdopen(temporaryfile[0]).close()
+            # else only give the ZIP data to the ZIP module, without
+            # carving it from the larger file first
+            carvedfile = VirtualFile.open_range(filename_full, offset, unpackedsize)
             carved = True
         if not carved:
             # seek to the right offset, even though that's
@@ -2605,7 +2620,7 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
             if not carved:
                 unpackzipfile = zipfile.ZipFile(checkfile)
             else:
-                unpackzipfile = zipfile.ZipFile(temporaryfile[1])
+                unpackzipfile = zipfile.ZipFile(carvedfile)
             zipfiles = unpackzipfile.namelist()
             zipinfolist = unpackzipfile.infolist()
             oldcwd = os.getcwd()
@@ -2655,7 +2670,7 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
                     except NotImplementedError:
                         checkfile.close()
                         if carved:
-                            os.unlink(temporaryfile[1])
+                            carvedfile.close()
                         unpackingerror = {'offset': offset, 'fatal': False,
                                           'reason': 'Unknown compression method'}
                         return {'status': False, 'error': unpackingerror}
@@ -2696,14 +2711,14 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
                     labels.append('apk')
                     labels.append('android')
             if carved:
-                os.unlink(temporaryfile[1])
+                carvedfile.close()
             checkfile.close()
             return {'status': True, 'length': unpackedsize, 'labels': labels,
                     'filesandlabels': unpackedfilesandlabels}
         except zipfile.BadZipFile:
             checkfile.close()
             if carved:
-                os.unlink(temporaryfile[1])
+                carvedfile.close()
             unpackingerror = {'offset': offset, 'fatal': False,
                               'reason': 'Not a valid ZIP file'}
             return {'status': False, 'error': unpackingerror}
@@ -2724,7 +2739,7 @@ def unpack_zip(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     targetfile = open(targetfile_full, 'wb')
-    os.sendfile(targetfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(targetfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     targetfile.close()
     checkfile.close()
 
@@ -3757,7 +3772,7 @@ def unpack_woff(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['woff', 'font', 'resource', 'unpacked']))
@@ -3774,6 +3789,23 @@ unpack_woff.signatures = {'woff': b'wOFF'}
 #
 # These fonts have a similar structure, but differ in the magic
 # header and the required tables.
+def probe_font_header(buffer, offset, filesize):
+    '''Quick check of the header of a TrueType or OpenType font at offset
+    in buffer, see UnpackParser.probe()'''
+    if filesize - offset < 12:
+        return False
+    if len(buffer) - offset < 8:
+        return True
+    # two simple sanity checks: number of tables and search range
+    numtables = int.from_bytes(buffer[offset+4:offset+6], byteorder='big')
+    if numtables == 0:
+        return False
+    searchrange = int.from_bytes(buffer[offset+6:offset+8], byteorder='big')
+    if pow(2, int(math.log2(numtables)))*16 != searchrange:
+        return False
+    return True
+
+
 def unpack_font(fileresult, scanenvironment, offset, unpackdir,
                 fontextension, collectionoffset=None):
     '''Helper method to unpack various fonts'''
@@ -4127,7 +4159,7 @@ def unpack_font(fileresult, scanenvironment, offset, unpackdir,
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['font', 'resource', 'unpacked']))
     checkfile.close()
@@ -4571,7 +4603,7 @@ def unpack_gnu_message_catalog(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['resource', 'GNU message catalog', 'unpacked']))
     checkfile.close()
@@ -4627,28 +4659,16 @@ def unpack_cab(fileresult, scanenvironment, offset, unpackdir):
                           'reason': 'cabextract program not found'}
         return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == cabinetsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, cabinetsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-
     checkfile.close()
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
-    if havetmpfile:
-        p = subprocess.Popen(['cabextract', '-d', unpackdir_full, temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    else:
-        p = subprocess.Popen(['cabextract', '-d', unpackdir_full, filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    with bangio.range_file(filename_full, offset, cabinetsize,
+            scanenvironment.temporarydirectory) as (cabfile, cabargs):
+        p = subprocess.Popen(['cabextract', '-d', unpackdir_full, cabfile], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (outputmsg, errormsg) = p.communicate()
     if p.returncode != 0:
-        if havetmpfile:
-            os.unlink(temporaryfile[1])
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid cab file'}
         return {'status': False, 'error': unpackingerror}
-    checkfile.close()
 
     unpackedsize = cabinetsize
 
@@ -4666,14 +4686,10 @@ def unpack_cab(fileresult, scanenvironment, offset, unpackdir):
             unpackedfilesandlabels.append((relfilename, []))
 
     # whole file is cabinet
-    if not havetmpfile:
+    if offset == 0 and filesize == cabinetsize:
         labels.append('cab')
         labels.append('archive')
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-
     return {'status': True, 'length': unpackedsize, 'labels': labels,
             'filesandlabels': unpackedfilesandlabels}
 
@@ -4959,7 +4975,7 @@ def unpack_terminfo(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['terminfo', 'resource', 'unpacked']))
@@ -5094,7 +5110,7 @@ def unpack_rzip(fileresult, scanenvironment, offset, unpackdir):
                 'filesandlabels': unpackedfilesandlabels}
 
     temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-    os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
     os.fdopen(temporaryfile[0]).close()
     checkfile.close()
     p = subprocess.Popen(['rzip', '-d', temporaryfile[1], '-o', outfile_full], stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
@@ -5474,7 +5490,7 @@ def unpack_cpio(fileresult, scanenvironment, offset, unpackdir):
                 outfile_rel = os.path.join(unpackdir, unpackname)
                 outfile_full = scanenvironment.unpack_path(outfile_rel)
                 outfile = open(outfile_full, 'wb')
-                os.sendfile(outfile.fileno(), checkfile.fileno(), offset+unpackedsize, cpiodatasize)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+unpackedsize, cpiodatasize)
                 outfile.close()
                 if (inode, dev) not in devinodes:
                     devinodes[(inode, dev)] = []
@@ -5755,7 +5771,7 @@ def unpack_cpio(fileresult, scanenvironment, offset, unpackdir):
                 outfile_rel = os.path.join(unpackdir, unpackname)
                 outfile_full = scanenvironment.unpack_path(outfile_rel)
                 outfile = open(outfile_full, 'wb')
-                os.sendfile(outfile.fileno(), checkfile.fileno(), offset+unpackedsize, cpiodatasize)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+unpackedsize, cpiodatasize)
                 outfile.close()
                 if (inode, dev) not in devinodes:
                     devinodes[(inode, dev)] = []
@@ -6084,7 +6100,7 @@ def unpack_cpio(fileresult, scanenvironment, offset, unpackdir):
                 outfile_rel = os.path.join(unpackdir, unpackname)
                 outfile_full = scanenvironment.unpack_path(outfile_rel)
                 outfile = open(outfile_full, 'wb')
-                os.sendfile(outfile.fileno(), checkfile.fileno(), offset+unpackedsize, cpiodatasize)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+unpackedsize, cpiodatasize)
                 outfile.close()
                 if (inode, devmajor, devminor) not in devinodes:
                     devinodes[(inode, devmajor, devminor)] = []
@@ -6291,20 +6307,10 @@ def unpack_7z(fileresult, scanenvironment, offset, unpackdir):
                           'reason': '7z program not found'}
         return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == unpackedsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    if offset == 0 and filesize == unpackedsize:
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    checkfile.close()
+    with bangio.range_file(filename_full, offset, unpackedsize, scanenvironment.temporarydirectory) as (archivefile, archiveargs):
+        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', archivefile], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (outputmsg, errormsg) = p.communicate()
     if p.returncode != 0:
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid 7z file'}
@@ -6322,10 +6328,7 @@ def unpack_7z(fileresult, scanenvironment, offset, unpackdir):
             relfilename = scanenvironment.rel_unpack_path(fullfilename)
             unpackedfilesandlabels.append((relfilename, []))
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-    else:
+    if offset == 0 and filesize == unpackedsize:
         labels.append('7z')
         labels.append('compressed')
         labels.append('archive')
@@ -6451,24 +6454,11 @@ def unpack_chm(fileresult, scanenvironment, offset, unpackdir):
 
     unpackedsize = chmsize
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == unpackedsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    if offset == 0 and filesize == unpackedsize:
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    checkfile.close()
+    with bangio.range_file(filename_full, offset, unpackedsize, scanenvironment.temporarydirectory) as (archivefile, archiveargs):
+        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', archivefile], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (outputmsg, errormsg) = p.communicate()
     if p.returncode != 0:
-        # cleanup
-        if havetmpfile:
-            os.unlink(temporaryfile[1])
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid CHM file'}
         return {'status': False, 'error': unpackingerror}
@@ -6485,10 +6475,7 @@ def unpack_chm(fileresult, scanenvironment, offset, unpackdir):
             relfilename = scanenvironment.rel_unpack_path(fullfilename)
             unpackedfilesandlabels.append((relfilename, []))
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-    else:
+    if offset == 0 and filesize == unpackedsize:
         labels.append('chm')
         labels.append('compressed')
         labels.append('resource')
@@ -6730,20 +6717,10 @@ def unpack_wim(fileresult, scanenvironment, offset, unpackdir):
                           'reason': '7z program not found'}
         return {'status': False, 'error': unpackingerror}
 
-    havetmpfile = False
-    if not (offset == 0 and filesize == unpackedsize):
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', temporaryfile[1]], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    if offset == 0 and filesize == unpackedsize:
-        checkfile.close()
-        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', filename_full], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    (outputmsg, errormsg) = p.communicate()
+    checkfile.close()
+    with bangio.range_file(filename_full, offset, unpackedsize, scanenvironment.temporarydirectory) as (archivefile, archiveargs):
+        p = subprocess.Popen(['7z', '-o%s' % unpackdir_full, '-y', 'x', archivefile], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (outputmsg, errormsg) = p.communicate()
     if p.returncode != 0:
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid WIM file'}
@@ -6761,15 +6738,11 @@ def unpack_wim(fileresult, scanenvironment, offset, unpackdir):
             relfilename = scanenvironment.rel_unpack_path(fullfilename)
             unpackedfilesandlabels.append((relfilename, []))
 
-    if not havetmpfile:
+    if offset == 0 and filesize == unpackedsize:
         labels.append('mswim')
         labels.append('compressed')
         labels.append('archive')
 
-    # cleanup
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-
     return {'status': True, 'length': unpackedsize, 'labels': labels,
             'filesandlabels': unpackedfilesandlabels}
 
@@ -7318,7 +7291,7 @@ def unpack_zstd(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
-    if shutil.which('zstd') is None:
+    if zstandard is None and shutil.which('zstd') is None:
         unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
                           'reason': 'zstd program not found'}
         return {'status': False, 'error': unpackingerror}
@@ -7449,7 +7422,43 @@ def unpack_zstd(fileresult, scanenvironment, offset, unpackdir):
 
     # zstd does not record the name of the file that was
     # compressed, so guess, or just set a name.
-    if offset == 0 and unpackedsize == filesize:
+    if zstandard is not None:
+        if offset == 0 and unpackedsize == filesize and filename_full.suffix.lower() == '.zst':
+            outfile_rel = os.path.join(unpackdir, filename_full.stem)
+        else:
+            outfile_rel = os.path.join(unpackdir, "unpacked-by-zstd")
+        outfile_full = scanenvironment.unpack_path(outfile_rel)
+        outfile = open(outfile_full, 'wb')
+
+        # decompress the frame in the process
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        checkfile.seek(offset)
+        bytesleft = unpackedsize
+        readsize = 1000000
+        try:
+            while bytesleft > 0:
+                checkbytes = checkfile.read(min(bytesleft, readsize))
+                bytesleft -= len(checkbytes)
+                outfile.write(decompressor.decompress(checkbytes))
+        except zstandard.ZstdError:
+            pass
+        checkfile.close()
+        outfile.close()
+        if not decompressor.eof:
+            os.unlink(outfile_full)
+            unpackingerror = {'offset': offset, 'fatal': False,
+                              'reason': 'invalid zstd'}
+            return {'status': False, 'error': unpackingerror}
+        if fcs_field_size != 0:
+            if uncompressed_size != os.stat(outfile_full).st_size:
+                os.unlink(outfile_full)
+                unpackingerror = {'offset': offset, 'fatal': False,
+                                  'reason': 'invalid checksum'}
+                return {'status': False, 'error': unpackingerror}
+        if offset == 0 and unpackedsize == filesize:
+            labels.append('zstd')
+            labels.append('compressed')
+    elif offset == 0 and unpackedsize == filesize:
         checkfile.close()
         if filename_full.suffix.lower() == '.zst':
             outfile_rel = os.path.join(unpackdir, filename_full.stem)
@@ -7473,7 +7482,7 @@ def unpack_zstd(fileresult, scanenvironment, offset, unpackdir):
         tmpfilename = os.path.join(unpackdir, "unpacked-by-zstd.zst")
         tmpfile_full = scanenvironment.unpack_path(tmpfilename)
         tmpfile = open(tmpfile_full, 'wb')
-        os.sendfile(tmpfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(tmpfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         tmpfile.close()
         checkfile.close()
         outfile_rel = tmpfilename[:-4]
@@ -7577,8 +7586,8 @@ def unpack_lz4(fileresult, scanenvironment, offset, unpackdir):
 unpack_lz4.signatures = {'lz4': b'\x04\x22\x4d\x18'}
 
 
-# LZ4 legacy format, uses external tools as it is not
-# supported in python-lz4:
+# LZ4 legacy format. This is not supported by the frame functions of
+# python-lz4, but the blocks can be decompressed with its block functions:
 # https://github.com/python-lz4/python-lz4/issues/169
 # https://github.com/lz4/lz4/blob/master/doc/lz4_Frame_format.md#legacy-frame
 def unpack_lz4legacy(fileresult, scanenvironment, offset, unpackdir):
@@ -7591,95 +7600,65 @@ def unpack_lz4legacy(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
+    # every block decompresses to 8 MiB, except possibly the last one,
+    # so a block can never be larger than LZ4_compressBound(8 MiB).
+    maxblocksize = 8388608
+    maxcompressedsize = maxblocksize + maxblocksize // 255 + 16
+
+    # create the unpacking directory
+    os.makedirs(unpackdir_full, exist_ok=True)
+
+    if filename_full.suffix.lower() == '.lz4':
+        outfile_rel = os.path.join(unpackdir, filename_full.stem)
+    else:
+        outfile_rel = os.path.join(unpackdir, "unpacked-from-lz4-legacy")
+    outfile_full = scanenvironment.unpack_path(outfile_rel)
+    outfile = open(outfile_full, 'wb')
+
     # open the file, seek to the offset
     checkfile = open(filename_full, 'rb')
     checkfile.seek(offset+4)
     unpackedsize = 4
 
-    # now process to see how much data should be
-    # processed using the LZ4 utilities
+    # then decompress the blocks. Like the lz4 tool the data ends at
+    # a block size that is too large (such as the magic of a next
+    # frame), or at the end of the file. The data also ends at a block
+    # that cannot be decompressed.
     blockunpacked = False
     while True:
         # block compressed size
         checkbytes = checkfile.read(4)
         if len(checkbytes) != 4:
-            checkfile.close()
-            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                              'reason': 'not enough data for block compressed size'}
-            return {'status': False, 'error': unpackingerror}
-        # "if the frame is followed by a valid Frame Magic Number, it is considered completed."
-        if checkbytes == b'\x02\x21\x4c\x18':
             break
         blockcompressedsize = int.from_bytes(checkbytes, byteorder='little')
-        if offset + blockcompressedsize + 8 > filesize:
-            if not blockunpacked:
-                checkfile.close()
-                unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                                  'reason': 'compressed data cannot be outside file'}
-                return {'status': False, 'error': unpackingerror}
+        if blockcompressedsize > maxcompressedsize:
             break
-        unpackedsize += 4
-
-        # skip over the compressed data
-        checkfile.seek(blockcompressedsize, os.SEEK_CUR)
-        unpackedsize += blockcompressedsize
 
-        # check if the end of file was reached
-        if unpackedsize == filesize:
+        checkbytes = checkfile.read(blockcompressedsize)
+        if len(checkbytes) != blockcompressedsize:
+            break
+        try:
+            outfile.write(lz4.block.decompress(checkbytes, uncompressed_size=maxblocksize))
+        except lz4.block.LZ4BlockError:
             break
+        unpackedsize += 4 + blockcompressedsize
         blockunpacked = True
 
-    # create the unpacking directory
-    os.makedirs(unpackdir_full, exist_ok=True)
+    checkfile.close()
+    outfile.close()
+
+    if not blockunpacked:
+        os.unlink(outfile_full)
+        unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                          'reason': 'no valid LZ4 legacy blocks'}
+        return {'status': False, 'error': unpackingerror}
 
     if offset == 0 and unpackedsize == filesize:
-        checkfile.close()
-        if filename_full.suffix.lower() == '.lz4':
-            outfile_rel = os.path.join(unpackdir, filename_full.stem)
-        else:
-            outfile_rel = os.path.join(unpackdir, "unpacked-from-lz4-legacy")
-        outfile_full = scanenvironment.unpack_path(outfile_rel)
-        p = subprocess.Popen(['lz4c', '-d', filename_full, outfile_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        if p.returncode != 0:
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'not a LZ4 legacy file'}
-            return {'status': False, 'error': unpackingerror}
         labels.append('compressed')
         labels.append('lz4')
-        unpackedfilesandlabels.append((outfile_rel, []))
-        return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
-    else:
-        # first write the data to a temporary file
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, unpackedsize)
-        os.fdopen(temporaryfile[0]).close()
-        checkfile.close()
-
-        if filename_full.suffix.lower() == '.lz4':
-            outfile_rel = os.path.join(unpackdir, filename_full.stem)
-        else:
-            outfile_rel = os.path.join(unpackdir, "unpacked-from-lz4-legacy")
-        outfile_full = scanenvironment.unpack_path(outfile_rel)
-        p = subprocess.Popen(['lz4c', '-d', temporaryfile[1], outfile_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        (outputmsg, errormsg) = p.communicate()
-        os.unlink(temporaryfile[1])
-
-        if p.returncode != 0:
-            unpackingerror = {'offset': offset, 'fatal': False,
-                              'reason': 'not a LZ4 legacy file'}
-            return {'status': False, 'error': unpackingerror}
-
-        unpackedfilesandlabels.append((outfile_rel, []))
-        return {'status': True, 'length': unpackedsize, 'labels': labels,
-                'filesandlabels': unpackedfilesandlabels}
-
-    unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
-                      'reason': 'invalid LZ4 legacy data'}
-    return {'status': False, 'error': unpackingerror}
+    unpackedfilesandlabels.append((outfile_rel, []))
+    return {'status': True, 'length': unpackedsize, 'labels': labels,
+            'filesandlabels': unpackedfilesandlabels}
 
 # https://github.com/lz4/lz4/blob/master/doc/lz4_Frame_format.md#legacy-frame
 unpack_lz4legacy.signatures = {'lz4_legacy': b'\x02\x21\x4c\x18'}
@@ -8440,7 +8419,7 @@ def unpack_java_class(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['java class', 'unpacked']))
@@ -8549,7 +8528,7 @@ def unpack_snappy(fileresult, scanenvironment, offset, unpackdir):
         tmpfile_rel = os.path.join(unpackdir, "unpacked-from-snappy.sn")
         tmpfile_full = scanenvironment.unpack_path(tmpfile_rel)
         tmpfile = open(tmpfile_full, 'wb')
-        os.sendfile(tmpfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(tmpfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         checkfile.close()
         tmpfile.close()
 
@@ -9600,7 +9579,7 @@ def unpack_elf(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, maxoffset)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, maxoffset)
         outfile.close()
         checkfile.close()
         outlabels = elflabels
@@ -9620,7 +9599,7 @@ def unpack_elf(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, maxoffset)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, maxoffset)
     outfile.close()
     checkfile.close()
     outlabels = elflabels
@@ -9859,7 +9838,7 @@ def unpack_uboot_legacy(fileresult, scanenvironment, offset, unpackdir):
 
     outfile_full = scanenvironment.unpack_path(outfile_rel)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset+64, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+64, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -10225,7 +10204,7 @@ def unpack_git_index(fileresult, scanenvironment, offset, unpackdir):
     outfile_rel = os.path.join(unpackdir, "index")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
     unpackedfilesandlabels.append((outfile_rel, ['git index', 'resource', 'unpacked']))
@@ -10248,8 +10227,7 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
     unpackedsize = 0
     unpackdir_full = scanenvironment.unpack_path(unpackdir)
 
-    if shutil.which('lzop') is None:
-        checkfile.close()
+    if lzo is None and shutil.which('lzop') is None:
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'lzop program not found'}
         return {'status': False, 'error': unpackingerror}
@@ -10369,6 +10347,27 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
         return {'status': False, 'error': unpackingerror}
     unpackedsize += 4
 
+    if lzo is not None:
+        # decompress the blocks in the process
+        os.makedirs(unpackdir_full, exist_ok=True)
+        outlzop_rel = os.path.join(unpackdir, lzopname)
+        outlzop_full = scanenvironment.unpack_path(outlzop_rel)
+        outfile = open(outlzop_full, 'wb')
+        reason = _unpack_lzop_blocks(checkfile, outfile, lzopflags)
+        unpackedsize = checkfile.tell() - offset
+        checkfile.close()
+        outfile.close()
+        if reason is not None:
+            os.unlink(outlzop_full)
+            unpackingerror = {'offset': offset+unpackedsize, 'fatal': False,
+                              'reason': reason}
+            return {'status': False, 'error': unpackingerror}
+        if offset == 0 and unpackedsize == filesize:
+            labels = ['compressed', 'lzop']
+        unpackedfilesandlabels.append((outlzop_rel, []))
+        return {'status': True, 'length': unpackedsize, 'labels': labels,
+                'filesandlabels': unpackedfilesandlabels}
+
     # then the LZO compressed blocks: first uncompressed length,
     # followed by compressed length, the data itself, and possibly
     # checksums
@@ -10428,7 +10427,7 @@ def unpack_lzop(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, "unpacked.lzo")
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         carved = True
     else:
@@ -10476,6 +10475,69 @@ unpack_lzop.signatures = {'lzop': b'\x89\x4c\x5a\x4f\x00\x0d\x0a\x1a\x0a'}
 unpack_lzop.minimum_size = 38
 
 
+def _unpack_lzop_blocks(checkfile, outfile, lzopflags):
+    '''Decompress the blocks of lzop compressed data from the current
+    position in checkfile to outfile, with python-lzo, until the end
+    marker, after which checkfile is positioned. Returns None, or the
+    reason why the data is not valid.'''
+    # the checksums that can follow the block sizes, in order: the flag
+    # that says that the checksum is present, the checksum function, and
+    # whether or not it is the checksum of the compressed data.
+    checksumfields = [(0x01, zlib.adler32, False), (0x100, zlib.crc32, False),
+                      (0x02, zlib.adler32, True), (0x200, zlib.crc32, True)]
+    while True:
+        # decompressed length, 0 for the end marker
+        checkbytes = checkfile.read(4)
+        if len(checkbytes) != 4:
+            return 'not enough data for block'
+        decompressed_len = int.from_bytes(checkbytes, byteorder='big')
+        if decompressed_len == 0:
+            return None
+        # blocks are at most 64 MiB
+        if decompressed_len > 64 * 1024 * 1024:
+            return 'invalid block size'
+
+        # compressed length, which is the same as the decompressed
+        # length if the block is stored.
+        checkbytes = checkfile.read(4)
+        if len(checkbytes) != 4:
+            return 'not enough data for block'
+        compressed_len = int.from_bytes(checkbytes, byteorder='big')
+        if compressed_len == 0 or compressed_len > decompressed_len:
+            return 'invalid compressed block size'
+        iscompressed = compressed_len < decompressed_len
+
+        # the checksums of compressed data are only stored
+        # for blocks that are actually compressed.
+        checksums = []
+        for flag, checksumfunction, ofcompressed in checksumfields:
+            if lzopflags & flag == 0 or (ofcompressed and not iscompressed):
+                continue
+            checkbytes = checkfile.read(4)
+            if len(checkbytes) != 4:
+                return 'not enough data for checksum'
+            checksums.append((checksumfunction, ofcompressed,
+                              int.from_bytes(checkbytes, byteorder='big')))
+
+        checkbytes = checkfile.read(compressed_len)
+        if len(checkbytes) != compressed_len:
+            return 'not enough data for block'
+        for checksumfunction, ofcompressed, checksum in checksums:
+            if ofcompressed and checksumfunction(checkbytes) != checksum:
+                return 'wrong checksum'
+        if iscompressed:
+            try:
+                checkbytes = lzo.decompress(checkbytes, False, decompressed_len)
+            except lzo.error:
+                return 'invalid LZO data'
+            if len(checkbytes) != decompressed_len:
+                return 'invalid LZO data'
+        for checksumfunction, ofcompressed, checksum in checksums:
+            if not ofcompressed and checksumfunction(checkbytes) != checksum:
+                return 'wrong checksum'
+        outfile.write(checkbytes)
+
+
 def unpack_json(fileresult, scanenvironment, offset, unpackdir):
     '''Verify a JSON file'''
     filesize = fileresult.filesize
@@ -10547,15 +10609,6 @@ def unpack_pack200(fileresult, scanenvironment, offset, unpackdir):
     # the unpack200 tool only works on whole files. Finding out
     # where the file ends is TODO, but if there is data in front
     # of a valid pack200 file it is not a problem.
-    if offset != 0:
-        # create a temporary file and copy the data into the
-        # temporary file if offset != 0
-        checkfile = open(filename_full, 'rb')
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory)
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, filesize - offset)
-        os.fdopen(temporaryfile[0]).close()
-        checkfile.close()
-
     # write unpacked data to a JAR file
     outfile_rel = os.path.join(unpackdir, "unpacked.jar")
     outfile_full = scanenvironment.unpack_path(outfile_rel)
@@ -10563,19 +10616,13 @@ def unpack_pack200(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
 
-    # then extract the file
-    if offset != 0:
-        p = subprocess.Popen(['unpack200', temporaryfile[1], outfile_full],
+    # then extract the file. If the file does not start at offset 0
+    # the data from the offset is copied to a temporary file.
+    with bangio.range_file(filename_full, offset, filesize - offset, scanenvironment.temporarydirectory) as (packfile, packargs):
+        p = subprocess.Popen(['unpack200', packfile, outfile_full],
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                              cwd=unpackdir_full)
-    else:
-        p = subprocess.Popen(['unpack200', filename_full, outfile_full],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=unpackdir_full)
-    (outputmsg, errormsg) = p.communicate()
-
-    if offset != 0:
-        os.unlink(temporaryfile[1])
+        (outputmsg, errormsg) = p.communicate()
 
     if p.returncode != 0:
         # try to remove any files that were possibly left behind
@@ -11088,7 +11135,7 @@ def unpack_zim(fileresult, scanenvironment, offset, unpackdir):
                 unpackeddir_full = os.path.dirname(unpackedname_full)
                 os.makedirs(unpackeddir_full, exist_ok=True)
                 outfile = open(unpackedname_full, 'wb')
-                os.sendfile(outfile.fileno(), checkfile.fileno(), checkfile.tell(), blobsize)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), checkfile.tell(), blobsize)
                 outfile.close()
                 unpackedfilesandlabels.append((unpackedname_rel, []))
 
@@ -11301,7 +11348,7 @@ def unpack_java_keystore(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -11665,7 +11712,7 @@ def unpack_sqlite(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -11962,7 +12009,7 @@ def unpack_device_tree(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
     checkfile.close()
 
@@ -12098,7 +12145,7 @@ def unpack_trx(fileresult, scanenvironment, offset, unpackdir):
             outfile_rel = os.path.join(unpackdir, "partition1")
             outfile_full = scanenvironment.unpack_path(outfile_rel)
             outfile = open(outfile_full, 'wb')
-            os.sendfile(outfile.fileno(), checkfile.fileno(), offset+offset1, partitionsize)
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+offset1, partitionsize)
             outfile.close()
             unpackedfilesandlabels.append((outfile_rel, []))
 
@@ -12115,7 +12162,7 @@ def unpack_trx(fileresult, scanenvironment, offset, unpackdir):
             outfile_rel = os.path.join(unpackdir, "partition2")
             outfile_full = scanenvironment.unpack_path(outfile_rel)
             outfile = open(outfile_full, 'wb')
-            os.sendfile(outfile.fileno(), checkfile.fileno(), offset+offset2, partitionsize)
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+offset2, partitionsize)
             outfile.close()
             unpackedfilesandlabels.append((outfile_rel, []))
 
@@ -12129,7 +12176,7 @@ def unpack_trx(fileresult, scanenvironment, offset, unpackdir):
             outfile_rel = os.path.join(unpackdir, "partition3")
             outfile_full = scanenvironment.unpack_path(outfile_rel)
             outfile = open(outfile_full, 'wb')
-            os.sendfile(outfile.fileno(), checkfile.fileno(), offset+offset3, partitionsize)
+            bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+offset3, partitionsize)
             outfile.close()
             unpackedfilesandlabels.append((outfile_rel, []))
 
@@ -12141,7 +12188,7 @@ def unpack_trx(fileresult, scanenvironment, offset, unpackdir):
                 outfile_rel = os.path.join(unpackdir, "partition4")
                 outfile_full = scanenvironment.unpack_path(outfile_rel)
                 outfile = open(outfile_full, 'wb')
-                os.sendfile(outfile.fileno(), checkfile.fileno(), offset+offset4, partitionsize)
+                bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset+offset4, partitionsize)
                 outfile.close()
                 unpackedfilesandlabels.append((outfile_rel, []))
 
@@ -12315,7 +12362,7 @@ def unpack_minidump(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
     outfile = open(outfile_full, 'wb')
-    os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+    bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
     outfile.close()
 
     checkfile.close()
@@ -12369,10 +12416,13 @@ def unpack_compress(fileresult, scanenvironment, offset, unpackdir):
     # ... read some data...
     testdata = checkfile.read(1024)
 
-    # ...and run 'uncompress' to see if anything can be compressed at all
-    p = subprocess.Popen(['uncompress'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (standard_out, standard_error) = p.communicate(testdata)
-    if len(standard_out) == 0:
+    # ...and see if anything can be decompressed at all
+    try:
+        decompressor = LZWDecompressor()
+        testoutput = decompressor.decompress(testdata) + decompressor.flush()
+    except LZWError:
+        testoutput = b''
+    if len(testoutput) == 0:
         checkfile.close()
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid compress\'d data'}
@@ -12381,15 +12431,6 @@ def unpack_compress(fileresult, scanenvironment, offset, unpackdir):
     # create the unpacking directory
     os.makedirs(unpackdir_full, exist_ok=True)
 
-    havetmpfile = False
-    if offset != 0:
-        temporaryfile = tempfile.mkstemp(dir=scanenvironment.temporarydirectory, suffix='.Z')
-        os.sendfile(temporaryfile[0], checkfile.fileno(), offset, filesize - offset)
-        os.fdopen(temporaryfile[0]).close()
-        havetmpfile = True
-
-    checkfile.close()
-
     if filename_full.suffix.lower() == '.z':
         outfile_rel = os.path.join(unpackdir, filename_full.stem)
     elif filename_full.suffix.lower() == '.tz':
@@ -12400,27 +12441,43 @@ def unpack_compress(fileresult, scanenvironment, offset, unpackdir):
     outfile_full = scanenvironment.unpack_path(outfile_rel)
     outfile = open(outfile_full, 'wb')
 
-    if havetmpfile:
-        p = subprocess.Popen(['uncompress', '-c', temporaryfile[1]], stdin=subprocess.PIPE, stdout=outfile, stderr=subprocess.PIPE)
+    # compress'd data has no end marker, so all data until the end
+    # of the file is decompressed. 'uncompress' is a lot faster than
+    # the decompressor in Python, so it is used if it is installed.
+    # It reads the data directly from the file, from the offset on, so
+    # the position of the file itself is set, not the position of the
+    # buffered reader.
+    checkfile.seek(offset)
+    if shutil.which('uncompress') is not None:
+        os.lseek(checkfile.fileno(), offset, os.SEEK_SET)
+        p = subprocess.Popen(['uncompress', '-c'], stdin=checkfile,
+                             stdout=outfile, stderr=subprocess.PIPE)
+        (standard_out, standard_error) = p.communicate()
+        failed = p.returncode != 0 and standard_error != b''
     else:
-        p = subprocess.Popen(['uncompress', '-c', filename_full], stdin=subprocess.PIPE, stdout=outfile, stderr=subprocess.PIPE)
-
-    (standard_out, standard_error) = p.communicate()
-    if p.returncode != 0 and standard_error != b'':
+        decompressor = LZWDecompressor()
+        readsize = 1000000
+        try:
+            while True:
+                checkbytes = checkfile.read(readsize)
+                if checkbytes == b'':
+                    break
+                outfile.write(decompressor.decompress(checkbytes))
+            outfile.write(decompressor.flush())
+            failed = False
+        except LZWError:
+            failed = True
+    if failed:
+        checkfile.close()
         outfile.close()
         os.unlink(outfile_full)
-        if havetmpfile:
-            os.unlink(temporaryfile[1])
         unpackingerror = {'offset': offset, 'fatal': False,
                           'reason': 'invalid compress file'}
         return {'status': False, 'error': unpackingerror}
 
+    checkfile.close()
     outfile.close()
 
-    # clean up
-    if havetmpfile:
-        os.unlink(temporaryfile[1])
-
     unpackedfilesandlabels.append((outfile_rel, []))
     unpackedsize = filesize - offset
 
@@ -12558,7 +12615,7 @@ def unpack_ambarella(fileresult, scanenvironment, offset, unpackdir):
         outfile_rel = os.path.join(unpackdir, sectiontoname.get(section, str(section)))
         outfile_full = scanenvironment.unpack_path(outfile_rel)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), datastart, sectionsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), datastart, sectionsize)
         outfile.close()
 
         unpackedfilesandlabels.append((outfile_rel, []))
@@ -12665,7 +12722,7 @@ def unpack_romfs_ambarella(fileresult, scanenvironment, offset, unpackdir):
             os.makedirs(os.path.dirname(outfile_full), exist_ok=True)
         datastart = offset + inodes[inode]['offset']
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), datastart, inodes[inode]['size'])
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), datastart, inodes[inode]['size'])
         outfile.close()
 
         unpackedfilesandlabels.append((outfile_rel, []))
@@ -12910,7 +12967,7 @@ def unpack_bflt(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['blft', 'executable', 'unpacked']))
         checkfile.close()
@@ -13059,7 +13116,7 @@ def unpack_grub2font(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['font', 'resource', 'grub2', 'unpacked']))
         checkfile.close()
@@ -13263,7 +13320,7 @@ def unpack_bittorrent(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['resource', 'torrent', 'unpacked']))
         checkfile.close()
@@ -13430,7 +13487,7 @@ def unpack_pcapng(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['pcapng', 'unpacked']))
         checkfile.close()
@@ -13580,7 +13637,7 @@ def unpack_pcap(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['pcap', 'unpacked']))
         checkfile.close()
@@ -13667,7 +13724,7 @@ def unpack_serialized_java(fileresult, scanenvironment, offset, unpackdir):
         # create the unpacking directory
         os.makedirs(unpackdir_full, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset, unpackedsize)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, ['serialized java', 'unpacked']))
         checkfile.close()
@@ -13771,7 +13828,7 @@ def unpack_qcdt(fileresult, scanenvironment, offset, unpackdir):
 
         os.makedirs(outfile_full.parent, exist_ok=True)
         outfile = open(outfile_full, 'wb')
-        os.sendfile(outfile.fileno(), checkfile.fileno(), offset + entry_offset, entry_size)
+        bangio.copy_range(outfile.fileno(), checkfile.fileno(), offset + entry_offset, entry_size)
         outfile.close()
         unpackedfilesandlabels.append((outfile_rel, []))
         dataunpacked = True
@@ -10,6 +10,22 @@ class Bzip2UnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'bzip2'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        if filesize - offset < 10:
+            return False
+        if len(buffer) - offset >= 10:
+            # the byte indicating the block size has to be in
+            # the range 1 - 9
+            if buffer[offset+3] not in b'123456789':
+                return False
+            # then either a block or the end of the stream follows
+            # (bzip2 source code decompress.c, line 224).
+            if buffer[offset+4:offset+10] not in [b'\x31\x41\x59\x26\x53\x59',
+                                                  b'\x17\x72\x45\x38\x50\x90']:
+                return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_bzip2(fileresult, scan_environment, offset, unpack_dir)
 
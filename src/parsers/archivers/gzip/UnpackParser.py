@@ -10,6 +10,24 @@ class GzipUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'gzip'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        # RFC 1952 http://www.zlib.org/rfc-gzip.html describes the
+        # flags, but omits the "encrytion" flag (bit 5).
+        #
+        # Python 3's zlib module does not support:
+        # * continuation of multi-part gzip (bit 2)
+        # * encrypt (bit 5)
+        #
+        # RFC 1952 says that bit 6 and 7 should not be set.
+        if len(buffer) - offset >= 4:
+            flags = buffer[offset+3]
+            if (flags >> 2 & 1) == 1 or (flags >> 5 & 1) == 1:
+                return False
+            if (flags >> 6 & 1) == 1 or (flags >> 7 & 1) == 1:
+                return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_gzip(fileresult, scan_environment, offset, unpack_dir)
 
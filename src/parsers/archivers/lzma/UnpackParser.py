@@ -12,6 +12,25 @@ class LzmaUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'lzma'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        # the header of LZMA files is 13 bytes
+        if filesize - offset < 13:
+            return False
+        # bytes 5 - 13 are the size field. It could be that it is
+        # undefined, but if it is defined then check if it is too
+        # large or too small.
+        if len(buffer) - offset >= 13:
+            if buffer[offset+5:offset+13] != b'\xff\xff\xff\xff\xff\xff\xff\xff':
+                lzmaunpackedsize = int.from_bytes(buffer[offset+5:offset+13], byteorder='little')
+                if lzmaunpackedsize == 0:
+                    return False
+                # XZ Utils cannot unpack or create files with size
+                # of 256 GiB or more
+                if lzmaunpackedsize > 274877906944:
+                    return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_lzma(fileresult, scan_environment, offset, unpack_dir)
 
@@ -4,6 +4,7 @@ from . import vfat
 from . import vfat_directory
 from UnpackParser import UnpackParser, check_condition
 from UnpackParserException import UnpackParserException
+import bangio
 
 def get_lfn_part(record):
     # note: because python lacks a ucs-2 decoder, we use utf-16. In almost all
@@ -148,7 +149,8 @@ class VfatUnpackParser(UnpackParser):
             start = self.offset + self.pos_data + (cluster-2) * cluster_size
             check_condition(start+bytes_to_read <= self.fileresult.filesize,
                     "file data outside file")
-            os.sendfile(outfile.fileno(), self.infile.fileno(), start, bytes_to_read)
+            bangio.copy_range(outfile.fileno(), self.infile.fileno(),
+                    self.infile_offset + start, bytes_to_read)
             size_read += bytes_to_read
         outfile.close()
         outlabels = []
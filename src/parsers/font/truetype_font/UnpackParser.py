@@ -1,7 +1,7 @@
 
 import os
 from UnpackParser import WrappedUnpackParser
-from bangunpack import unpack_truetype_font
+from bangunpack import unpack_truetype_font, probe_font_header
 
 class TruetypeFontUnpackParser(WrappedUnpackParser):
     extensions = []
@@ -10,6 +10,10 @@ class TruetypeFontUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'truetype'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        return probe_font_header(buffer, offset, filesize)
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_truetype_font(fileresult, scan_environment, offset, unpack_dir)
 
@@ -10,6 +10,18 @@ class BmpUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'bmp'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        # the header of BMP files is 26 bytes
+        if filesize - offset < 26:
+            return False
+        # the BMP cannot be outside of the file
+        if len(buffer) - offset >= 6:
+            bmpsize = int.from_bytes(buffer[offset+2:offset+6], byteorder='little')
+            if offset + bmpsize > filesize:
+                return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_bmp(fileresult, scan_environment, offset, unpack_dir)
 
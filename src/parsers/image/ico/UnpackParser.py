@@ -9,6 +9,32 @@ class IcoUnpackParser(UnpackParser):
     signatures = [
         (0, b'\x00\x00\x01\x00')
     ]
+
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        # the header and the first directory entry are 22 bytes
+        if filesize - offset < 22:
+            return False
+        if len(buffer) - offset < 22:
+            return True
+        num_images = int.from_bytes(buffer[offset+4:offset+6], byteorder='little')
+        if num_images == 0:
+            return False
+        # the directory cannot be outside of the file
+        if offset + 6 + num_images * 16 > filesize:
+            return False
+        # then check the first image, as this is where most false
+        # positives happen: width, height, number of colors, reserved
+        # byte, number of planes, bits per pixel and the image offset.
+        if 0 in buffer[offset+6:offset+9] or buffer[offset+9] != 0:
+            return False
+        if buffer[offset+10:offset+12] == b'\x00\x00' or buffer[offset+12:offset+14] == b'\x00\x00':
+            return False
+        ofs_img = int.from_bytes(buffer[offset+18:offset+22], byteorder='little')
+        if ofs_img < 6 + num_images * 16:
+            return False
+        return True
+
     def parse(self):
         try:
                 self.data = ico.Ico.from_io(self.infile)
@@ -10,6 +10,17 @@ class MngUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'mng'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        # the minimum size of MNG files is 52 bytes
+        if filesize - offset < 52:
+            return False
+        # bytes 8 - 11 are always the same in every MNG
+        if len(buffer) - offset >= 12:
+            if buffer[offset+8:offset+12] != b'\x00\x00\x00\x1c':
+                return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_mng(fileresult, scan_environment, offset, unpack_dir)
 
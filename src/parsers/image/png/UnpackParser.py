@@ -10,6 +10,17 @@ class PngUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'png'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        # the minimum size of PNG files is 57 bytes
+        if filesize - offset < 57:
+            return False
+        # bytes 8 - 11 are always the same in every PNG
+        if len(buffer) - offset >= 12:
+            if buffer[offset+8:offset+12] != b'\x00\x00\x00\x0d':
+                return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_png(fileresult, scan_environment, offset, unpack_dir)
 
@@ -10,6 +10,23 @@ class SgiUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'sgi'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        # the header of SGI files is 512 bytes
+        if filesize - offset < 512:
+            return False
+        if len(buffer) - offset >= 512:
+            # storage format
+            if buffer[offset+2] not in [0, 1]:
+                return False
+            # bytes per pixel channel
+            if buffer[offset+3] not in [1, 2]:
+                return False
+            # the last 404 bytes of the header are 0x00
+            if buffer[offset+108:offset+512] != b'\x00' * 404:
+                return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_sgi(fileresult, scan_environment, offset, unpack_dir)
 
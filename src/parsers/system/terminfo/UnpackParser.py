@@ -10,6 +10,18 @@ class TerminfoUnpackParser(WrappedUnpackParser):
     ]
     pretty_name = 'terminfo'
 
+    @classmethod
+    def probe(cls, buffer, offset, filesize):
+        if filesize - offset < 12:
+            return False
+        # simple sanity check: the size of the names section
+        # cannot be < 2 or > 128
+        if len(buffer) - offset >= 4:
+            namessectionsize = int.from_bytes(buffer[offset+2:offset+4], byteorder='little')
+            if namessectionsize < 2 or namessectionsize > 128:
+                return False
+        return True
+
     def unpack_function(self, fileresult, scan_environment, offset, unpack_dir):
         return unpack_terminfo(fileresult, scan_environment, offset, unpack_dir)
 
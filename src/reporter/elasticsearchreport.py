@@ -20,25 +20,23 @@
 # version 3
 # SPDX-License-Identifier: AGPL-3.0-only
 
-import copy
-import elasticsearch
-
 class ElasticsearchReporter:
     def __init__(self, environment):
         self.environment = environment
     def report(self, scanresult):
         '''Put results into Elasticsearch'''
-        # copy scanresult because json cannot serialize datetime objects by itself
-        result = copy.deepcopy(scanresult)
+        # copy the session because json cannot serialize datetime objects
+        # by itself
+        session = dict(scanresult['session'])
 
         # pretty print datetime formats first before serializing
-        result['session']['start'] = result['session']['start'].isoformat()
-        result['session']['stop'] = result['session']['stop'].isoformat()
+        session['start'] = session['start'].isoformat()
+        session['stop'] = session['stop'].isoformat()
 
         # store the scan uuid in URN (RFC 4122) form
-        result['session']['uuid'] = result['session']['uuid'].urn
+        session['uuid'] = session['uuid'].urn
 
-        uuid = result['session']['uuid']
+        uuid = session['uuid']
 
         # first create the Elasticsearch connection string. TODO: sanitize
         connectionstring = 'http://%s:%s@%s:%d/'
@@ -70,14 +68,17 @@ class ElasticsearchReporter:
 
         connectionstring = connectionstring % (elastic_user, elastic_password, elastic_host, elastic_port)
 
+        # only imported when Elasticsearch is used
+        import elasticsearch
         es = elasticsearch.Elasticsearch([connectionstring])
 
         # store some information about the session
-        es.index(index=elastic_index, doc_type='_doc', body=result['session'])
+        es.index(index=elastic_index, doc_type='_doc', body=session)
 
-        # store information about the individual nodes.
+        # store information about the individual nodes, reading them
+        # one at a time from the scan tree.
         # TODO: use the bulk interface for this
-        for scannode in result['scantree']:
-            scannode_res = result['scantree'][scannode]
+        for scannode, scannode_res in scanresult['scantree'].items():
+            scannode_res = dict(scannode_res)
             scannode_res['uuid'] = uuid
             es.index(index=elastic_index, doc_type='_doc', body=scannode_res)
@@ -40,33 +40,33 @@ Duration (seconds): %s
 %s
 
 """ % (fn, "=" * (6 + len(fn)))
-    def _filechecksum(self, fn):
+    def _filechecksum(self, node):
         return """MD5: %s
 SHA256: %s
-""" % (self.scantree[fn]['hash']['md5'], self.scantree[fn]['hash']['sha256'])
+""" % (node['hash']['md5'], node['hash']['sha256'])
 
-    def _filesize(self, fn):
-        return "Size: %d\n" % self.scantree[fn]['filesize']
+    def _filesize(self, node):
+        return "Size: %d\n" % node['filesize']
 
-    def _filemimetype(self, fn):
-        return "MIME type: " + self.scantree[fn]['mimetype'] + "\n"
-    def _fileparent(self, fn):
-        return "Parent: " + self.scantree[fn]['parent'] + "\n"
-    def _filelabels(self, fn):
-        return "Labels: "  +  ", ".join(sorted(self.scantree[fn]['labels'])) + "\n"
+    def _filemimetype(self, node):
+        return "MIME type: " + node['mimetype'] + "\n"
+    def _fileparent(self, node):
+        return "Parent: " + node['parent'] + "\n"
+    def _filelabels(self, node):
+        return "Labels: "  +  ", ".join(sorted(node['labels'])) + "\n"
 
-    def _fileunpackedfiles(self, fn):
+    def _fileunpackedfiles(self, node):
         bytesscanned = 0
         s = ""
-        for l in self.scantree[fn]['unpackedfiles']:
+        for l in node['unpackedfiles']:
             bytesscanned += l['size']
             if len(l['files']) != 0:
                 s += "Data unpacked at offset %d from %s:\n%s\n" % (
                     l['offset'], l['type'], " ".join(sorted(l['files']))
                     )
-        return "Bytes identified: %d (%f %%)\n" % (bytesscanned, bytesscanned/self.scantree[fn]['filesize'] * 100) + s + "\n"
+        return "Bytes identified: %d (%f %%)\n" % (bytesscanned, bytesscanned/node['filesize'] * 100) + s + "\n"
 
-    def _filetotallabels(self, fn, labels):
+    def _filetotallabels(self, labels):
         label_string = """Total labels:
 =============
 """
@@ -76,29 +76,48 @@ Amount: %d
 """ % l
         return label_string
 
+    def _parserstatistics(self, parserstats):
+        # most expensive UnpackParsers first
+        stats_string = """UnpackParser statistics:
+========================
+"""
+        for name, stats in sorted(parserstats.items(), key=lambda x: x[1]['time'], reverse=True):
+            stats_string += """Name: %s
+Attempts: %d
+Successes: %d
+Failures: %d
+Time (seconds): %f (maximum: %f)
+Bytes unpacked: %d
+""" % (name, stats['attempts'], stats['successes'], stats['failures'],
+       stats['time'], stats['maxtime'], stats['bytes'])
+        return stats_string
+
     def report(self, scanresult):
 
         self.scanresult = scanresult
         labelcounter = collections.Counter()
-        s = self._header()
+        self.reportfile.write(self._header())
         self.scantree = scanresult['scantree']
+        # only the names of the files are sorted, the results are read
+        # (from a ScanTreeStore) and written one file at a time.
         filenames = sorted(self.scantree.keys())
         for fn in filenames:
-            s += self._fileheader(fn)
-            if 'hash' in self.scantree[fn]:
-                if 'md5' in self.scantree[fn]['hash']:
-                    s += self._filechecksum(fn)
-            if 'filesize' in self.scantree[fn]:
-                s += self._filesize(fn)
-            if 'mimetype' in self.scantree[fn]:
-                s += self._filemimetype(fn)
-            if 'parent' in self.scantree[fn]:
-                s += self._fileparent(fn)
-            labelcounter.update(self.scantree[fn]['labels'])
-            s += self._filelabels(fn)
-            bytesscanned = 0
-            if 'unpackedfiles' in self.scantree[fn]:
-                s += self._fileunpackedfiles(fn)
-        s += self._filetotallabels(fn, labelcounter)
-        s += "\n"
-        self.reportfile.write(s)
+            node = self.scantree[fn]
+            s = self._fileheader(fn)
+            if 'hash' in node:
+                if 'md5' in node['hash']:
+                    s += self._filechecksum(node)
+            if 'filesize' in node:
+                s += self._filesize(node)
+            if 'mimetype' in node:
+                s += self._filemimetype(node)
+            if 'parent' in node:
+                s += self._fileparent(node)
+            labelcounter.update(node['labels'])
+            s += self._filelabels(node)
+            if 'unpackedfiles' in node:
+                s += self._fileunpackedfiles(node)
+            self.reportfile.write(s)
+        self.reportfile.write(self._filetotallabels(labelcounter) + "\n")
+        if scanresult['session'].get('unpackparsers', {}) != {}:
+            self.reportfile.write(self._parserstatistics(scanresult['session']['unpackparsers']) + "\n")
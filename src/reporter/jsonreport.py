@@ -21,20 +21,50 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import json
-import copy
 
 class JsonReporter:
     def __init__(self, reportfile):
         self.reportfile = reportfile
+
+    def _dumps(self, obj, level):
+        # serialize obj as json.dump() with indent=4 would do it when
+        # obj is nested level deep.
+        return json.dumps(obj, indent=4).replace('\n', '\n' + ' ' * 4 * level)
+
     def report(self, scanresult):
         '''Report results in JSON format'''
-        # copy scanresult because json cannot serialize datetime objects by itself
-        result = copy.deepcopy(scanresult)
+        # copy the session because json cannot serialize datetime objects
+        # by itself. The scan tree is not copied, but written one file at
+        # a time, so it does not have to be in memory at once.
+        session = dict(scanresult['session'])
 
         # pretty print datetime formats first before serializing
-        result['session']['start'] = result['session']['start'].isoformat()
-        result['session']['stop'] = result['session']['stop'].isoformat()
+        session['start'] = session['start'].isoformat()
+        session['stop'] = session['stop'].isoformat()
 
         # store the scan uuid in URN (RFC 4122) form
-        result['session']['uuid'] = result['session']['uuid'].urn
-        json.dump(result, self.reportfile, indent=4)
+        session['uuid'] = session['uuid'].urn
+
+        # write the same output as json.dump(result, indent=4)
+        self.reportfile.write('{')
+        separator = '\n'
+        for key in scanresult:
+            self.reportfile.write(separator + '    ' + json.dumps(key) + ': ')
+            separator = ',\n'
+            if key == 'session':
+                self.reportfile.write(self._dumps(session, 1))
+            elif key == 'scantree':
+                self.reportfile.write('{')
+                fileseparator = '\n'
+                for filename, node in scanresult['scantree'].items():
+                    self.reportfile.write(fileseparator + '        ' + json.dumps(filename)
+                            + ': ' + self._dumps(node, 2))
+                    fileseparator = ',\n'
+                if fileseparator != '\n':
+                    self.reportfile.write('\n    ')
+                self.reportfile.write('}')
+            else:
+                self.reportfile.write(self._dumps(scanresult[key], 1))
+        if separator != '\n':
+            self.reportfile.write('\n')
+        self.reportfile.write('}')
@@ -26,5 +26,11 @@ class PickleReporter:
     def __init__(self, reportfile):
         self.reportfile = reportfile
     def report(self,scanresult):
-        pickle.dump(scanresult, self.reportfile)
+        # The scan tree can be a ScanTreeStore, which is pickled as a
+        # dict with its results read one at a time. Without the memo
+        # (which the results are not needed for, as they do not refer to
+        # each other) the pickler does not keep all of them in memory.
+        pickler = pickle.Pickler(self.reportfile)
+        pickler.fast = True
+        pickler.dump(scanresult)
 
@@ -11,6 +11,7 @@ from bangsignatures import maxsignaturesoffset
 import bangfilescans
 
 from FileResult import *
+from FileContentsComputer import hash_algorithms
 from ScanEnvironment import *
 
 def create_fileresult_for_path(unpackdir, path, labels, calculate_size=True):
@@ -86,6 +87,15 @@ class TestBase(unittest.TestCase):
             resultqueue = self.result_queue,
             processlock = self.process_lock,
             checksumdict = self.checksum_dict,
+            dedupfirst = False,
+            resultcache = None,
+            usemmap = False,
+            virtualfiles = False,
+            skippadding = False,
+            hashalgorithms = hash_algorithms,
+            hashthreads = 0,
+            skiprandomdata = False,
+            toolthreads = {},
             )
 
     def _create_clean_directory(self, dirname):
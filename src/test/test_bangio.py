@@ -0,0 +1,89 @@
+import os
+import unittest
+
+from .TestUtil import *
+
+import bangio
+
+class TestBangIO(TestBase):
+    def _create_file(self, name, data):
+        f = open(self.tmpdir / name, 'wb')
+        f.write(data)
+        f.close()
+        return self.tmpdir / name
+
+    def test_copy_range_copies_range(self):
+        data = os.urandom(20000)
+        src = self._create_file('src', data)
+        infile = open(src, 'rb')
+        outfile = open(self.tmpdir / 'dst', 'wb')
+        self.assertEqual(bangio.copy_range(outfile.fileno(), infile.fileno(), 4096, 8192), 8192)
+        self.assertEqual(bangio.copy_range(outfile.fileno(), infile.fileno(), 10, 100), 100)
+        outfile.close()
+        infile.close()
+        self.assertEqual((self.tmpdir / 'dst').read_bytes(), data[4096:4096+8192] + data[10:110])
+
+    def test_copy_range_with_sendfile(self):
+        data = os.urandom(20000)
+        src = self._create_file('src', data)
+        infile = open(src, 'rb')
+        outfile = open(self.tmpdir / 'dst', 'wb')
+        use_reflink, use_copy_file_range = bangio.use_reflink, bangio.use_copy_file_range
+        bangio.use_reflink, bangio.use_copy_file_range = False, False
+        try:
+            self.assertEqual(bangio.copy_range(outfile.fileno(), infile.fileno(), 5, 19000), 19000)
+        finally:
+            bangio.use_reflink, bangio.use_copy_file_range = use_reflink, use_copy_file_range
+        outfile.close()
+        infile.close()
+        self.assertEqual((self.tmpdir / 'dst').read_bytes(), data[5:19005])
+
+    def test_copy_file_to_directory(self):
+        data = os.urandom(5000)
+        src = self._create_file('src', data)
+        dst = bangio.copy_file(src, self.unpackdir)
+        self.assertEqual(pathlib.Path(dst), self.unpackdir / 'src')
+        self.assertEqual((self.unpackdir / 'src').read_bytes(), data)
+
+    def test_range_file_is_file_itself_for_whole_file(self):
+        src = self._create_file('src', os.urandom(5000))
+        with bangio.range_file(src, 0, 5000, self.tmpdir) as (rangefile, args):
+            self.assertEqual(rangefile, src)
+            self.assertEqual(args, [])
+        self.assertTrue(src.exists())
+
+    def test_range_file_with_offset_arguments(self):
+        src = self._create_file('src', os.urandom(5000))
+        with bangio.range_file(src, 100, 4000, self.tmpdir,
+                offsetarguments=lambda o: ['-o', str(o)]) as (rangefile, args):
+            self.assertEqual(rangefile, src)
+            self.assertEqual(args, ['-o', '100'])
+
+    def test_range_file_copies_range_to_temporary_file(self):
+        data = os.urandom(5000)
+        src = self._create_file('src', data)
+        with bangio.range_file(src, 100, 4000, self.tmpdir) as (rangefile, args):
+            self.assertNotEqual(rangefile, src)
+            self.assertEqual(args, [])
+            self.assertEqual(pathlib.Path(rangefile).read_bytes(), data[100:4100])
+        self.assertFalse(os.path.exists(rangefile))
+
+    def test_range_file_is_closed_and_removed_if_copy_fails(self):
+        src = self._create_file('src', os.urandom(5000))
+        def fail_to_copy(outfd, infd, offset, count):
+            raise OSError('copy failed')
+        copy_range = bangio.copy_range
+        bangio.copy_range = fail_to_copy
+        openfiles = len(os.listdir('/proc/self/fd'))
+        try:
+            with self.assertRaises(OSError):
+                with bangio.range_file(src, 100, 4000, self.tmpdir) as (rangefile, args):
+                    pass
+        finally:
+            bangio.copy_range = copy_range
+        self.assertEqual(len(os.listdir('/proc/self/fd')), openfiles)
+        self.assertEqual(os.listdir(self.tmpdir), ['src'])
+
+
+if __name__ == "__main__":
+    unittest.main()
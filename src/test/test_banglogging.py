@@ -0,0 +1,32 @@
+import logging
+import unittest
+
+from .TestUtil import *
+
+from banglogging import ScanLogHandler
+
+class TestScanLogHandler(TestBase):
+    def test_records_are_written_to_log_of_scan(self):
+        handler = ScanLogHandler()
+        logger = logging.getLogger('test_scan_log')
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        logfiles = [self.tmpdir / 'a.log', self.tmpdir / 'b.log']
+        handler.set_scan_log(logfiles[0])
+        logger.info('a')
+        handler.set_scan_log(logfiles[1])
+        logger.info('b')
+        handler.set_scan_log(logfiles[0])
+        logger.info('a again')
+        handler.set_scan_log(None)
+        logger.info('no scan')
+        for logfile in logfiles:
+            handler.close_scan_log(logfile)
+        logger.removeHandler(handler)
+        self.assertEqual(logfiles[0].read_text(), 'a\na again\n')
+        self.assertEqual(logfiles[1].read_text(), 'b\n')
+        self.assertEqual(handler.handlers, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
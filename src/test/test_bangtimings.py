@@ -0,0 +1,42 @@
+import unittest
+
+from .TestUtil import *
+
+from bangtimings import summarize_timings, summarize_parser_statistics
+
+class TestBangTimings(unittest.TestCase):
+    def test_timings_are_summarized(self):
+        scantree = {'f%d' % i: {'timings': {'stat': 0.001, 'signatures': i / 10}}
+                    for i in range(1, 11)}
+        scantree['dir'] = {'labels': ['directory']}
+        summary = summarize_timings(scantree, slowest=3)
+        self.assertEqual(summary['phases']['stat']['count'], 10)
+        self.assertAlmostEqual(summary['phases']['signatures']['total'], 5.5)
+        self.assertEqual(summary['phases']['signatures']['max'], 1.0)
+        self.assertEqual(summary['phases']['signatures']['p50'], 0.5)
+        self.assertEqual(summary['phases']['signatures']['p90'], 0.9)
+        self.assertEqual(summary['phases']['signatures']['p99'], 1.0)
+        self.assertEqual([f['filename'] for f in summary['slowest']], ['f10', 'f9', 'f8'])
+        self.assertAlmostEqual(summary['slowest'][0]['total'], 1.001)
+
+    def test_empty_scan_tree(self):
+        self.assertEqual(summarize_timings({}), {'phases': {}, 'slowest': []})
+
+    def test_parser_statistics_are_added_up(self):
+        stats = {'attempts': 2, 'successes': 1, 'failures': 1,
+                 'time': 0.5, 'maxtime': 0.4, 'bytes': 100}
+        scantree = {
+            'a': {'parserstats': {'GzipUnpackParser': stats}},
+            'b': {'parserstats': {'GzipUnpackParser': dict(stats, maxtime=0.1),
+                                  'PngUnpackParser': stats}},
+            'c': {},
+        }
+        parserstats = summarize_parser_statistics(scantree)
+        self.assertEqual(parserstats['GzipUnpackParser'],
+                {'attempts': 4, 'successes': 2, 'failures': 2,
+                 'time': 1.0, 'maxtime': 0.4, 'bytes': 200})
+        self.assertEqual(parserstats['PngUnpackParser'], stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import io
+import math
+import hashlib
+import unittest
+
+import tlsh
+
+from .TestUtil import *
+
+from FileContentsComputer import FileContentsComputer, IsTextComputer, Hasher, get_hash_executor
+from FileContentsComputer import ByteCounter, EntropyComputer, TLSHComputerMemoryView
+
+class TestFileContentsComputer(unittest.TestCase):
+    def _is_text(self, data, count_all=False, read_size=4):
+        fc = FileContentsComputer(read_size)
+        is_text = IsTextComputer(count_all)
+        fc.subscribe(is_text)
+        fc.read_file(io.BytesIO(data), len(data))
+        return is_text
+
+    def test_text_is_recognized(self):
+        is_text = self._is_text(b'hello,\n\tworld\r\n')
+        self.assertTrue(is_text.get())
+        self.assertEqual(is_text.get_printable_ratio(), 1.0)
+        self.assertTrue(self._is_text(b'').get())
+
+    def test_binary_is_recognized(self):
+        self.assertFalse(self._is_text(b'hello\x00world').get())
+        self.assertFalse(self._is_text(b'hello\xe2\x82\xac').get())
+
+    def test_checking_stops_at_binary_data(self):
+        is_text = self._is_text(b'abc\x00' + b'x' * 100)
+        self.assertFalse(is_text.get())
+        self.assertEqual(is_text.bytes_seen, 4)
+        self.assertEqual(is_text.get_printable_ratio(), 0.75)
+
+    def test_printable_ratio_of_all_data(self):
+        is_text = self._is_text(b'abc\x00' + b'x' * 96, count_all=True)
+        self.assertFalse(is_text.get())
+        self.assertEqual(is_text.get_printable_ratio(), 0.99)
+
+    def test_hashes_in_threads_are_the_same(self):
+        data = bytes(range(256)) * 1000
+        results = []
+        for executor in [None, get_hash_executor(2)]:
+            fc = FileContentsComputer(4096)
+            hasher = Hasher(['sha256', 'md5', 'blake2b'], executor)
+            fc.subscribe(hasher)
+            fc.read_file(io.BytesIO(data), len(data))
+            results.append(hasher.get())
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0]['blake2b'], hashlib.blake2b(data).hexdigest())
+
+    def test_fed_data_gives_same_hashes(self):
+        data = bytes(range(256)) * 100
+        fc = FileContentsComputer(1000)
+        hasher = Hasher(['sha256'])
+        fc.subscribe(hasher)
+        fc.start(io.BytesIO(data), len(data))
+        # overlapping data, and gaps that are read from the file
+        fc.feed(memoryview(data)[100:5000], 100)
+        fc.feed(data[4000:6000], 4000)
+        fc.feed(data[9000:9500], 9000)
+        fc.finish()
+        self.assertEqual(hasher.get()['sha256'], hashlib.sha256(data).hexdigest())
+
+
+    def _read(self, computer, data, read_size=1000):
+        fc = FileContentsComputer(read_size)
+        fc.subscribe(computer)
+        fc.read_file(io.BytesIO(data), len(data))
+        return computer.get()
+
+    def test_bytes_are_counted(self):
+        data = b'abca' + bytes(range(256)) * 10
+        bytecount = self._read(ByteCounter(), data)
+        self.assertEqual(len(bytecount), 256)
+        self.assertEqual(bytecount[ord('a')], 12)
+        self.assertEqual(bytecount[ord('c')], 11)
+        self.assertEqual(bytecount[0xff], 10)
+        self.assertEqual(sum(bytecount.values()), len(data))
+
+    def test_entropy_of_file(self):
+        self.assertEqual(self._read(EntropyComputer(), b'\x00' * 5000)['entropy'], 0.0)
+        self.assertAlmostEqual(self._read(EntropyComputer(), bytes(range(256)) * 20)['entropy'], 8.0)
+        self.assertAlmostEqual(self._read(EntropyComputer(), b'ab' * 100)['entropy'], 1.0)
+        self.assertEqual(self._read(EntropyComputer(), b''),
+                         {'entropy': 0.0, 'windowsize': 65536, 'profile': []})
+
+    def test_entropy_profile_across_blocks(self):
+        # windows do not line up with the blocks that are read, and the
+        # last window is smaller
+        data = b'\x00' * 1024 + bytes(range(256)) * 4 + b'ab' * 100
+        entropy = self._read(EntropyComputer(windowsize=1024), data, read_size=300)
+        self.assertEqual(entropy['windowsize'], 1024)
+        self.assertEqual(len(entropy['profile']), 3)
+        self.assertEqual(entropy['profile'][0], 0.0)
+        self.assertAlmostEqual(entropy['profile'][1], 8.0)
+        self.assertAlmostEqual(entropy['profile'][2], 1.0)
+
+    def test_entropy_profile_is_bounded(self):
+        # 9 windows of 100 bytes are merged into 3 windows of 400 bytes
+        data = b'\x00' * 400 + bytes(range(200)) * 2 + b'ab' * 50
+        computer = EntropyComputer(windowsize=100, maxwindows=2)
+        entropy = self._read(computer, data, read_size=150)
+        self.assertEqual(entropy['windowsize'], 400)
+        self.assertEqual(len(entropy['profile']), 3)
+        self.assertEqual(entropy['profile'][0], 0.0)
+        self.assertAlmostEqual(entropy['profile'][1], math.log2(200))
+        self.assertAlmostEqual(entropy['profile'][2], 1.0)
+        self.assertEqual(computer.get_histogram(), [
+            self._read(ByteCounter(), data)[i] for i in range(256)])
+
+    def test_tlsh_of_fed_and_read_data(self):
+        data = bytes(range(256)) * 100 + b'tlsh' * 1000
+        expected = tlsh.hash(data)
+        self.assertEqual(self._read(TLSHComputerMemoryView(), data), expected)
+        fc = FileContentsComputer(1000)
+        tlshc = TLSHComputerMemoryView()
+        fc.subscribe(tlshc)
+        fc.start(io.BytesIO(data), len(data))
+        fc.feed(bytearray(data[:5000]), 0)
+        fc.feed(data[9000:9500], 9000)
+        fc.finish()
+        self.assertEqual(tlshc.get(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
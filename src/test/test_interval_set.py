@@ -0,0 +1,45 @@
+import unittest
+
+from .TestUtil import *
+
+from IntervalSet import IntervalSet
+
+class TestIntervalSet(unittest.TestCase):
+    def test_intervals_are_merged(self):
+        intervals = IntervalSet([(20, 30), (0, 10), (40, 50)])
+        self.assertEqual(list(intervals), [(0, 10), (20, 30), (40, 50)])
+        intervals.add(25, 40)
+        self.assertEqual(list(intervals), [(0, 10), (20, 50)])
+        # touching intervals are merged as well
+        intervals.add(10, 12)
+        self.assertEqual(list(intervals), [(0, 12), (20, 50)])
+        intervals.add(5, 6)
+        intervals.add(15, 15)
+        self.assertEqual(list(intervals), [(0, 12), (20, 50)])
+        intervals.add(0, 100)
+        self.assertEqual(intervals, IntervalSet([(0, 100)]))
+
+    def test_offsets_are_found(self):
+        intervals = IntervalSet([(10, 20), (30, 40)])
+        self.assertEqual([o for o in range(50) if o in intervals],
+                list(range(10, 20)) + list(range(30, 40)))
+        self.assertEqual(intervals.next_free(0), 0)
+        self.assertEqual(intervals.next_free(10), 20)
+        self.assertEqual(intervals.next_free(39), 40)
+        self.assertTrue(intervals.overlaps(0, 11))
+        self.assertFalse(intervals.overlaps(0, 10))
+        self.assertFalse(intervals.overlaps(20, 30))
+        self.assertTrue(intervals.overlaps(15, 16))
+        self.assertTrue(intervals.overlaps(0, 100))
+
+    def test_gaps(self):
+        intervals = IntervalSet([(10, 20), (30, 40)])
+        self.assertEqual(intervals.gaps(0, 50), [(0, 10), (20, 30), (40, 50)])
+        self.assertEqual(intervals.gaps(15, 35), [(20, 30)])
+        self.assertEqual(intervals.gaps(10, 40), [(20, 30)])
+        self.assertEqual(intervals.gaps(12, 18), [])
+        self.assertEqual(IntervalSet().gaps(0, 5), [(0, 5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
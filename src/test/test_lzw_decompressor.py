@@ -0,0 +1,67 @@
+import unittest
+
+import lz4.frame
+
+from .TestUtil import *
+
+from LZWDecompressor import LZWDecompressor, LZWError
+
+class TestLZWDecompressor(TestBase):
+    def _read_testdata(self):
+        compressed = (self.testdata_dir / 'unpackers' / 'compress' / 'pg6130.txt.Z').read_bytes()
+        uncompressed = lz4.frame.decompress((self.testdata_dir / 'unpackers' / 'lz4' / 'pg6130.txt.lz4').read_bytes())
+        return (compressed, uncompressed)
+
+    def test_short_data(self):
+        # only 9 bit codes, and a code that is not yet in the table
+        data = bytes.fromhex('1f9d90549e0829f2448a932754020e2ca890a041842300')
+        decompressor = LZWDecompressor()
+        self.assertEqual(decompressor.decompress(data) + decompressor.flush(),
+                b'TOBEORNOTTOBEORTOBEORNOT#')
+
+    def test_whole_file(self):
+        # switches to 16 bit codes and clears the dictionary
+        (compressed, uncompressed) = self._read_testdata()
+        decompressor = LZWDecompressor()
+        self.assertEqual(decompressor.decompress(compressed) + decompressor.flush(),
+                uncompressed)
+
+    def test_file_in_chunks(self):
+        (compressed, uncompressed) = self._read_testdata()
+        for chunksize in [1, 7, 4096]:
+            # chunks of a single byte are slow, so only do the start
+            if chunksize == 1:
+                data = compressed[:5000]
+            else:
+                data = compressed
+            decompressor = LZWDecompressor()
+            output = b''.join(decompressor.decompress(data[i:i+chunksize])
+                    for i in range(0, len(data), chunksize))
+            output += decompressor.flush()
+            if chunksize == 1:
+                self.assertTrue(uncompressed.startswith(output))
+                self.assertGreater(len(output), 5000)
+            else:
+                self.assertEqual(output, uncompressed)
+
+    def test_invalid_data(self):
+        decompressor = LZWDecompressor()
+        with self.assertRaises(LZWError):
+            decompressor.decompress(b'\x1f\x8b\x08\x00')
+        # 20 bits per code
+        decompressor = LZWDecompressor()
+        with self.assertRaises(LZWError):
+            decompressor.decompress(b'\x1f\x9d\x94\x00')
+        # the first code is not a byte
+        decompressor = LZWDecompressor()
+        decompressor.decompress(b'\x1f\x9d\x90\xff\xff')
+        with self.assertRaises(LZWError):
+            decompressor.flush()
+        decompressor = LZWDecompressor()
+        decompressor.decompress(b'\x1f\x9d')
+        with self.assertRaises(LZWError):
+            decompressor.flush()
+
+
+if __name__ == "__main__":
+    unittest.main()
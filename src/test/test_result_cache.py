@@ -0,0 +1,87 @@
+from .TestUtil import *
+
+import bangsignatures
+from ScanJob import *
+from ResultCache import *
+from UnpackParserManifest import LazyUnpackParser
+
+class TestResultCache(TestBase):
+    def _process_file(self, fn):
+        fileresult = create_fileresult_for_path(self.unpackdir, fn, set())
+        self.scanfile_queue.put(ScanJob(fileresult))
+        try:
+            processfile(self.dbconn, self.dbcursor, self.scan_environment)
+        except QueueEmptyError:
+            pass
+        except ScanJobError as e:
+            if e.e.__class__ != QueueEmptyError:
+                raise e
+        scantree = {}
+        while True:
+            try:
+                result = self.result_queue.get()
+            except QueueEmptyError:
+                break
+            scantree[str(result.filename)] = result.get()
+        return scantree
+
+    def _fill_cache(self):
+        resultcache = ResultCache(self.tmpdir / 'cache', 'test')
+        fn = pathlib.Path("a/hello.gz")
+        self._copy_file_from_testdata(fn)
+        scantree = self._process_file(fn)
+        resultcache.store_scantree(scantree, self.resultsdir)
+        return resultcache, scantree
+
+    def test_version_stamp_with_lazy_unpack_parsers(self):
+        self.assertTrue(any(isinstance(u, LazyUnpackParser)
+                for u in bangsignatures.unpackparsers))
+        versionstamp = compute_version_stamp()
+        self.assertEqual(len(versionstamp), 64)
+        self.assertEqual(compute_version_stamp(), versionstamp)
+
+    def test_cache_entry_is_stored(self):
+        resultcache, scantree = self._fill_cache()
+        entry = resultcache.get(scantree['a/hello.gz']['hash']['sha256'])
+        self.assertEqual(entry['children'][0]['name'], '-0x00000000-gzip-1/hello')
+        self.assertIsNotNone(resultcache.get_subtree(scantree['a/hello.gz']['hash']['sha256']))
+
+    def test_cache_entry_with_other_version_is_ignored(self):
+        resultcache, scantree = self._fill_cache()
+        othercache = ResultCache(self.tmpdir / 'cache', 'other')
+        self.assertIsNone(othercache.get(scantree['a/hello.gz']['hash']['sha256']))
+
+    def test_cached_file_is_not_unpacked(self):
+        resultcache, scantree = self._fill_cache()
+        self.checksum_dict.clear()
+        self.scan_environment.resultcache = resultcache
+        fn = pathlib.Path("c/hello.gz")
+        self._copy_file_from_testdata(pathlib.Path("a/hello.gz"), fn)
+        newscantree = self._process_file(fn)
+        self.assertUnpackedPathDoesNotExist('c/hello.gz-0x00000000-gzip-1')
+        self.assertEqual(newscantree['c/hello.gz']['unpackedfiles'][0]['files'],
+                [ 'c/hello.gz-0x00000000-gzip-1/hello' ])
+        child = newscantree['c/hello.gz-0x00000000-gzip-1/hello']
+        self.assertEqual(child['parent'], 'c/hello.gz')
+        self.assertEqual(child['hash'],
+                scantree['a/hello.gz-0x00000000-gzip-1/hello']['hash'])
+        self.assertEqual(set(child['labels']),
+                set(scantree['a/hello.gz-0x00000000-gzip-1/hello']['labels']))
+
+    def test_byte_statistics_are_restored(self):
+        self.scan_environment.createbytecounter = True
+        resultcache, scantree = self._fill_cache()
+        original = scantree['a/hello.gz-0x00000000-gzip-1/hello']
+        self.assertEqual(sum(original['bytecount']), original['filesize'])
+        self.checksum_dict.clear()
+        self.scan_environment.resultcache = resultcache
+        fn = pathlib.Path("c/hello.gz")
+        self._copy_file_from_testdata(pathlib.Path("a/hello.gz"), fn)
+        newscantree = self._process_file(fn)
+        child = newscantree['c/hello.gz-0x00000000-gzip-1/hello']
+        self.assertEqual(child['bytecount'], original['bytecount'])
+        self.assertEqual(child['entropy'], original['entropy'])
+
+
+if __name__ == "__main__":
+    unittest.main()
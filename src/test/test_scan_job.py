@@ -1,14 +1,20 @@
+import io
 import sys
 import os
 import shutil
 import pathlib
 import inspect
+import random
 import unittest
 
 from .TestUtil import *
 
 from FileResult import *
 from ScanJob import *
+from parsers.archivers.gzip.UnpackParser import GzipUnpackParser
+from parsers.archivers.bzip2.UnpackParser import Bzip2UnpackParser
+from parsers.image.png.UnpackParser import PngUnpackParser
+import ScanJob as ScanJob_module
 # from ScanEnvironment import *
 
 # import bangfilescans
@@ -47,6 +53,54 @@ class TestScanJob(TestBase):
         j = self.scanfile_queue.get()
         self.assertSetEqual(j.fileresult.labels, set(['padding', 'synthesized']))
 
+    def test_carved_padding_is_recorded_with_skippadding(self):
+        self._create_padding_file_in_directory()
+        self.scan_environment.skippadding = True
+        fileresult = create_fileresult_for_path(self.unpackdir,
+                self.padding_file, set())
+        scanjob = ScanJob(fileresult)
+        scanjob.set_scanenvironment(self.scan_environment)
+        scanjob.initialize()
+        unpacker = UnpackManager(self.unpackdir)
+        scanjob.prepare_for_unpacking()
+        scanjob.check_unscannable_file()
+        unpacker.append_unpacked_range(0, 5) # bytes [0:5) are unpacked
+        scanjob.carve_file_data(unpacker)
+        with self.assertRaises(QueueEmptyError):
+            self.scanfile_queue.get()
+        self.assertEqual(fileresult.unpackedfiles,
+                [{'offset': 5, 'type': 'padding', 'size': 15, 'files': []}])
+        self.assertUnpackedPathDoesNotExist(str(self.padding_file) + '-0x00000005-synthesized-1')
+
+    def test_data_between_unpacked_ranges_is_carved(self):
+        self._create_padding_file_in_directory()
+        fileresult = create_fileresult_for_path(self.unpackdir,
+                self.padding_file, set())
+        scanjob = ScanJob(fileresult)
+        scanjob.set_scanenvironment(self.scan_environment)
+        scanjob.initialize()
+        unpacker = UnpackManager(self.unpackdir)
+        scanjob.prepare_for_unpacking()
+        scanjob.check_unscannable_file()
+        # ranges found later can be earlier in the file
+        unpacker.append_unpacked_range(10, 15)
+        unpacker.append_unpacked_range(0, 5)
+        unpacker.append_unpacked_range(4, 8)
+        self.assertFalse(unpacker.offset_overlaps_with_unpacked_data(8))
+        self.assertTrue(unpacker.offset_overlaps_with_unpacked_data(12))
+        scanjob.carve_file_data(unpacker)
+        carved = [self.scanfile_queue.get().fileresult.filename.name for i in range(2)]
+        self.assertEqual(carved, ['PADDING-0x8-0x9', 'PADDING-0xf-0x14'])
+
+    def test_padding_data_is_compared_in_blocks(self):
+        scanjob = ScanJob(None)
+        blocksize = ScanJob_module.paddingblocksize
+        self.assertTrue(scanjob.is_padding_data(io.BytesIO(b'\xff' * (2 * blocksize + 10))))
+        self.assertFalse(scanjob.is_padding_data(io.BytesIO(b'\xff' * (blocksize + 10) + b'\x00')))
+        self.assertFalse(scanjob.is_padding_data(io.BytesIO(b'\x00' * blocksize + b'\x01' + b'\x00' * blocksize)))
+        self.assertFalse(scanjob.is_padding_data(io.BytesIO(b'')))
+        self.assertFalse(scanjob.is_padding_data(io.BytesIO(b'a')))
+
     def test_process_paddingfile_has_correct_labels(self):
         self._create_padding_file_in_directory()
         fileresult = create_fileresult_for_path(self.unpackdir, self.padding_file, set(['padding']))
@@ -176,6 +230,243 @@ class TestScanJob(TestBase):
         self.assertEqual(unpack_report['files'],
                 [ str(fn)+'-0x00000000-gzip-1/hello' ])
 
+    def _process_two_copies_of_gzip_file(self):
+        fn1 = pathlib.Path("a/hello.gz")
+        fn2 = pathlib.Path("b/hello.gz")
+        self._copy_file_from_testdata(fn1)
+        self._copy_file_from_testdata(fn1, fn2)
+        for fn in [fn1, fn2]:
+            fileresult = create_fileresult_for_path(self.unpackdir, fn, set())
+            self.scanfile_queue.put(ScanJob(fileresult))
+        try:
+            processfile(self.dbconn, self.dbcursor, self.scan_environment)
+        except QueueEmptyError:
+            pass
+        except ScanJobError as e:
+            if e.e.__class__ != QueueEmptyError:
+                raise e
+        results = {}
+        while True:
+            try:
+                result = self.result_queue.get()
+            except QueueEmptyError:
+                break
+            results[str(result.filename)] = result
+        return results
+
+    def test_duplicate_file_is_labeled(self):
+        results = self._process_two_copies_of_gzip_file()
+        self.assertIn('duplicate', results['b/hello.gz'].labels)
+        self.assertEqual(results['b/hello.gz'].get()['duplicate of'], 'a/hello.gz')
+
+    def test_duplicate_file_is_not_unpacked_with_dedupfirst(self):
+        self.scan_environment.dedupfirst = True
+        results = self._process_two_copies_of_gzip_file()
+        self.assertNotIn('duplicate', results['a/hello.gz'].labels)
+        self.assertEqual(results['a/hello.gz'].unpackedfiles[0]['files'],
+                [ 'a/hello.gz-0x00000000-gzip-1/hello' ])
+        self.assertSetEqual(results['b/hello.gz'].labels, set(['duplicate']))
+        self.assertEqual(results['b/hello.gz'].duplicateof, pathlib.Path('a/hello.gz'))
+        self.assertIsNone(results['b/hello.gz'].unpackedfiles)
+        self.assertUnpackedPathDoesNotExist('b/hello.gz-0x00000000-gzip-1')
+        self.assertEqual(len(results), 3)
+
+    def _process_gzip_with_junk(self, junk=b'junk'):
+        fn = pathlib.Path("a/junk-hello.gz")
+        self._make_directory_in_unpackdir('a')
+        f = open(self._create_absolute_path_object(fn), 'wb')
+        f.write(junk * 100)
+        f.write((self.testdata_dir / 'a' / 'hello.gz').read_bytes())
+        f.write(junk * 100)
+        f.close()
+        fileresult = create_fileresult_for_path(self.unpackdir, fn, set())
+        self.scanfile_queue.put(ScanJob(fileresult))
+        try:
+            processfile(self.dbconn, self.dbcursor, self.scan_environment)
+        except QueueEmptyError:
+            pass
+        except ScanJobError as e:
+            if e.e.__class__ != QueueEmptyError:
+                raise e
+        return self.result_queue.get()
+
+    def test_mmap_scan_finds_same_data(self):
+        result = self._process_gzip_with_junk()
+        self._create_clean_directory(self.unpackdir)
+        self.checksum_dict.clear()
+        self.result_queue.queue.clear()
+        self.scan_environment.usemmap = True
+        result_mmap = self._process_gzip_with_junk()
+        self.assertEqual(result.unpackedfiles, result_mmap.unpackedfiles)
+        self.assertEqual(result_mmap.unpackedfiles[0]['offset'], 400)
+        self.assertEqual(result_mmap.unpackedfiles[0]['type'], 'gzip')
+
+    def _get_results(self):
+        results = {}
+        while True:
+            try:
+                result = self.result_queue.get()
+            except QueueEmptyError:
+                break
+            results[str(result.filename)] = result
+        return results
+
+    def test_carved_data_is_virtual_with_virtualfiles(self):
+        # binary data, as text is tried with unpack functions that
+        # need a real file
+        junk = b'\x01\x02\x03\x04'
+        self._process_gzip_with_junk(junk)
+        results = self._get_results()
+        self._create_clean_directory(self.unpackdir)
+        self.checksum_dict.clear()
+        self.scan_environment.virtualfiles = True
+        self._process_gzip_with_junk(junk)
+        virtualresults = self._get_results()
+        self.assertEqual(sorted(results), sorted(virtualresults))
+        synthesized = 'a/junk-hello.gz-0x00000000-synthesized-1/unpacked-0x0-0x18f'
+        self.assertUnpackedPathDoesNotExist(synthesized)
+        self.assertEqual(virtualresults[synthesized].get()['virtual'],
+                {'file': 'a/junk-hello.gz', 'offset': 0, 'size': 400})
+        for fn, result in results.items():
+            self.assertEqual(virtualresults[fn].hash, result.hash)
+            self.assertSetEqual(virtualresults[fn].labels, result.labels)
+
+    def test_virtual_file_is_materialized_for_unpack_function(self):
+        self._process_gzip_with_junk()
+        self.result_queue.queue.clear()
+        self.scan_environment.virtualfiles = True
+        fn = pathlib.Path("a/junk-hello.gz-0x00000000-synthesized-1/hello.gz")
+        fileresult = FileResult(fn, pathlib.Path("a/junk-hello.gz"), set(), set())
+        gzipsize = (self.testdata_dir / 'a' / 'hello.gz').stat().st_size
+        fileresult.set_virtual(pathlib.Path("a/junk-hello.gz"), 400, gzipsize)
+        self.scanfile_queue.put(ScanJob(fileresult))
+        try:
+            processfile(self.dbconn, self.dbcursor, self.scan_environment)
+        except QueueEmptyError:
+            pass
+        except ScanJobError as e:
+            if e.e.__class__ != QueueEmptyError:
+                raise e
+        result = self._get_results()[str(fn)]
+        self.assertFalse(result.is_virtual())
+        self.assertEqual(self._create_absolute_path_object(fn).read_bytes(),
+                (self.testdata_dir / 'a' / 'hello.gz').read_bytes())
+        self.assertEqual(result.unpackedfiles[0]['files'],
+                [ str(fn) + '-0x00000000-gzip-1/hello' ])
+
+    def test_virtual_file_is_not_materialized_for_partial_unpack(self):
+        self._process_gzip_with_junk(b'\x01\x02\x03\x04')
+        self.result_queue.queue.clear()
+        self.scan_environment.virtualfiles = True
+        fn = pathlib.Path("a/junk-hello.gz-0x00000000-synthesized-1/junk-hello.gz")
+        fileresult = FileResult(fn, pathlib.Path("a/junk-hello.gz"), set(), set())
+        gzipsize = (self.testdata_dir / 'a' / 'hello.gz').stat().st_size
+        fileresult.set_virtual(pathlib.Path("a/junk-hello.gz"), 200, 200 + gzipsize + 100)
+        self.scanfile_queue.put(ScanJob(fileresult))
+        try:
+            processfile(self.dbconn, self.dbcursor, self.scan_environment)
+        except QueueEmptyError:
+            pass
+        except ScanJobError as e:
+            if e.e.__class__ != QueueEmptyError:
+                raise e
+        result = self._get_results()[str(fn)]
+        self.assertTrue(result.is_virtual())
+        self.assertUnpackedPathDoesNotExist(fn)
+        gzipresult = [r for r in result.unpackedfiles if r['type'] == 'gzip'][0]
+        self.assertEqual(gzipresult['offset'], 200)
+        self.assertEqual(gzipresult['files'],
+                [ str(fn) + '-0x000000c8-gzip-1/hello' ])
+        self.assertUnpackedPathExists(gzipresult['files'][0])
+
+
+    def test_phase_timings_are_recorded(self):
+        result = self._process_gzip_with_junk()
+        timings = result.get()['timings']
+        for phase in ['stat', 'prepare', 'signatures', 'carving', 'content', 'dedup']:
+            self.assertIn(phase, timings)
+        self.assertTrue(all(t >= 0 for t in timings.values()))
+
+    def test_configured_hashes_are_computed(self):
+        self.scan_environment.hashalgorithms = ['sha256', 'blake2b']
+        result = self._process_gzip_with_junk()
+        self.assertEqual(set(result.get_hashresult()), set(['sha256', 'blake2b', 'tlsh']))
+
+    def test_unpack_parser_statistics_are_recorded(self):
+        result = self._process_gzip_with_junk()
+        stats = result.get()['parserstats']['GzipUnpackParser']
+        self.assertEqual(stats['successes'], 1)
+        self.assertEqual(stats['attempts'], stats['successes'] + stats['failures'])
+        self.assertEqual(stats['bytes'], (self.testdata_dir / 'a' / 'hello.gz').stat().st_size)
+
+
+    def _find_candidates(self, data, skiprandomdata):
+        fn = self._create_absolute_path_object('random.bin')
+        fn.write_bytes(data)
+        unpacker = UnpackManager(self.unpackdir, skiprandomdata)
+        unpacker.open_scanfile_with_memoryview(fn, len(data) + 1)
+        unpacker.read_chunk_from_scanfile()
+        candidates = unpacker.find_offsets_for_signatures(len(data))
+        unpacker.close_scanfile()
+        return set((offset, u.__name__) for offset, u in candidates)
+
+    def test_weak_signatures_are_skipped_in_random_data(self):
+        data = bytearray(random.Random(0).randbytes(65536))
+        data[8192:8198] = b'BM' + (26).to_bytes(4, 'little')
+        data[8200:8202] = b'\xff\xd8'
+        data[12288:12292] = b'\x7fELF'
+        # the same signatures after data that does not look random
+        data[49152:65536] = b'\x00' * 16384
+        data[57344:57346] = b'BM'
+        candidates = self._find_candidates(bytes(data), False)
+        self.assertIn((8192, 'BmpUnpackParser'), candidates)
+        self.assertIn((8200, 'JpegUnpackParser'), candidates)
+        skipped = self._find_candidates(bytes(data), True)
+        self.assertNotIn((8192, 'BmpUnpackParser'), skipped)
+        self.assertNotIn((8200, 'JpegUnpackParser'), skipped)
+        self.assertIn((12288, 'ElfUnpackParser'), skipped)
+        self.assertIn((57344, 'BmpUnpackParser'), skipped)
+        self.assertTrue(skipped < candidates)
+
+
+    def test_probes_reject_bad_headers(self):
+        gzipdata = (self.testdata_dir / 'a' / 'hello.gz').read_bytes()
+        self.assertTrue(GzipUnpackParser.probe(gzipdata, 0, len(gzipdata)))
+        # the encryption flag is not supported
+        bad = gzipdata[:3] + b'\x20' + gzipdata[4:]
+        self.assertFalse(GzipUnpackParser.probe(bad, 0, len(bad)))
+        # data after the end of the buffer is not checked
+        self.assertTrue(GzipUnpackParser.probe(bad[:3], 0, len(bad)))
+        bzip2data = b'BZh9' + b'\x31\x41\x59\x26\x53\x59' + b'\x00' * 32
+        self.assertTrue(Bzip2UnpackParser.probe(bzip2data, 0, len(bzip2data)))
+        self.assertFalse(Bzip2UnpackParser.probe(b'BZh0' + bzip2data[4:], 0, len(bzip2data)))
+        self.assertFalse(Bzip2UnpackParser.probe(b'junk' + bzip2data, 4, 8))
+        pngdata = b'\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR' + b'\x00' * 64
+        self.assertTrue(PngUnpackParser.probe(pngdata, 0, len(pngdata)))
+        self.assertFalse(PngUnpackParser.probe(pngdata[:8] + b'\x00' * 72, 0, len(pngdata)))
+
+    def test_rejected_data_is_not_tried(self):
+        # gzip headers with the encryption flag set
+        result = self._process_gzip_with_junk(b'\x1f\x8b\x08\x20')
+        stats = result.get()['parserstats']['GzipUnpackParser']
+        self.assertEqual(stats['attempts'], 1)
+        unpacked = [p.name for p in (self.unpackdir / 'a').glob('*-gzip-*')]
+        self.assertEqual(unpacked, ['junk-hello.gz-0x00000190-gzip-1'])
+
+    def test_unpackers_for_file_name_are_found_by_suffix(self):
+        names = ['a/hello.tar', 'a/HELLO.XML', 'etc/passwd', 'etc/passwd.bak',
+                 'system/x.new.dat', 'META-INF/MANIFEST.MF', 'json', 'a/b']
+        for name in names:
+            filename = pathlib.Path(name)
+            expected = [(e, u) for e, unpackparsers in
+                    bangsignatures.extension_to_unpackparser.items()
+                    for u in unpackparsers
+                    if bangsignatures.matches_file_pattern(filename, e)]
+            self.assertEqual(bangsignatures.get_unpackers_for_file_name(filename),
+                    expected, name)
+        self.assertEqual([e for e, u in bangsignatures.get_unpackers_for_file_name(
+                pathlib.Path('system/x.new.dat'))], ['.new.dat'])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,158 @@
+import os
+import time
+import unittest
+
+from .TestUtil import *
+
+from ScanScheduler import *
+from ScanJob import ScanJob
+
+class Job:
+    def __init__(self, n, group):
+        self.n = n
+        self.group = group
+
+def _split_jobs(scheduler):
+    # every job n > 0 creates two jobs n-1, like a file that
+    # contains two other files
+    while True:
+        job = scheduler.get(timeout=10)
+        if job is None:
+            return
+        if job.n > 0:
+            scheduler.put(Job(job.n-1, job.group), job.group)
+            scheduler.put(Job(job.n-1, job.group), job.group)
+        scheduler.put_result(job.n, job.group)
+        scheduler.task_done(job.group)
+
+def _split_jobs_and_crash(scheduler):
+    while True:
+        job = scheduler.get(timeout=10)
+        if job is None:
+            return
+        if job.n == 0:
+            raise Exception("worker stops")
+        scheduler.put(Job(job.n-1, job.group), job.group)
+        scheduler.put_result(job.n, job.group)
+        scheduler.task_done(job.group)
+
+def _keep_jobs_and_stay_busy(scheduler):
+    job = scheduler.get(timeout=10)
+    # nobody is waiting, so these jobs are kept local
+    for n in range(3):
+        scheduler.put(Job(n, job.group), job.group)
+    scheduler.put_result('busy', job.group)
+    time.sleep(30)
+
+class TestScanScheduler(unittest.TestCase):
+    def _run_with_workers(self, target, jobs, processes, groups=1):
+        scheduler = ScanScheduler(groups)
+        scheduler.start_workers(target, [(scheduler,)] * processes)
+        results = []
+        started = 0
+        for group in range(0, min(groups, len(jobs))):
+            scheduler.start_group(group)
+            scheduler.put(Job(jobs[started], group), group)
+            started += 1
+        if started == len(jobs):
+            scheduler.close()
+        for group, result in scheduler.collect_results():
+            results.append((group, result))
+            if result is None and started < len(jobs):
+                scheduler.start_group(group)
+                scheduler.put(Job(jobs[started], group), group)
+                started += 1
+                if started == len(jobs):
+                    scheduler.close()
+        scheduler.stop_workers()
+        return results
+
+    def test_all_jobs_are_done(self):
+        results = self._run_with_workers(_split_jobs, [8], 4)
+        self.assertEqual(results[-1], (0, None))
+        results = [r for g, r in results[:-1]]
+        self.assertEqual(len(results), 2**9 - 1)
+        for n in range(0, 9):
+            self.assertEqual(results.count(n), 2**(8-n))
+
+    def test_groups_are_reported_when_done(self):
+        results = self._run_with_workers(_split_jobs, [5, 3, 4, 2, 6], 3, groups=2)
+        # every group is done after all its results, and the next job
+        # in the group is only started after that.
+        done = [i for i, (g, r) in enumerate(results) if r is None]
+        self.assertEqual(len(done), 5)
+        counts = {}
+        sizes = []
+        for group, result in results:
+            if result is None:
+                sizes.append(counts.pop(group))
+            else:
+                counts[group] = counts.get(group, 0) + 1
+        self.assertEqual(sorted(sizes), sorted(2**(n+1) - 1 for n in [5, 3, 4, 2, 6]))
+
+    def test_jobs_are_stolen_from_busy_worker(self):
+        scheduler = ScanScheduler()
+        scheduler.start_workers(_keep_jobs_and_stay_busy, [(scheduler,)])
+        scheduler.start_group(0)
+        scheduler.put(Job(None, 0))
+        self.assertEqual(scheduler.resultqueue.get(timeout=10), (0, 'busy', None))
+        # the oldest job of the worker is given away
+        job = scheduler.get(timeout=10)
+        self.assertEqual(job.n, 0)
+        for process in scheduler.processes:
+            process.terminate()
+            process.join()
+
+    def test_results_are_collected_if_worker_stops(self):
+        results = self._run_with_workers(_split_jobs_and_crash, [3], 2)
+        self.assertEqual(sorted(r for g, r in results if r is not None), [1, 2, 3])
+        self.assertEqual(results[-1], (0, None))
+
+
+class TestScanEnvironmentForScan(TestBase):
+    def test_job_gets_environment_of_scan(self):
+        scheduler = ScanScheduler(2)
+        (self.scan_environment.scanfilequeue, self.scan_environment.resultqueue) = \
+                scheduler.get_group_queues(0)
+        scan = (1, self.unpackdir / 'b', self.resultsdir / 'b', self.tmpdir, None)
+        environment = self.scan_environment.get_environment_for_scan(scan)
+        self.assertEqual(environment.unpackdirectory, self.unpackdir / 'b')
+        self.assertEqual(environment.resultsdirectory, self.resultsdir / 'b')
+        self.assertIs(self.scan_environment.get_environment_for_scan(scan), environment)
+        self.assertIs(self.scan_environment.get_environment_for_scan(None), self.scan_environment)
+
+        fileresult = FileResult(pathlib.Path('hello'), None, set(), set())
+        job = ScanJob(fileresult)
+        scheduler.start_group(1)
+        environment.scanfilequeue.put(job)
+        self.assertEqual(scheduler.get(timeout=10).scan, scan)
+        self.assertEqual(scheduler.pending[1], 1)
+
+
+class TestSharedChecksumDict(TestBase):
+    def test_entries_are_shared(self):
+        checksumdict = SharedChecksumDict(self.tmpdir)
+        self.assertNotIn('abcd', checksumdict)
+        checksumdict['abcd'] = pathlib.Path('a/hello.gz')
+        othercopy = SharedChecksumDict(self.tmpdir)
+        self.assertIn('abcd', othercopy)
+        self.assertEqual(othercopy['abcd'], pathlib.Path('a/hello.gz'))
+        with self.assertRaises(KeyError):
+            othercopy['efgh']
+        othercopy['abcd'] = pathlib.Path('b/hello.gz')
+        self.assertEqual(checksumdict['abcd'], pathlib.Path('b/hello.gz'))
+
+    def test_many_entries(self):
+        checksumdict = SharedChecksumDict(self.tmpdir)
+        for i in range(10000):
+            checksumdict['%064x' % i] = pathlib.Path('dir/file-%d' % i)
+        othercopy = SharedChecksumDict(self.tmpdir)
+        for i in range(10000):
+            self.assertEqual(othercopy['%064x' % i], pathlib.Path('dir/file-%d' % i))
+        self.assertNotIn('%064x' % 10000, othercopy)
+        # all entries are in a single file
+        self.assertEqual(os.listdir(self.tmpdir), ['checksums'])
+
+
+if __name__ == "__main__":
+    unittest.main()
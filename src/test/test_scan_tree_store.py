@@ -0,0 +1,98 @@
+import io
+import json
+import uuid
+import pickle
+import datetime
+import unittest
+
+from .TestUtil import *
+
+from ScanTreeStore import ScanTreeStore
+from reporter.jsonreport import JsonReporter
+from reporter.picklereport import PickleReporter
+
+class TestScanTreeStore(TestBase):
+    nodes = [
+        ('a/hello.gz', {'labels': ['root'], 'filesize': 32,
+                        'unpackedfiles': [{'offset': 0, 'files': ['a/hello.gz-0x00000000-gzip-1/hello']}]}),
+        ('a/hello.gz-0x00000000-gzip-1/hello', {'labels': ['text'], 'parent': 'a/hello.gz'}),
+    ]
+
+    def _create_store(self):
+        store = ScanTreeStore.create(self.tmpdir / 'bang.jsonl')
+        for filename, node in self.nodes:
+            store.add(filename, node)
+        return store
+
+    def _scanresult(self, scantree):
+        start = datetime.datetime(2019, 1, 1)
+        return {'scantree': scantree,
+                'session': {'start': start, 'stop': start, 'uuid': uuid.uuid4()}}
+
+    def test_results_are_read_back(self):
+        store = self._create_store()
+        self.assertEqual(len(store), 2)
+        self.assertIn('a/hello.gz', store)
+        self.assertEqual(store['a/hello.gz-0x00000000-gzip-1/hello'], self.nodes[1][1])
+        self.assertEqual(list(store.items()), self.nodes)
+        store.close()
+
+    def test_later_result_replaces_earlier_result(self):
+        store = self._create_store()
+        store.add('a/hello.gz', {'labels': []})
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store['a/hello.gz'], {'labels': []})
+        self.assertEqual([f for f, n in store.items()],
+                ['a/hello.gz-0x00000000-gzip-1/hello', 'a/hello.gz'])
+        store.close()
+        store = ScanTreeStore.open(self.tmpdir / 'bang.jsonl')
+        self.assertEqual(store['a/hello.gz'], {'labels': []})
+        store.close()
+
+    def test_lookup_while_iterating(self):
+        store = self._create_store()
+        for filename, node in store.items():
+            for report in node.get('unpackedfiles', []):
+                for childname in report['files']:
+                    self.assertEqual(store[childname], self.nodes[1][1])
+        self.assertEqual(dict(store.items()), dict(self.nodes))
+        store.close()
+
+    def test_store_is_pickled_as_dict(self):
+        store = self._create_store()
+        picklefile = io.BytesIO()
+        scanresult = self._scanresult(store)
+        PickleReporter(picklefile).report(scanresult)
+        result = pickle.loads(picklefile.getvalue())
+        self.assertEqual(type(result['scantree']), dict)
+        self.assertEqual(result['scantree'], dict(self.nodes))
+        store.close()
+
+    def test_json_report_is_the_same_for_store_and_dict(self):
+        store = self._create_store()
+        scanresult = self._scanresult(store)
+        storereport = io.StringIO()
+        JsonReporter(storereport).report(scanresult)
+        dictreport = io.StringIO()
+        JsonReporter(dictreport).report(dict(scanresult, scantree=dict(self.nodes)))
+        self.assertEqual(storereport.getvalue(), dictreport.getvalue())
+        result = json.loads(storereport.getvalue())
+        self.assertEqual(result['scantree'], dict(self.nodes))
+        self.assertEqual(result['session']['uuid'], scanresult['session']['uuid'].urn)
+        store.close()
+
+    def test_json_report_matches_json_dump(self):
+        scanresult = self._scanresult(dict(self.nodes))
+        report = io.StringIO()
+        JsonReporter(report).report(scanresult)
+        session = dict(scanresult['session'], start='2019-01-01T00:00:00',
+                       stop='2019-01-01T00:00:00', uuid=scanresult['session']['uuid'].urn)
+        self.assertEqual(report.getvalue(), json.dumps(
+            {'scantree': dict(self.nodes), 'session': session}, indent=4))
+        report = io.StringIO()
+        JsonReporter(report).report(self._scanresult({}))
+        self.assertEqual(json.loads(report.getvalue())['scantree'], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
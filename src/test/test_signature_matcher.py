@@ -0,0 +1,57 @@
+import unittest
+
+from .TestUtil import *
+
+import SignatureMatcher
+from SignatureMatcher import SignatureMatcher as Matcher
+
+class TestSignatureMatcher(unittest.TestCase):
+    signature_to_unpackparser = {
+        (0, b'BM'): ['bmp'],
+        (0, b'BMX'): ['bmx'],
+        (0, b'\x1f\x8b\x08'): ['gzip'],
+        (32769, b'CD001'): ['iso9660'],
+        (0, b'CD001'): ['other'],
+    }
+    data = b'xxBMXyy\x1f\x8b\x08\x1f\x8b\x08zzCD001BM'
+
+    def _find(self, matcher):
+        return sorted((p, o, t, tuple(u)) for p, o, t, u in matcher.find(memoryview(self.data)))
+
+    def test_all_signatures_are_found(self):
+        matcher = Matcher(self.signature_to_unpackparser)
+        self.assertEqual(self._find(matcher), [
+            (2, 0, b'BM', ('bmp',)),
+            (2, 0, b'BMX', ('bmx',)),
+            (7, 0, b'\x1f\x8b\x08', ('gzip',)),
+            (10, 0, b'\x1f\x8b\x08', ('gzip',)),
+            (15, 0, b'CD001', ('other',)),
+            (15, 32769, b'CD001', ('iso9660',)),
+            (20, 0, b'BM', ('bmp',)),
+            ])
+
+    def test_fallback_finds_same_signatures(self):
+        matcher = Matcher(self.signature_to_unpackparser)
+        ahocorasick = SignatureMatcher.ahocorasick
+        SignatureMatcher.ahocorasick = None
+        try:
+            fallback_matcher = Matcher(self.signature_to_unpackparser)
+        finally:
+            SignatureMatcher.ahocorasick = ahocorasick
+        self.assertEqual(self._find(matcher), self._find(fallback_matcher))
+
+    def test_find_from_is_ordered_across_windows(self):
+        matcher = Matcher(self.signature_to_unpackparser)
+        found = [(p, o, t, tuple(u)) for p, o, t, u in
+                matcher.find_from(memoryview(self.data), 0, windowsize=4)]
+        self.assertEqual([p for p, o, t, u in found], sorted(p for p, o, t, u in found))
+        self.assertEqual(sorted(found), self._find(matcher))
+
+    def test_find_from_starts_at_position(self):
+        matcher = Matcher(self.signature_to_unpackparser)
+        found = list(matcher.find_from(memoryview(self.data), 8))
+        self.assertEqual([p for p, o, t, u in found], [10, 15, 15, 20])
+
+
+if __name__ == "__main__":
+    unittest.main()
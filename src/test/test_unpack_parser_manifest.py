@@ -0,0 +1,81 @@
+import json
+import unittest
+
+from .TestUtil import *
+
+import bangsignatures
+from UnpackParserManifest import load_unpackparsers, LazyUnpackParser
+from parsers.archivers.gzip.UnpackParser import GzipUnpackParser
+
+class TestUnpackParserManifest(TestBase):
+    def _load(self, parsersdir, found):
+        def find_unpackparsers(failed):
+            found.append(True)
+            return [('parsers.archivers.gzip.UnpackParser', GzipUnpackParser)]
+        return load_unpackparsers(parsersdir / 'manifest.json', parsersdir,
+                find_unpackparsers)
+
+    def test_manifest_matches_unpack_parsers(self):
+        unpackers = bangsignatures.get_unpackers()
+        self.assertEqual([u.__name__ for u in bangsignatures.unpackparsers],
+                [u.__name__ for u in unpackers])
+        for lazy, unpackparser in zip(bangsignatures.unpackparsers, unpackers):
+            self.assertEqual(lazy.pretty_name, unpackparser.pretty_name)
+            self.assertEqual(lazy.signatures, unpackparser.signatures)
+            self.assertEqual(lazy.extensions, unpackparser.extensions)
+            self.assertEqual(lazy.scan_if_featureless, unpackparser.scan_if_featureless)
+            self.assertIs(lazy.load(), unpackparser)
+
+    def test_failed_modules_are_retried_when_packages_change(self):
+        parsersdir = self.tmpdir / 'parsers'
+        parsersdir.mkdir()
+        (parsersdir / 'UnpackParser.py').write_text('')
+        found = []
+        def find_unpackparsers(failed):
+            found.append(True)
+            failed.append('parsers.notimportable.UnpackParser')
+            return []
+        load_unpackparsers(parsersdir / 'manifest.json', parsersdir, find_unpackparsers)
+        load_unpackparsers(parsersdir / 'manifest.json', parsersdir, find_unpackparsers)
+        self.assertEqual(len(found), 1)
+        # pretend that packages were installed after the manifest was made
+        manifest = json.loads((parsersdir / 'manifest.json').read_text())
+        manifest['packagetimes'] = [['site-packages', 0]]
+        (parsersdir / 'manifest.json').write_text(json.dumps(manifest))
+        load_unpackparsers(parsersdir / 'manifest.json', parsersdir, find_unpackparsers)
+        self.assertEqual(len(found), 2)
+
+    def test_manifest_is_created_when_parsers_change(self):
+        parsersdir = self.tmpdir / 'parsers'
+        parsersdir.mkdir()
+        (parsersdir / 'UnpackParser.py').write_text('')
+        found = []
+        unpackparsers = self._load(parsersdir, found)
+        self.assertEqual(len(found), 1)
+        self.assertTrue((parsersdir / 'manifest.json').exists())
+        unpackparsers = self._load(parsersdir, found)
+        self.assertEqual(len(found), 1)
+        (parsersdir / 'UnpackParser.py').write_text('# changed')
+        unpackparsers = self._load(parsersdir, found)
+        self.assertEqual(len(found), 2)
+
+        gzip = unpackparsers[0]
+        self.assertIsInstance(gzip, LazyUnpackParser)
+        self.assertEqual(gzip.__name__, 'GzipUnpackParser')
+        self.assertEqual(gzip.signatures, GzipUnpackParser.signatures)
+        self.assertIsNone(gzip.unpackparser)
+        self.assertEqual(gzip.get_carved_filename(), GzipUnpackParser.get_carved_filename())
+        self.assertIs(gzip.unpackparser, GzipUnpackParser)
+
+    def test_probe_only_imports_unpack_parsers_with_probe(self):
+        for lazy in bangsignatures.unpackparsers:
+            lazy.unpackparser = None
+            self.assertTrue(lazy.probe(b'', 0, 0) or lazy.has_probe)
+            self.assertEqual(lazy.unpackparser is not None, lazy.has_probe)
+        has_probe = { u.__name__ for u in bangsignatures.unpackparsers if u.has_probe }
+        self.assertIn('GzipUnpackParser', has_probe)
+        self.assertNotIn('ElfUnpackParser', has_probe)
+
+
+if __name__ == "__main__":
+    unittest.main()
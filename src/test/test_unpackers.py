@@ -31,6 +31,7 @@ from parameterized import parameterized
 # load own modules
 import bangunpack
 import bangfilesystems
+import bangext2
 import bangmedia
 import bangandroid
 import bangtext
@@ -1088,6 +1089,69 @@ class TestLZ4(TestBase):
         self.assertFalse(testres['status'])
 
 
+# a test class for testing LZ4 legacy files
+class TestLZ4Legacy(TestBase):
+    '''Test class for LZ4 legacy compressed data'''
+
+    # a test for the file being a single LZ4 legacy
+    def test_fullfile(self):
+        '''Test a single LZ4 legacy compressed file'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'lz4legacy' / 'test.lz4'
+        fileresult = create_fileresult_for_path(self.unpackdir, filename, set())
+        filesize = fileresult.filesize
+        offset = 0
+        testres = bangunpack.unpack_lz4legacy(fileresult, self.scan_environment, offset, self.unpackdir)
+        self.assertTrue(testres['status'])
+        self.assertEqual(testres['length'], filesize)
+        self.assertIn('lz4', testres['labels'])
+
+    # a test for the file being a single LZ4 legacy with data appended to it
+    def test_appended(self):
+        '''Test a single LZ4 legacy compressed file with data appended'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'lz4legacy' / 'test-add-random-data.lz4'
+        fileresult = create_fileresult_for_path(self.unpackdir, filename, set())
+        offset = 0
+        testres = bangunpack.unpack_lz4legacy(fileresult, self.scan_environment, offset, self.unpackdir)
+        self.assertTrue(testres['status'])
+        self.assertEqual(testres['length'], 64279)
+        unpacked_path = self.unpackdir / testres['filesandlabels'][0][0]
+        self.assertEqual(unpacked_path.stat().st_size, 100000)
+
+
+# a test class for testing compress files
+class TestCompress(TestBase):
+    '''Test class for compress'd data'''
+
+    # a test for the file being a single compress'd file
+    def test_fullfile(self):
+        '''Test a single compress'd file'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'compress' / 'pg6130.txt.Z'
+        fileresult = create_fileresult_for_path(self.unpackdir, filename, set())
+        filesize = fileresult.filesize
+        offset = 0
+        testres = bangunpack.unpack_compress(fileresult, self.scan_environment, offset, self.unpackdir)
+        self.assertTrue(testres['status'])
+        self.assertEqual(testres['length'], filesize)
+        unpacked_path = self.unpackdir / testres['filesandlabels'][0][0]
+        self.assertEqual(unpacked_path.stat().st_size, 1201891)
+
+    # a test for the file being a single compress'd file with data in front
+    def test_prepended(self):
+        '''Test a single compress'd file with data prepended'''
+        compressed = (pathlib.Path(self.testdata_dir) / 'unpackers' / 'compress' / 'pg6130.txt.Z').read_bytes()
+        filename = self.tmpdir / 'pg6130.txt-prepend-data.Z'
+        filename.write_bytes(b'\x00' * 128 + compressed)
+        fileresult = create_fileresult_for_path(self.unpackdir, filename, set())
+        offset = 128
+        testres = bangunpack.unpack_compress(fileresult, self.scan_environment, offset, self.unpackdir)
+        self.assertTrue(testres['status'])
+        self.assertEqual(testres['length'], len(compressed))
+        unpacked_path = self.unpackdir / testres['filesandlabels'][0][0]
+        decompressor = bangunpack.LZWDecompressor()
+        self.assertEqual(unpacked_path.read_bytes(),
+                         decompressor.decompress(compressed) + decompressor.flush())
+
+
 # a test class for testing CPIO files
 class TestCPIO(TestBase):
     '''Test class for CPIO archives'''
@@ -2109,6 +2173,13 @@ class TestSquashfs(TestBase):
         testres = bangfilesystems.unpack_squashfs(fileresult, self.scan_environment, offset, self.unpackdir)
         self.assertTrue(testres['status'])
         self.assertEqual(testres['length'], filesize)
+        # the unpacked files are taken from the output of unsquashfs
+        unpackedfiles = set()
+        for direntries in os.walk(self.unpackdir):
+            for entryname in direntries[1] + direntries[2]:
+                fullfilename = os.path.join(direntries[0], entryname)
+                unpackedfiles.add(self.scan_environment.rel_unpack_path(fullfilename))
+        self.assertEqual(set(f for f, l in testres['filesandlabels']), unpackedfiles)
 
     # a test for the file being a single squashfs with data appended to it
     def test_appended(self):
@@ -2526,6 +2597,102 @@ class TestJFFS2(TestBase):
         self.assertFalse(testres['status'])
 
 
+# a test class for testing ext2/3/4 files
+class TestExt2(TestBase):
+    '''Test class for ext2/3/4'''
+
+    # a test for the file being a single ext2 file system
+    def test_fullfile(self):
+        '''Test a single ext2 file system'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'ext2' / 'test.ext2'
+        fileresult = create_fileresult_for_path(self.unpackdir, filename, set())
+        filesize = fileresult.filesize
+        offset = 0
+        testres = bangfilesystems.unpack_ext2(fileresult, self.scan_environment, offset, self.unpackdir)
+        self.assertTrue(testres['status'])
+        self.assertEqual(testres['length'], filesize)
+        self.assertEqual((self.unpackdir / 'hello.txt').read_bytes(), b'hello\n')
+
+    # a test for an ext4 file system with extents, an indexed
+    # directory, inline data, links and a sparse file
+    def test_ext4_features(self):
+        '''Test a single ext4 file system'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'ext2' / 'test.ext4'
+        fileresult = create_fileresult_for_path(self.unpackdir, filename, set())
+        filesize = fileresult.filesize
+        offset = 0
+        testres = bangfilesystems.unpack_ext2(fileresult, self.scan_environment, offset, self.unpackdir)
+        self.assertTrue(testres['status'])
+        self.assertEqual(testres['length'], filesize)
+        self.assertEqual(len(list((self.unpackdir / 'dir').glob('file-with-a-long-name-*'))), 120)
+        self.assertEqual((self.unpackdir / 'dir' / 'file-with-a-long-name-120').read_bytes(), b'120\n')
+        self.assertEqual((self.unpackdir / 'hello.txt').read_bytes(), b'hello\n')
+        self.assertEqual((self.unpackdir / 'dir' / 'hardlink.txt').stat().st_ino,
+                         (self.unpackdir / 'hello.txt').stat().st_ino)
+        self.assertEqual(os.readlink(self.unpackdir / 'dir' / 'link'), '../hello.txt')
+        self.assertEqual(os.readlink(self.unpackdir / 'longlink'), '/' + 'a' * 80)
+        self.assertEqual((self.unpackdir / 'dir' / 'random.bin').stat().st_size, 20000)
+        self.assertEqual((self.unpackdir / 'sparse').read_bytes(), b'\x00' * 100000 + b'end\n')
+        self.assertIn((str(self.unpackdir / 'longlink'), ['symbolic link']), testres['filesandlabels'])
+
+    # a test for the file being a single ext2 file system with data in front
+    def test_prepended(self):
+        '''Test a single ext2 file system with data prepended'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'ext2' / 'test.ext2'
+        prependedname = self.unpackdir / 'test-prepend-random-data.ext2'
+        prependedname.write_bytes(b'\x01' * 128 + filename.read_bytes())
+        fileresult = create_fileresult_for_path(self.unpackdir, prependedname, set())
+        offset = 128
+        unpackdir = self.unpackdir / 'unpacked'
+        testres = bangfilesystems.unpack_ext2(fileresult, self.scan_environment, offset, unpackdir)
+        self.assertTrue(testres['status'])
+        self.assertEqual(testres['length'], filename.stat().st_size)
+        self.assertEqual((unpackdir / 'hello.txt').read_bytes(), b'hello\n')
+
+    # a test for the file being a single ext2 file system with data cut from the end
+    def test_cut_from_end(self):
+        '''Test a single ext2 file system with data cut from the end'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'ext2' / 'test.ext2'
+        cutname = self.unpackdir / 'test-cut-data-from-end.ext2'
+        cutname.write_bytes(filename.read_bytes()[:-4096])
+        fileresult = create_fileresult_for_path(self.unpackdir, cutname, set())
+        offset = 0
+        testres = bangfilesystems.unpack_ext2(fileresult, self.scan_environment, offset, self.unpackdir)
+        self.assertFalse(testres['status'])
+
+    # a test for a directory with a size that is larger than its blocks
+    def test_directory_size_too_large(self):
+        '''Test an ext4 file system with an invalid size of the root directory'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'ext2' / 'test.ext4'
+        data = bytearray(filename.read_bytes())
+        ext2fs = bangext2.Ext2FileSystem(data)
+        rootinodeoffset = ext2fs._inode_table(0) * ext2fs.blocksize + ext2fs.inodesize
+        # i_size_high
+        data[rootinodeoffset+108:rootinodeoffset+112] = (0x10000).to_bytes(4, byteorder='little')
+        invalidname = self.unpackdir / 'test-invalid-directory-size.ext4'
+        invalidname.write_bytes(data)
+        fileresult = create_fileresult_for_path(self.unpackdir, invalidname, set())
+        offset = 0
+        unpackdir = self.unpackdir / 'unpacked'
+        testres = bangfilesystems.unpack_ext2(fileresult, self.scan_environment, offset, unpackdir)
+        self.assertFalse(testres['status'])
+        self.assertFalse(unpackdir.exists())
+
+    # a test for a file that cannot be written: the files that were
+    # unpacked before are removed
+    def test_file_cannot_be_written(self):
+        '''Test an ext4 file system with a file that cannot be written'''
+        filename = pathlib.Path(self.testdata_dir) / 'unpackers' / 'ext2' / 'test.ext4'
+        fileresult = create_fileresult_for_path(self.unpackdir, filename, set())
+        offset = 0
+        unpackdir = self.unpackdir / 'unpacked'
+        # a directory in the way of a file
+        (unpackdir / 'hello.txt').mkdir(parents=True)
+        testres = bangfilesystems.unpack_ext2(fileresult, self.scan_environment, offset, unpackdir)
+        self.assertFalse(testres['status'])
+        self.assertFalse(unpackdir.exists())
+
+
 # a test class for testing rzip files
 class TestRzip(TestBase):
     '''Test class for rzip'''